@@ -25,10 +25,17 @@ This package implements support for neural networks. Consult:
       K-Means implementation for use with Radial Basis Networks;
     rbfn
       Radial Basis Function Networks;
+    persist
+      Saving and loading of neural networks;
+    batching
+      Micro-batching of concurrent requests to neural networks;
+    data
+      Sources of training data read in chunks, for large training sets;
 """
 
 
-# __all__ = [ 'base', 'af', 'lrules', 'nnet', 'mem', 'kmeans', 'rbfn' ]
+# __all__ = [ 'base', 'af', 'lrules', 'nnet', 'mem', 'kmeans', 'rbfn',
+#             'persist', 'batching', 'data' ]
 
 ################################################################################
 # Imports sub-packages
@@ -39,3 +46,6 @@ from peach.nn.nnet import *
 from peach.nn.mem import *
 from peach.nn.kmeans import *
 from peach.nn.rbfn import *
+from peach.nn.persist import *
+from peach.nn.batching import *
+from peach.nn.data import *
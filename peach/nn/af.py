@@ -28,10 +28,112 @@ the neuron is activated or not.
 
 
 ################################################################################
-from numpy import vectorize, array, where, ones, select, exp, pi, arctan, tanh, cosh, sign
+from numpy import vectorize, array, empty, shape, exp, pi, arctan, tanh, sign
+from numpy import cos, add, subtract, multiply, divide, square, negative, clip
+from numpy import greater, greater_equal, less, absolute, maximum
+from numpy import linspace, interp, gradient
 import types
 
 
+################################################################################
+# Functions
+################################################################################
+def _ftype(x):
+    '''
+    Returns the type of the result of a function over ``x``. If ``x`` is an
+    array of real numbers, its type is kept, so single precision computations
+    are not converted to double precision. Otherwise, it is ``float``.
+    '''
+    try:
+        if x.dtype.kind == 'f':
+            return x.dtype
+    except AttributeError:
+        pass
+    return float
+
+
+def _empty(x, out):
+    '''
+    Returns the array where the result of a function over ``x`` is to be
+    stored. If ``out`` is ``None``, a new array with the shape of ``x`` is
+    created, otherwise, ``out`` itself is returned.
+    '''
+    if out is None:
+        out = empty(shape(x), dtype=_ftype(x))
+    return out
+
+
+def _store(r, out):
+    '''
+    Copies the result ``r`` of a function to ``out``, if it is given, and
+    returns the array where the result is stored.
+    '''
+    if out is None:
+        return r
+    out[...] = r
+    return out
+
+
+def _accepts_out(f, name):
+    '''
+    Checks if the method ``name`` of the activation function ``f`` accepts the
+    ``out`` parameter, that is, if the class where the method is defined sets
+    the ``accepts_out`` attribute. Derivatives given when an ``Activation``
+    object is instantiated always accept it.
+    '''
+    if isinstance(f, Activation) and name in f.__dict__:
+        return True
+    for c in type(f).__mro__:
+        if name in c.__dict__:
+            return c.__dict__.get('accepts_out', False)
+    return False
+
+
+def _call(f, x, out):
+    '''
+    Applies the activation function ``f`` over ``x``, storing the result in
+    ``out``. The ``out`` parameter is passed only if ``f`` accepts it.
+    '''
+    if _accepts_out(f, '__call__'):
+        return f(x, out=out)
+    return _store(f(x), out)
+
+
+def _derivative(f, x, out):
+    '''
+    Applies the derivative of the activation function ``f`` over ``x``,
+    storing the result in ``out``. The ``out`` parameter is passed only if the
+    ``derivative`` method accepts it.
+    '''
+    if _accepts_out(f, 'derivative'):
+        return f.derivative(x, out=out)
+    return _store(f.derivative(x), out)
+
+
+def _dy(f, y, v, out):
+    '''
+    Computes the derivative of the activation function ``f`` from the
+    activation value ``y`` and potential ``v``, storing the result in ``out``.
+    The ``out`` parameter is passed only if the ``dy`` method accepts it.
+    '''
+    if _accepts_out(f, 'dy'):
+        return f.dy(y, v, out=out)
+    return _store(f.dy(y, v), out)
+
+
+def _sample(f, x):
+    '''
+    Evaluates the function ``f``, an ``Activation`` object or a standard Python
+    function, over the vector ``x``.
+    '''
+    if isinstance(f, Activation):
+        return array(f(x), dtype=float)
+    elif callable(f):
+        return array(vectorize(f)(x), dtype=float)
+    else:
+        raise ValueError, 'invalid function'
+
+
 ################################################################################
 # Classes
 ################################################################################
@@ -57,7 +159,28 @@ class Activation(object):
         This method implements the derivative of the activation function. It is
         used in the learning methods. If one is not provided (but remember to
         call the superclass ``__init__`` so that it is created).
+
+    Optionally, a subclass can implement a ``dy`` method, that computes the
+    derivative from the activation value ``y`` that was already computed when
+    the neuron was fed, and possibly from the activation potential ``v``. For
+    most functions, this is a lot cheaper than computing the derivative again
+    from the potential, and it is what layers and learning methods use.
+
+    The functions in this module receive an optional ``out`` parameter in
+    ``__call__``, ``derivative`` and ``dy``. If it is given, it is an array of
+    the same shape of the input, and the result is written in it and returned,
+    without creating intermediate arrays. This allows layers and learning
+    methods to run without allocating memory. A subclass whose methods accept
+    the ``out`` parameter should declare it by setting the class attribute
+    ``accepts_out`` to ``True``. Otherwise, the methods are called without it,
+    and the results are copied where they are needed, so a subclass doesn't
+    need to know about it.
     '''
+    accepts_out = True
+    '''If ``True``, the methods defined in this class accept the ``out``
+    parameter. It must be set in every subclass that supports it, since it only
+    applies to the methods defined in the class where it is set.'''
+
     def __init__(self, f=None, df=None):
         '''
         Initializes the activation function.
@@ -80,18 +203,19 @@ class Activation(object):
         if isinstance(f, types.FunctionType):
             self.__f = vectorize(f)
         elif f is None:
-            self.__f = lambda x: array(x, dtype=float)
+            self.__f = lambda x: array(x, dtype=_ftype(x))
         else:
             raise ValueError, 'invalid function'
         if df is None:
             self.d = self.derivative
             '''An alias to the derivative of the function.'''
         else:
-            self.d = df
-            self.derivative = df
+            self.__df = df
+            self.d = self.__derivative
+            self.derivative = self.__derivative
 
 
-    def __call__(self, x):
+    def __call__(self, x, out=None):
         '''
         Call interface to the object.
 
@@ -102,14 +226,31 @@ class Activation(object):
           x
             A real number or a vector of real numbers representing the
             activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
 
         :Returns:
           The activation function applied over the input vector.
         '''
-        return self.__f(x)
+        if out is None:
+            return self.__f(x)
+        out[...] = self.__f(x)
+        return out
 
 
-    def derivative(self, x, dx=5.0e-5):
+    def __derivative(self, *args, **kwargs):
+        '''
+        Calls the derivative given in the instantiation of the object, storing
+        the result in the ``out`` parameter, if one is given.
+        '''
+        out = kwargs.pop('out', None)
+        if out is None:
+            return self.__df(*args, **kwargs)
+        out[...] = self.__df(*args, **kwargs)
+        return out
+
+
+    def derivative(self, x, dx=5.0e-5, out=None):
         '''
         An estimate of the derivative of the activation function.
 
@@ -125,11 +266,48 @@ class Activation(object):
             is, the better. However, if made too small, the precision is not
             enough to avoid errors. This defaults to 5e-5, which is the values
             that gives the best results.
+          out
+            If given, an array where the result is stored.
 
         :Returns:
           The value of the derivative over the given point.
         '''
-        return (self(x+dx/2.0)-self(x-dx/2.0)) / dx
+        if out is None:
+            return (self(x+dx/2.0)-self(x-dx/2.0)) / dx
+        out[...] = (self(x+dx/2.0)-self(x-dx/2.0)) / dx
+        return out
+
+
+    def dy(self, y, v=None, out=None, dx=5.0e-5):
+        '''
+        The derivative of the activation function, given the activation value.
+
+        If a derivative was given when the object was created, or if a subclass
+        implements the ``derivative`` method, it is applied over ``v``.
+        Otherwise, the derivative is estimated with a forward difference, which
+        reuses ``y`` and evaluates the function only once.
+
+        :Parameters:
+          y
+            A real number or vector of real numbers representing the activation
+            value of a neuron or a layer of neurons.
+          v
+            The activation potential from which ``y`` was computed. It is needed
+            by this method.
+          out
+            If given, an array where the result is stored.
+          dx
+            The value of the interval of the estimate. Defaults to 5e-5.
+
+        :Returns:
+          The value of the derivative over the given point.
+        '''
+        if v is None:
+            raise ValueError, 'activation potential unavailable'
+        if getattr(self.d, 'im_func', None) is not Activation.derivative.im_func:
+            return _derivative(self, v, out)
+        out = subtract(self(v+dx), y, _empty(y, out))
+        return divide(out, dx, out)
 
 
 ################################################################################
@@ -137,6 +315,8 @@ class Threshold(Activation):
     '''
     Threshold activation function.
     '''
+    accepts_out = True
+
     def __init__(self, threshold=0.0, amplitude=1.0):
         '''
         Initializes the object.
@@ -152,7 +332,7 @@ class Threshold(Activation):
         self.__a = float(amplitude)
         self.d = self.derivative
 
-    def __call__(self, x):
+    def __call__(self, x, out=None):
         '''
         Call interface to the object.
 
@@ -163,13 +343,16 @@ class Threshold(Activation):
           x
             A real number or a vector of real numbers representing the
             activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
 
         :Returns:
           The activation function applied over the input vector.
         '''
-        return where(x >= self.__t, self.__a, 0.0)
+        out = greater_equal(x, self.__t, _empty(x, out))
+        return multiply(out, self.__a, out)
 
-    def derivative(self, x):
+    def derivative(self, x, out=None):
         '''
         The function derivative. Technically, this function doesn't have a
         derivative, but making it equals to 1, this can be used in learning
@@ -179,15 +362,38 @@ class Threshold(Activation):
           x
             A real number or a vector of real numbers representing the
             activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
 
         :Returns:
           The derivative of the activation function applied over the input
           vector.
         '''
-        try:
-            return ones(x.shape)
-        except AttributeError:
-            return 1.0
+        out = _empty(x, out)
+        out.fill(1.0)
+        return out
+
+    def dy(self, y, v=None, out=None):
+        '''
+        The function derivative, computed from the activation value.
+
+        The derivative of this function doesn't depend on its argument, so
+        this is the same as the ``derivative`` method.
+
+        :Parameters:
+          y
+            A real number or a vector of real numbers representing the
+            activation value of a neuron or a layer of neurons.
+          v
+            The activation potential from which ``y`` was computed. Not used.
+          out
+            If given, an array where the result is stored.
+
+        :Returns:
+          The derivative of the activation function over the activation
+          potential that results in ``y``.
+        '''
+        return self.derivative(y, out)
 
 Step = Threshold
 '''Alias to ``Threshold``'''
@@ -198,13 +404,15 @@ class Linear(Activation):
     '''
     Identity activation function
     '''
+    accepts_out = True
+
     def __init__(self):
         '''
         Initializes the function
         '''
         self.d = self.derivative
 
-    def __call__(self, x):
+    def __call__(self, x, out=None):
         '''
         Call interface to the object.
 
@@ -215,13 +423,17 @@ class Linear(Activation):
           x
             A real number or a vector of real numbers representing the
             activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
 
         :Returns:
           The activation function applied over the input vector.
         '''
-        return array(x, dtype = float)
+        out = _empty(x, out)
+        out[...] = x
+        return out
 
-    def derivative(self, x):
+    def derivative(self, x, out=None):
         '''
         The function derivative.
 
@@ -229,15 +441,38 @@ class Linear(Activation):
           x
             A real number or a vector of real numbers representing the
             activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
 
         :Returns:
           The derivative of the activation function applied over the input
           vector.
         '''
-        try:
-            return ones(x.shape)
-        except AttributeError:
-            return 1.0
+        out = _empty(x, out)
+        out.fill(1.0)
+        return out
+
+    def dy(self, y, v=None, out=None):
+        '''
+        The function derivative, computed from the activation value.
+
+        The derivative of this function doesn't depend on its argument, so
+        this is the same as the ``derivative`` method.
+
+        :Parameters:
+          y
+            A real number or a vector of real numbers representing the
+            activation value of a neuron or a layer of neurons.
+          v
+            The activation potential from which ``y`` was computed. Not used.
+          out
+            If given, an array where the result is stored.
+
+        :Returns:
+          The derivative of the activation function over the activation
+          potential that results in ``y``.
+        '''
+        return self.derivative(y, out)
 
 Identity = Linear
 '''An alias to ``Linear``'''
@@ -248,6 +483,8 @@ class Ramp(Activation):
     '''
     Ramp activation function
     '''
+    accepts_out = True
+
     def __init__(self, p0=(-0.5, 0.0), p1=(0.5, 1.0)):
         '''
         Initializes the object.
@@ -272,7 +509,7 @@ class Ramp(Activation):
         self.__a = (self.__y1 - self.__y0) / (self.__x1 - self.__x0)
         self.d = self.derivative
 
-    def __call__(self, x):
+    def __call__(self, x, out=None):
         '''
         Call interface to the object.
 
@@ -283,15 +520,19 @@ class Ramp(Activation):
           x
             A real number or a vector of real numbers representing the
             activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
 
         :Returns:
           The activation function applied over the input vector.
         '''
-        return select([ x < self.__x0, x < self.__x1 ],
-                      [ self.__y0, self.__a * (x - self.__x0) + self.__y0 ],
-                      self.__y1)
+        out = _empty(x, out)
+        clip(x, self.__x0, self.__x1, out)
+        out = subtract(out, self.__x0, out)
+        out = multiply(out, self.__a, out)
+        return add(out, self.__y0, out)
 
-    def derivative(self, x):
+    def derivative(self, x, out=None):
         '''
         The function derivative.
 
@@ -299,13 +540,45 @@ class Ramp(Activation):
           x
             A real number or a vector of real numbers representing the
             activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
 
         :Returns:
           The derivative of the activation function applied over the input
           vector.
         '''
-        return select([ x < self.__x0, x < self.__x1 ],
-                      [ 0.0, self.__a ], 0.0)
+        out = greater_equal(x, self.__x0, _empty(x, out))
+        out = multiply(out, less(x, self.__x1), out)
+        return multiply(out, self.__a, out)
+
+    def dy(self, y, v=None, out=None):
+        '''
+        The function derivative, computed from the activation value.
+
+        The derivative is the slope of the ramp where the activation value is
+        strictly between its limits, and zero elsewhere.
+
+        :Parameters:
+          y
+            A real number or a vector of real numbers representing the
+            activation value of a neuron or a layer of neurons.
+          v
+            The activation potential from which ``y`` was computed. If given, the
+            derivative is computed from it instead, which gives the same
+            results as the ``derivative`` method at the ends of the ramp.
+          out
+            If given, an array where the result is stored.
+
+        :Returns:
+          The derivative of the activation function over the activation
+          potential that results in ``y``.
+        '''
+        if v is not None:
+            return _derivative(self, v, out)
+        y0, y1 = sorted((self.__y0, self.__y1))
+        out = greater(y, y0, _empty(y, out))
+        out = multiply(out, less(y, y1), out)
+        return multiply(out, self.__a, out)
 
 
 ################################################################################
@@ -313,6 +586,8 @@ class Sigmoid(Activation):
     '''
     Sigmoid activation function
     '''
+    accepts_out = True
+
     def __init__(self, a = 1.0, x0 = 0.0):
         '''
         Initializes the object.
@@ -327,7 +602,7 @@ class Sigmoid(Activation):
         self.__x0 = float(x0)
         self.d = self.derivative
 
-    def __call__(self, x):
+    def __call__(self, x, out=None):
         '''
         Call interface to the object.
 
@@ -338,13 +613,19 @@ class Sigmoid(Activation):
           x
             A real number or a vector of real numbers representing the
             activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
 
         :Returns:
           The activation function applied over the input vector.
         '''
-        return 1.0 / (1.0 + exp(- self.__a*(x - self.__x0)))
+        out = subtract(x, self.__x0, _empty(x, out))
+        out = multiply(out, -self.__a, out)
+        out = exp(out, out)
+        out = add(out, 1.0, out)
+        return divide(1.0, out, out)
 
-    def derivative(self, x):
+    def derivative(self, x, out=None):
         '''
         The function derivative.
 
@@ -352,13 +633,45 @@ class Sigmoid(Activation):
           x
             A real number or a vector of real numbers representing the
             activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
 
         :Returns:
           The derivative of the activation function applied over the input
           vector.
         '''
-        t = exp(-self.__a * (x - self.__x0))
-        return self.__a * t / (1 + t)**2
+        # The derivative is computed as a (1 - tanh^2(a(x-x0)/2)) / 4, which is
+        # the same as a t / (1 + t)^2, with t = exp(-a(x-x0)), but can be
+        # computed in place and doesn't overflow in single precision.
+        out = subtract(x, self.__x0, _empty(x, out))
+        out = multiply(out, 0.5*self.__a, out)
+        out = tanh(out, out)
+        out = square(out, out)
+        out = subtract(1., out, out)
+        return multiply(out, 0.25*self.__a, out)
+
+    def dy(self, y, v=None, out=None):
+        '''
+        The function derivative, computed from the activation value.
+
+        For the sigmoid, the derivative is ``a y (1 - y)``.
+
+        :Parameters:
+          y
+            A real number or a vector of real numbers representing the
+            activation value of a neuron or a layer of neurons.
+          v
+            The activation potential from which ``y`` was computed. Not used.
+          out
+            If given, an array where the result is stored.
+
+        :Returns:
+          The derivative of the activation function over the activation
+          potential that results in ``y``.
+        '''
+        out = subtract(1., y, _empty(y, out))
+        out = multiply(out, y, out)
+        return multiply(out, self.__a, out)
 
 Logistic = Sigmoid
 '''An alias to ``Sigmoid``'''
@@ -369,13 +682,15 @@ class Signum(Activation):
     '''
     Signum activation function
     '''
+    accepts_out = True
+
     def __init__(self):
         '''
         Initializes the object.
         '''
         self.d = self.derivative
 
-    def __call__(self, x):
+    def __call__(self, x, out=None):
         '''
         Call interface to the object.
 
@@ -386,13 +701,15 @@ class Signum(Activation):
           x
             A real number or a vector of real numbers representing the
             activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
 
         :Returns:
           The activation function applied over the input vector.
         '''
-        return sign(x)
+        return sign(x, _empty(x, out))
 
-    def derivative(self, x):
+    def derivative(self, x, out=None):
         '''
         The function derivative. Technically, this function doesn't have a
         derivative, but making it equals to 1, this can be used in learning
@@ -402,15 +719,38 @@ class Signum(Activation):
           x
             A real number or a vector of real numbers representing the
             activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
 
         :Returns:
           The derivative of the activation function applied over the input
           vector.
         '''
-        try:
-            return ones(x.shape)
-        except AttributeError:
-            return 1.0
+        out = _empty(x, out)
+        out.fill(1.0)
+        return out
+
+    def dy(self, y, v=None, out=None):
+        '''
+        The function derivative, computed from the activation value.
+
+        The derivative of this function doesn't depend on its argument, so
+        this is the same as the ``derivative`` method.
+
+        :Parameters:
+          y
+            A real number or a vector of real numbers representing the
+            activation value of a neuron or a layer of neurons.
+          v
+            The activation potential from which ``y`` was computed. Not used.
+          out
+            If given, an array where the result is stored.
+
+        :Returns:
+          The derivative of the activation function over the activation
+          potential that results in ``y``.
+        '''
+        return self.derivative(y, out)
 
 
 ################################################################################
@@ -418,6 +758,8 @@ class ArcTan(Activation):
     '''
     Inverse tangent activation function
     '''
+    accepts_out = True
+
     def __init__(self, a = 1.0, x0 = 0.0):
         '''
         Initializes the object
@@ -432,7 +774,7 @@ class ArcTan(Activation):
         self.__x0 = float(x0)
         self.d = self.derivative
 
-    def __call__(self, x):
+    def __call__(self, x, out=None):
         '''
         Call interface to the object.
 
@@ -443,13 +785,17 @@ class ArcTan(Activation):
           x
             A real number or a vector of real numbers representing the
             activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
 
         :Returns:
           The activation function applied over the input vector.
         '''
-        return self.__a / pi * arctan(x - self.__x0)
+        out = subtract(x, self.__x0, _empty(x, out))
+        out = arctan(out, out)
+        return multiply(out, self.__a / pi, out)
 
-    def derivative(self, x):
+    def derivative(self, x, out=None):
         '''
         The function derivative.
 
@@ -457,12 +803,45 @@ class ArcTan(Activation):
           x
             A real number or a vector of real numbers representing the
             activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
 
         :Returns:
           The derivative of the activation function applied over the input
           vector.
         '''
-        return self.__a / pi / (1.0 + (x - self.__x0)**2)
+        out = subtract(x, self.__x0, _empty(x, out))
+        out = square(out, out)
+        out = add(out, 1.0, out)
+        return divide(self.__a / pi, out, out)
+
+    def dy(self, y, v=None, out=None):
+        '''
+        The function derivative, computed from the activation value.
+
+        If the activation potential is given, this is the same as the
+        ``derivative`` method, since it is cheaper. Otherwise, the derivative
+        is computed as ``(a/pi) cos^2(pi y / a)``.
+
+        :Parameters:
+          y
+            A real number or a vector of real numbers representing the
+            activation value of a neuron or a layer of neurons.
+          v
+            The activation potential from which ``y`` was computed. Optional.
+          out
+            If given, an array where the result is stored.
+
+        :Returns:
+          The derivative of the activation function over the activation
+          potential that results in ``y``.
+        '''
+        if v is not None:
+            return _derivative(self, v, out)
+        out = multiply(y, pi / self.__a, _empty(y, out))
+        out = cos(out, out)
+        out = square(out, out)
+        return multiply(out, self.__a / pi, out)
 
 
 ################################################################################
@@ -470,6 +849,8 @@ class TanH(Activation):
     '''
     Hyperbolic tangent activation function
     '''
+    accepts_out = True
+
     def __init__(self, a = 1.0, x0 = 0.0):
         '''
         Initializes the object
@@ -484,7 +865,7 @@ class TanH(Activation):
         self.__x0 = float(x0)
         self.d = self.derivative
 
-    def __call__(self, x):
+    def __call__(self, x, out=None):
         '''
         Call interface to the object.
 
@@ -495,13 +876,17 @@ class TanH(Activation):
           x
             A real number or a vector of real numbers representing the
             activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
 
         :Returns:
           The activation function applied over the input vector.
         '''
-        return self.__a * tanh(x - self.__x0)
+        out = subtract(x, self.__x0, _empty(x, out))
+        out = tanh(out, out)
+        return multiply(out, self.__a, out)
 
-    def derivative(self, x):
+    def derivative(self, x, out=None):
         '''
         The function derivative.
 
@@ -509,12 +894,169 @@ class TanH(Activation):
           x
             A real number or a vector of real numbers representing the
             activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
 
         :Returns:
           The derivative of the activation function applied over the input
           vector.
         '''
-        return self.__a / cosh(x - self.__x0)**2
+        # Computed as a (1 - tanh^2(x-x0)), the same as a / cosh^2(x-x0), which
+        # overflows in single precision.
+        out = subtract(x, self.__x0, _empty(x, out))
+        out = tanh(out, out)
+        out = square(out, out)
+        out = subtract(1., out, out)
+        return multiply(out, self.__a, out)
+
+    def dy(self, y, v=None, out=None):
+        '''
+        The function derivative, computed from the activation value.
+
+        For the hyperbolic tangent, the derivative is ``a - y^2 / a``.
+
+        :Parameters:
+          y
+            A real number or a vector of real numbers representing the
+            activation value of a neuron or a layer of neurons.
+          v
+            The activation potential from which ``y`` was computed. Not used.
+          out
+            If given, an array where the result is stored.
+
+        :Returns:
+          The derivative of the activation function over the activation
+          potential that results in ``y``.
+        '''
+        out = square(y, _empty(y, out))
+        out = multiply(out, -1.0 / self.__a, out)
+        return add(out, self.__a, out)
+
+
+################################################################################
+class TabulatedActivation(Activation):
+    '''
+    Activation function evaluated from a table.
+
+    Standard Python functions are adjusted to work with layers of neurons by
+    ``numpy.vectorize``, so they are still called once for every element of the
+    activation potential. This class samples the function, and its derivative,
+    only once, over a given interval, and evaluates them by linear
+    interpolation over the samples. Outside the interval, the function
+    saturates at the values of its ends, and its derivative is zero.
+
+    The maximum absolute error of the interpolation, estimated at the middle
+    points between samples, is stored in the ``error`` attribute.
+    '''
+    accepts_out = True
+
+    def __init__(self, f, df=None, interval=(-10.0, 10.0), n=2001):
+        '''
+        Initializes the function.
+
+        :Parameters:
+          f
+            The activation function. It can be a standard Python function, that
+            takes a real value and returns a real value, or an ``Activation``
+            object.
+          df
+            The derivative of the above function, given in the same way. If
+            not given, the ``derivative`` method of ``f`` is used if it is an
+            ``Activation`` object, otherwise it is estimated from the samples of
+            the function. Defaults to ``None``.
+          interval
+            The interval where the function is sampled, given as a tuple ``(x0,
+            x1)``. Defaults to ``(-10.0, 10.0)``.
+          n
+            The number of samples in the interval. The greater this number, the
+            smaller the error, but the greater the memory used. Defaults to
+            2001.
+        '''
+        x0, x1 = interval
+        if x1 <= x0 or n < 2:
+            raise ValueError, 'invalid interval'
+        self.__x = linspace(x0, x1, n)
+        self.__y = _sample(f, self.__x)
+        if df is not None:
+            self.__dy = _sample(df, self.__x)
+        elif isinstance(f, Activation):
+            self.__dy = array(f.derivative(self.__x), dtype=float)
+        else:
+            self.__dy = gradient(self.__y, self.__x)
+
+        # Error estimate, at the middle points between samples, where linear
+        # interpolation is usually worse.
+        xm = 0.5 * (self.__x[:-1] + self.__x[1:])
+        ym = 0.5 * (self.__y[:-1] + self.__y[1:])
+        self.error = absolute(_sample(f, xm) - ym).max()
+        '''Maximum absolute error of the interpolation of the function.'''
+        self.d = self.derivative
+
+    def __call__(self, x, out=None):
+        '''
+        Call interface to the object.
+
+        This method applies the activation function over a vector of activation
+        potentials, and returns the results.
+
+        :Parameters:
+          x
+            A real number or a vector of real numbers representing the
+            activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
+
+        :Returns:
+          The activation function applied over the input vector.
+        '''
+        out = _empty(x, out)
+        out[...] = interp(x, self.__x, self.__y)
+        return out
+
+    def derivative(self, x, out=None):
+        '''
+        The function derivative.
+
+        :Parameters:
+          x
+            A real number or a vector of real numbers representing the
+            activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
+
+        :Returns:
+          The derivative of the activation function applied over the input
+          vector.
+        '''
+        out = _empty(x, out)
+        out[...] = interp(x, self.__x, self.__dy, 0., 0.)
+        return out
+
+    def dy(self, y, v=None, out=None):
+        '''
+        The function derivative, computed from the activation value.
+
+        The table can't be inverted in general, so the derivative is
+        interpolated over the activation potential, as in the ``derivative``
+        method.
+
+        :Parameters:
+          y
+            A real number or a vector of real numbers representing the
+            activation value of a neuron or a layer of neurons. Not used.
+          v
+            The activation potential from which ``y`` was computed. It is needed
+            by this method.
+          out
+            If given, an array where the result is stored.
+
+        :Returns:
+          The derivative of the activation function over the activation
+          potential that results in ``y``.
+        '''
+        if v is None:
+            raise ValueError, 'activation potential unavailable'
+        return _derivative(self, v, out)
 
 
 ################################################################################
@@ -537,13 +1079,15 @@ class Gaussian(RadialBasis):
     '''
     Gaussian activation function
     '''
+    accepts_out = True
+
     def __init__(self):
         '''
         Initializes the object. Takes no parameters
         '''
         self.d = self.derivative
 
-    def __call__(self, x):
+    def __call__(self, x, out=None):
         '''
         Call interface to the object.
 
@@ -554,13 +1098,17 @@ class Gaussian(RadialBasis):
           x
             A real number or a vector of real numbers representing the
             activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
 
         :Returns:
           The activation function applied over the input vector.
         '''
-        return exp(-x**2)
+        out = square(x, _empty(x, out))
+        out = negative(out, out)
+        return exp(out, out)
 
-    def derivative(self, x):
+    def derivative(self, x, out=None):
         '''
         The function derivative.
 
@@ -568,13 +1116,114 @@ class Gaussian(RadialBasis):
           x
             A real number or a vector of real numbers representing the
             activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
 
         :Returns:
           The derivative of the activation function applied over the input
           vector.
         '''
-        return -2.*x*exp(-x**2)
+        out = square(x, _empty(x, out))
+        out = negative(out, out)
+        out = exp(out, out)
+        out = multiply(out, x, out)
+        return multiply(out, -2., out)
+
+    def dy(self, y, v=None, out=None):
+        '''
+        The function derivative, computed from the activation value.
+
+        For the gaussian, the derivative is ``-2 v y``.
+
+        :Parameters:
+          y
+            A real number or a vector of real numbers representing the
+            activation value of a neuron or a layer of neurons.
+          v
+            The activation potential from which ``y`` was computed. It is needed by this method.
+          out
+            If given, an array where the result is stored.
+
+        :Returns:
+          The derivative of the activation function over the activation
+          potential that results in ``y``.
+        '''
+        if v is None:
+            raise ValueError, 'activation potential unavailable'
+        out = multiply(v, y, _empty(y, out))
+        return multiply(out, -2., out)
+
+
+################################################################################
+class Wendland(RadialBasis):
+    '''
+    Wendland compactly supported radial basis function.
 
+    This function is given by ``(1 - |x|)^4 (4|x| + 1)`` for ``|x| < 1``, and
+    is zero elsewhere. It is smooth and has a shape similar to the gaussian,
+    but since it is exactly zero beyond its support, a radial basis function
+    network only needs to evaluate the centers that are close to the input
+    vector. Please, consult the ``RBFN`` class.
+    '''
+    accepts_out = True
+
+    def __init__(self):
+        '''
+        Initializes the object. Takes no parameters
+        '''
+        self.d = self.derivative
+        self.support = 1.
+        '''The radius beyond which the function is zero.'''
+
+    def __call__(self, x, out=None):
+        '''
+        Call interface to the object.
+
+        This method applies the activation function over a vector of activation
+        potentials, and returns the results.
+
+        :Parameters:
+          x
+            A real number or a vector of real numbers representing the
+            activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
+
+        :Returns:
+          The activation function applied over the input vector.
+        '''
+        r = absolute(x, _empty(x, None))
+        out = subtract(1., r, _empty(x, out))
+        out = maximum(out, 0., out)
+        out = square(out, out)
+        out = square(out, out)
+        r = multiply(r, 4., r)
+        r = add(r, 1., r)
+        return multiply(out, r, out)
+
+    def derivative(self, x, out=None):
+        '''
+        The function derivative.
+
+        :Parameters:
+          x
+            A real number or a vector of real numbers representing the
+            activation potential of a neuron or a layer of neurons.
+          out
+            If given, an array where the result is stored.
+
+        :Returns:
+          The derivative of the activation function applied over the input
+          vector.
+        '''
+        # The derivative is -20 x (1 - |x|)^3 inside the support.
+        t = absolute(x, _empty(x, None))
+        t = subtract(1., t, t)
+        t = maximum(t, 0., t)
+        out = multiply(x, -20., _empty(x, out))
+        out = multiply(out, t, out)
+        t = square(t, t)
+        return multiply(out, t, out)
 
 ################################################################################
 # Test
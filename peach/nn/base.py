@@ -18,17 +18,66 @@ of a neuron. Further definitions and algorithms are based on this definition.
 
 
 ################################################################################
-from numpy import dot, array, reshape, vstack, ones
+from numpy import dot, asarray, reshape, ones, empty, dtype as _dtype
 from numpy.random import randn
-from af import Activation, Linear
+from af import Activation, Linear, _call, _dy
 
 
-_BIAS = ones((1, 1), dtype=float)
-"""This constant vector is defined to implement in a fast way the bias of a
-neuron, as an input of value 1, stacked over the real input to the neuron."""
-
 ################################################################################
 # Classes
+################################################################################
+class Workspace(object):
+    '''
+    Preallocated buffers used by a layer of neurons.
+
+    A workspace holds all the arrays needed to feed a layer with an input
+    vector and to adjust its synaptic weights. Every array is allocated only
+    once, when the workspace is created, and the computations done by the layer
+    and by the learning methods are then made *in place* over these arrays.
+    Thus, no memory is allocated while a network is being fed or trained.
+
+    A workspace has the following attributes, all of them column vectors,
+    except for ``dw``:
+
+      x
+        The input vector of the layer. If the layer is biased, the first
+        element is always 1, and the input vector is stored in the remaining
+        elements;
+      v
+        The activation potential of the layer;
+      y
+        The activation value of the layer;
+      d
+        The derivative of the activation function over the activation
+        potential;
+      g
+        The local error gradient of each neuron;
+      dw
+        The adjustment of the synaptic weights, an array with the same shape of
+        the weight array of the layer.
+    '''
+    def __init__(self, shape, dtype=float):
+        '''
+        Initializes the workspace.
+
+        :Parameters:
+          shape
+            The shape of the weight array of the layer, in the format ``(m,
+            n)``, where ``m`` is the number of neurons in the layer and ``n`` is
+            the number of inputs of each neuron, already accounting for the
+            bias.
+          dtype
+            The type of the elements of the arrays. Defaults to ``float``.
+        '''
+        m, n = shape
+        self.x = ones((n, 1), dtype=dtype)
+        self.v = empty((m, 1), dtype=dtype)
+        self.y = empty((m, 1), dtype=dtype)
+        self.d = empty((m, 1), dtype=dtype)
+        self.g = empty((m, 1), dtype=dtype)
+        self.dw = empty((m, n), dtype=dtype)
+
+
 ################################################################################
 class Layer(object):
     '''
@@ -47,7 +96,8 @@ class Layer(object):
     the documentation to see if the attributes, properties and methods are
     suited to your task.
     '''
-    def __init__(self, shape, phi=Linear, bias=False):
+    def __init__(self, shape, phi=Linear, bias=False, workspace=False,
+                 dtype=float):
         """
         Initializes the layer.
 
@@ -72,11 +122,24 @@ class Layer(object):
             If ``True``, then the neurons on the layer are biased. That means
             that an additional weight is added to each neuron to represent the
             bias. If ``False``, no modification is made.
+          workspace
+            If ``True``, the layer is fed using the buffers of its workspace
+            (consult the ``Workspace`` class), so no memory is allocated in the
+            process. Notice that, in this case, the arrays returned when the
+            layer is fed are always the same, and are overwritten every time the
+            layer is fed again. If ``False``, new arrays are created every time.
+            Defaults to ``False``.
+          dtype
+            The type of the synaptic weights, usually ``float`` (double
+            precision) or ``numpy.float32`` (single precision). Inputs are
+            converted to this type, and every computation made by the layer and
+            its activation function is done with it. Defaults to ``float``.
         """
         m, n = shape
         if bias:
             n = n + 1
-        self.__weights = randn(m, n)
+        self.__dtype = _dtype(dtype)
+        self.__weights = randn(m, n).astype(self.__dtype)
         self.__size = m
         self.__inputs = n
 
@@ -87,6 +150,8 @@ class Layer(object):
         self.__v = None
         self.__y = None
         self.__bias = bias
+        self.__inplace = workspace
+        self.__workspace = None
 
 
     def __getsize(self):
@@ -121,14 +186,32 @@ class Layer(object):
     '''True if the neuron is biased. Not writable.'''
 
 
+    def __getdtype(self):
+        return self.__dtype
+    dtype = property(__getdtype, None)
+    '''The type of the synaptic weights of the layer. Not writable.'''
+
+
     def __getweights(self):
         return self.__weights
     def __setweights(self, m):
-        self.__weights = array(reshape(m, self.weights.shape))
+        self.__weights[...] = reshape(m, self.__weights.shape)
     weights = property(__getweights, __setweights)
     '''A ``numpy`` array containing the synaptic weights of the network. Each
     line is the weight vector of a neuron. It is writable, but the new weight
-    array must be the same shape of the neuron, or an exception is raised.'''
+    array must be the same shape of the neuron, or an exception is raised. The
+    new values are copied over the existing array, so the array object is kept
+    the same during the life of the layer.'''
+
+
+    def __getworkspace(self):
+        if self.__workspace is None:
+            self.__workspace = Workspace(self.__weights.shape, self.__dtype)
+        return self.__workspace
+    workspace = property(__getworkspace, None)
+    '''The workspace of the layer, a ``Workspace`` object with preallocated
+    buffers used to feed and train the layer without allocating memory. It is
+    created the first time it is used. Not writable.'''
 
 
     def __getphi(self):
@@ -171,6 +254,25 @@ class Layer(object):
     after the neuron is fed some input.'''
 
 
+    def _bind(self, weights):
+        '''
+        Replaces the weight array of the layer by the given array, without
+        copying it. This is used to load networks from files (consult the
+        ``persist`` module), so the weights can be memory-mapped. The array
+        must have the shape of the weight array, and its type becomes the type
+        of the layer.
+
+        :Parameters:
+          weights
+            The new weight array.
+        '''
+        if weights.shape != self.__weights.shape:
+            raise ValueError, 'weight array has the wrong shape'
+        self.__weights = weights
+        self.__dtype = weights.dtype
+        self.__workspace = None
+
+
     def __getitem__(self, n):
         '''
         The ``[ ]`` get interface.
@@ -227,16 +329,101 @@ class Layer(object):
           The vector containing the answer of every neuron in the layer, in the
           respective order.
         '''
-        # Adjusts the input vector in case the neuron is biased. Also, the
-        # input vector is reshaped as a column-vector.
-        x = reshape(x, (self.inputs, 1))
+        # In workspace mode, the input vector is copied to the workspace, whose
+        # first element is already 1 in case the neuron is biased, and every
+        # computation is made in place.
+        if self.__inplace:
+            ws = self.workspace
+            if self.__bias:
+                ws.x[1:] = reshape(x, (self.inputs, 1))
+            else:
+                ws.x[...] = reshape(x, (self.inputs, 1))
+            self.__v = dot(self.__weights, ws.x, out=ws.v)
+            self.__y = _call(self.phi, ws.v, ws.y)
+            return self.__y
+
+        # The input vector is reshaped as a column-vector. In case the neuron
+        # is biased, the bias weights are added to the activation potential.
+        x = reshape(asarray(x, dtype=self.__dtype), (self.inputs, 1))
         if self.__bias:
-            x = vstack((_BIAS, x))
-        self.__v = dot(self.weights, x)
-        self.__y = self.phi(self.__v)
+            v = dot(self.__weights[:, 1:], x)
+            v += self.__weights[:, :1]
+        else:
+            v = dot(self.__weights, x)
+        self.__v = v
+        self.__y = self.phi(v)
         return self.__y
 
 
+    def derivative(self, out=None):
+        '''
+        The derivative of the activation function of the layer at the point
+        where it was last fed.
+
+        The derivative is computed from the activation value and potential
+        cached by the ``__call__`` interface, using the ``dy`` method of the
+        activation function, so the function doesn't need to be evaluated
+        again. Please, consult the ``af`` module for more information.
+
+        :Parameters:
+          out
+            If given, an array where the result is stored.
+
+        :Returns:
+          A column vector with the derivative of the activation function of
+          each neuron in the layer.
+        '''
+        return _dy(self.phi, self.y, self.v, out)
+
+
+    def potential(self, x):
+        '''
+        Computes the activation potential of the layer for a batch of inputs.
+
+        Differently from the ``__call__`` interface, this method works over a
+        number of input vectors at once, and *has no collateral effects*: the
+        ``v`` and ``y`` properties are not changed. The computation is done
+        with only one matrix product, and the bias, if any, is added directly
+        instead of being stacked over the inputs.
+
+        :Parameters:
+          x
+            The input vectors to the layer. It must be given as an array of
+            shape ``(N, n)``, where ``N`` is the number of input vectors and
+            ``n`` is the number of inputs of each neuron. Each line is an input
+            vector.
+
+        :Returns:
+          An array of shape ``(N, m)``, where ``m`` is the number of neurons in
+          the layer. Each line is the activation potential of the layer to the
+          respective input vector.
+        '''
+        x = reshape(asarray(x, dtype=self.__dtype), (-1, self.inputs))
+        if self.__bias:
+            return dot(x, self.weights[:, 1:].T) + self.weights[:, 0]
+        else:
+            return dot(x, self.weights.T)
+
+
+    def predict(self, x):
+        '''
+        Computes the answer of the layer for a batch of inputs.
+
+        This method has no collateral effects. Please, consult the
+        ``potential`` method for more information.
+
+        :Parameters:
+          x
+            The input vectors to the layer, given as an array of shape
+            ``(N, n)``, one input vector per line.
+
+        :Returns:
+          An array of shape ``(N, m)``, where each line is the answer of every
+          neuron in the layer to the respective input vector.
+        '''
+        return self.phi(self.potential(x))
+
+
 ################################################################################
 # Test
 if __name__ == "__main__":
@@ -0,0 +1,348 @@
+################################################################################
+# Peach - Computational Intelligence for Python
+# Jose Alexandre Nalon
+#
+# This file: nn/batching.py
+# Micro-batching of requests to neural networks
+################################################################################
+
+# Doc string, reStructuredText formatted:
+__doc__ = """
+Micro-batching of requests to neural networks.
+
+Computing the answer of a neural network to a batch of input vectors is a lot
+faster than computing the answer to each vector separately, since the batch is
+computed with a few matrix products. But a service that answers requests from a
+number of clients receives the input vectors one at a time. This sub-package
+implements a queue that collects the requests made by concurrent threads in
+small batches, computes each batch at once, and gives back to each thread the
+answer to its request.
+"""
+
+__all__ = [ 'Request', 'MicroBatcher' ]
+
+################################################################################
+from numpy import asarray, reshape, vstack
+from collections import deque
+import threading
+import Queue
+import time
+
+
+################################################################################
+# Classes
+################################################################################
+class Request(object):
+    '''
+    A request made to a ``MicroBatcher``.
+
+    A request is returned by the ``submit`` method of the batcher, and holds the
+    answer of the network once its batch is computed. Please, consult the
+    ``MicroBatcher`` documentation.
+    '''
+    def __init__(self, x):
+        '''
+        Initializes the request.
+
+        :Parameters:
+          x
+            The input vector of the request.
+        '''
+        self.x = x
+        self.created = time.time()
+        self.__done = threading.Event()
+        self.__y = None
+        self.__error = None
+
+
+    def _set(self, y=None, error=None):
+        '''
+        Sets the answer of the request, or the exception raised while it was
+        computed, and wakes up the threads waiting for it.
+        '''
+        self.__y = y
+        self.__error = error
+        self.__done.set()
+
+
+    def done(self):
+        '''
+        Tells if the answer of the request is available.
+
+        :Returns:
+          ``True`` if the batch of the request was already computed.
+        '''
+        return self.__done.is_set()
+
+
+    def result(self, timeout=None):
+        '''
+        Waits for the answer of the request.
+
+        :Parameters:
+          timeout
+            The maximum time to wait, in seconds. If ``None``, waits until the
+            answer is available. Defaults to ``None``.
+
+        :Returns:
+          The answer of the network to the input vector of the request. If an
+          exception was raised while the batch was computed, it is raised here.
+        '''
+        if not self.__done.wait(timeout):
+            raise RuntimeError, 'request timed out'
+        if self.__error is not None:
+            raise self.__error
+        return self.__y
+
+
+################################################################################
+class MicroBatcher(object):
+    '''
+    Micro-batching queue in front of a neural network.
+
+    Requests are submitted by any number of threads, and are put in a queue. A
+    worker thread takes the requests from the queue and collects them in a
+    batch, until the batch reaches a maximum size or a maximum time passes
+    since the first request of the batch arrived. The input vectors of the
+    batch are then stacked in an array and given to the ``predict`` method of
+    the network, so the whole batch is computed at once, and each request
+    receives its line of the answer.
+
+    The network is only used by the worker thread, so networks that are not
+    safe to be used by concurrent threads, such as ``FeedForward`` objects, can
+    be used. Any object with a ``predict`` method receiving an array of input
+    vectors, one per line, and returning an array of answers, one per line, can
+    be used, such as ``FeedForward``, ``Predictor``, ``RBFN`` and ``GRNN``.
+
+    If a batch can't be computed, its requests are computed one by one, so a
+    request with an invalid input vector doesn't affect the other requests in
+    its batch. The exception is raised only by the ``result`` method of the
+    invalid request.
+
+    The batcher keeps counters of the number of requests and batches, and of
+    the latency of the requests, that can be used to choose the maximum size and
+    time of the batches. Please, consult the ``stats`` method.
+    '''
+    def __init__(self, net, max_batch=64, max_wait=0.002, window=1000):
+        '''
+        Initializes the batcher, and starts the worker thread.
+
+        :Parameters:
+          net
+            The neural network. It must have a ``predict`` method.
+          max_batch
+            The maximum number of requests in a batch. Defaults to 64.
+          max_wait
+            The maximum time, in seconds, that the first request of a batch
+            waits for other requests before the batch is computed. Larger
+            values give larger batches, and so more throughput, at the cost of
+            the latency of the requests. Defaults to 0.002.
+          window
+            The number of recent requests whose latencies are kept to compute
+            the percentiles reported by the ``stats`` method. Defaults to 1000.
+        '''
+        self.net = net
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.__queue = Queue.Queue()
+        self.__lock = threading.Lock()
+        self.__closing = threading.Lock()
+        self.__closed = False
+        self.__window = deque(maxlen=window)
+        self.reset_stats()
+        self.__worker = threading.Thread(target=self.__run)
+        self.__worker.daemon = True
+        self.__worker.start()
+
+
+    def submit(self, x):
+        '''
+        Submits an input vector to the network.
+
+        :Parameters:
+          x
+            The input vector.
+
+        :Returns:
+          A ``Request`` object, whose ``result`` method gives the answer of the
+          network once it is computed.
+        '''
+        # The request is queued while holding the lock, so it can't be put
+        # after the mark that stops the worker.
+        with self.__closing:
+            if self.__closed:
+                raise RuntimeError, 'batcher is closed'
+            r = Request(x)
+            self.__queue.put(r)
+        return r
+
+
+    def __call__(self, x, timeout=None):
+        '''
+        Computes the answer of the network to an input vector.
+
+        The input vector is submitted, and this method waits for the answer, so
+        the calling thread blocks until the batch is computed.
+
+        :Parameters:
+          x
+            The input vector.
+          timeout
+            The maximum time to wait, in seconds. If ``None``, waits until the
+            answer is available. Defaults to ``None``.
+
+        :Returns:
+          The answer of the network to the input vector, that is, the line of
+          the answer of the ``predict`` method corresponding to ``x``.
+        '''
+        return self.submit(x).result(timeout)
+
+
+    def close(self):
+        '''
+        Stops the worker thread, after the requests already submitted are
+        computed. No requests can be submitted after the batcher is closed.
+        '''
+        with self.__closing:
+            if not self.__closed:
+                self.__closed = True
+                self.__queue.put(None)
+        self.__worker.join()
+
+
+    def __collect(self):
+        '''
+        Waits for a request, and collects the requests that arrive until the
+        batch is full or the maximum time passes. Returns the list of requests,
+        and ``None`` as the last element if the batcher was closed.
+        '''
+        batch = [ self.__queue.get() ]
+        if batch[0] is None:
+            return batch
+        deadline = time.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.time()
+                if remaining > 0.:
+                    r = self.__queue.get(True, remaining)
+                else:
+                    r = self.__queue.get_nowait()
+            except Queue.Empty:
+                break
+            batch.append(r)
+            if r is None:
+                break
+        return batch
+
+
+    def __predict(self, batch):
+        '''
+        Computes the answer of a batch of requests. If the batch can't be
+        computed, for example, because the input vector of some request has the
+        wrong size, each request is computed alone, so the exception is given
+        only to the requests that raise it.
+        '''
+        try:
+            x = vstack([ reshape(asarray(r.x), (1, -1)) for r in batch ])
+            y = self.net.predict(x)
+        except Exception, e:
+            if len(batch) == 1:
+                batch[0]._set(error=e)
+            else:
+                for r in batch:
+                    self.__predict([ r ])
+        else:
+            for r, yi in zip(batch, y):
+                r._set(yi)
+
+
+    def __run(self):
+        '''
+        The loop of the worker thread.
+        '''
+        while True:
+            batch = self.__collect()
+            closed = batch[-1] is None
+            if closed:
+                batch = batch[:-1]
+            if len(batch) > 0:
+                t0 = time.time()
+                self.__predict(batch)
+                self.__count(batch, t0, time.time())
+            if closed:
+                return
+
+
+    def __count(self, batch, start, end):
+        '''
+        Updates the counters with a computed batch.
+        '''
+        with self.__lock:
+            self.__requests = self.__requests + len(batch)
+            self.__batches = self.__batches + 1
+            self.__compute = self.__compute + (end - start)
+            for r in batch:
+                latency = end - r.created
+                self.__latency = self.__latency + latency
+                if latency > self.__latency_max:
+                    self.__latency_max = latency
+                self.__window.append(latency)
+
+
+    def reset_stats(self):
+        '''
+        Sets every counter to zero.
+        '''
+        with self.__lock:
+            self.__start = time.time()
+            self.__requests = 0
+            self.__batches = 0
+            self.__compute = 0.
+            self.__latency = 0.
+            self.__latency_max = 0.
+            self.__window.clear()
+
+
+    def stats(self):
+        '''
+        Reports the counters of the batcher.
+
+        :Returns:
+          A dictionary with the following entries, counted since the batcher
+          was created or the counters were reset: ``requests``, the number of
+          requests computed; ``batches``, the number of batches computed;
+          ``batch_size``, the mean number of requests in a batch;
+          ``throughput``, the number of requests computed per second;
+          ``compute``, the fraction of the time spent computing batches;
+          ``latency``, the mean time, in seconds, from the submission of a
+          request to its answer; ``latency_max``, the maximum latency; and
+          ``latency_p50`` and ``latency_p99``, the median and the 99th
+          percentile of the latency of the most recent requests.
+        '''
+        with self.__lock:
+            elapsed = max(time.time() - self.__start, 1e-9)
+            n = self.__requests
+            b = self.__batches
+            window = sorted(self.__window)
+            report = {
+                'requests': n,
+                'batches': b,
+                'batch_size': float(n) / b if b > 0 else 0.,
+                'throughput': n / elapsed,
+                'compute': self.__compute / elapsed,
+                'latency': self.__latency / n if n > 0 else 0.,
+                'latency_max': self.__latency_max
+            }
+        if window:
+            report['latency_p50'] = window[len(window) // 2]
+            report['latency_p99'] = window[min(int(0.99 * len(window)),
+                                               len(window) - 1)]
+        else:
+            report['latency_p50'] = report['latency_p99'] = 0.
+        return report
+
+
+################################################################################
+# Test
+if __name__ == "__main__":
+    pass
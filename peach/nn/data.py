@@ -0,0 +1,269 @@
+################################################################################
+# Peach - Computational Intelligence for Python
+# Jose Alexandre Nalon
+#
+# This file: nn/data.py
+# Sources of training data for neural networks
+################################################################################
+
+# Doc string, reStructuredText formatted:
+__doc__ = """
+Sources of training data for neural networks.
+
+The ``train`` methods of the networks receive the training set as a list of
+``(x, d)`` tuples, so the whole training set must be in memory, split in a large
+number of small arrays. This sub-package implements a source of training data
+that reads the examples in chunks, that is, arrays with a number of examples,
+one per line. The examples can come from arrays in memory, from arrays mapped
+from files (``numpy.memmap``), that can be a lot larger than the memory, or
+from a function generating chunks, which can read them from anywhere.
+
+The examples can be shuffled with a shuffle buffer, so examples from different
+parts of the data are mixed without random access to single examples, and the
+chunks can be read by a background thread while the network is trained with the
+previous ones. Data sources are accepted by the ``fit`` methods of the networks
+and by the ``train_batch`` method of ``FeedForward`` networks.
+"""
+
+__all__ = [ 'DataSource' ]
+
+################################################################################
+from numpy import array, empty, ones
+from numpy.random import RandomState
+import threading
+import Queue
+
+
+################################################################################
+# Classes
+################################################################################
+class DataSource(object):
+    '''
+    A source of training data, read in chunks.
+
+    Iterating over a data source gives the chunks of one epoch, that is, one
+    pass over the data. Each chunk is an array with at most ``chunk_size``
+    input vectors, one per line, or a tuple ``(x, d)`` with the input vectors
+    and the desired responses, if the source has desired responses. A data
+    source can be iterated as many times as desired, and the examples are
+    shuffled again every time, unless the data comes from a one-shot iterator,
+    in which case only one epoch can be read.
+
+    Shuffling is done in two steps. If the data is given as arrays, the chunks
+    are read in random order, so only contiguous blocks are read from the
+    arrays, which is much faster for memory-mapped files. Then, the examples go
+    through a shuffle buffer: a number of examples are kept in memory, and each
+    chunk is formed by examples randomly drawn from the buffer, which is then
+    completed with the examples that arrive. The larger the buffer, the better
+    the examples are mixed, at the cost of memory.
+    '''
+    def __init__(self, x, d=None, chunk_size=4096, shuffle=True,
+                 buffer_size=None, prefetch=2, dtype=None, seed=None):
+        '''
+        Initializes the data source.
+
+        :Parameters:
+          x
+            The input vectors, given as an array (or a ``numpy.memmap``) of
+            shape ``(N, n)``, one input vector per line. Instead, ``x`` can be
+            a function without arguments returning an iterable of chunks, which
+            is called at the beginning of every epoch, such as a generator
+            function. Each chunk must be an array of input vectors or a tuple
+            ``(x, d)`` of input vectors and desired responses. An iterable of
+            chunks can be given directly, but then, if it is an iterator, it can
+            be read only once.
+          d
+            The desired responses, given as an array of ``N`` lines, one for
+            each input vector, if ``x`` is an array. If ``None``, the source
+            has only input vectors. Defaults to ``None``.
+          chunk_size
+            The maximum number of examples in each chunk. Defaults to 4096.
+          shuffle
+            If ``True``, the examples are shuffled in every epoch. Defaults to
+            ``True``.
+          buffer_size
+            The number of examples kept in the shuffle buffer. It is never
+            smaller than ``chunk_size``. If ``None``, 16 chunks are kept. Not
+            used if ``shuffle`` is ``False``. Defaults to ``None``.
+          prefetch
+            The number of chunks read in advance by a background thread. If 0,
+            no thread is used, and the chunks are read as they are requested.
+            Defaults to 2.
+          dtype
+            The type of the elements of the chunks. If ``None``, the type of
+            the data is used. Defaults to ``None``.
+          seed
+            The seed of the random number generator used in the shuffling.
+            Defaults to ``None``.
+        '''
+        if d is not None:
+            if callable(x) or not hasattr(x, 'shape'):
+                raise ValueError, 'desired responses need an array of inputs'
+            if len(d) != len(x):
+                raise ValueError, 'inputs and desired responses differ in size'
+        self.__x = x
+        self.__d = d
+        self.__read = False
+        self.chunk_size = chunk_size
+        self.shuffle = shuffle
+        if buffer_size is None:
+            buffer_size = 16 * chunk_size
+        self.buffer_size = max(buffer_size, chunk_size)
+        self.prefetch = prefetch
+        self.dtype = dtype
+        self.__random = RandomState(seed)
+
+
+    def __get_size(self):
+        if hasattr(self.__x, 'shape') and not callable(self.__x):
+            return len(self.__x)
+        return None
+    size = property(__get_size, None)
+    '''The number of examples in the source, or ``None`` if the source is a
+    generator and the number is not known in advance. Not writable.'''
+
+
+    def __chunk(self, c):
+        '''
+        Converts a chunk to arrays in memory. Chunks sliced from memory-mapped
+        arrays are read from the file here.
+        '''
+        if isinstance(c, tuple):
+            x, d = c
+            return array(x, dtype=self.dtype), array(d)
+        return array(c, dtype=self.dtype)
+
+
+    def __read_chunks(self):
+        '''
+        Reads the chunks of an epoch from the data, in random order if the data
+        is an array and the examples are shuffled.
+        '''
+        x = self.__x
+        d = self.__d
+        if hasattr(x, 'shape') and not callable(x):
+            starts = range(0, len(x), self.chunk_size)
+            if self.shuffle:
+                starts = [ starts[i] for i in
+                           self.__random.permutation(len(starts)) ]
+            for i in starts:
+                j = i + self.chunk_size
+                if d is None:
+                    yield self.__chunk(x[i:j])
+                else:
+                    yield self.__chunk((x[i:j], d[i:j]))
+        else:
+            if callable(x):
+                x = x()
+            elif iter(x) is x:
+                if self.__read:
+                    raise ValueError, 'the source can be read only once'
+                self.__read = True
+            for c in x:
+                yield self.__chunk(c)
+
+
+    def __shuffled(self, chunks):
+        '''
+        Shuffles the examples of a stream of chunks with a shuffle buffer.
+
+        Incoming examples are appended to the buffer. When the buffer is full,
+        a chunk is formed by examples drawn at random from the buffer, and the
+        holes are filled with the last examples of the buffer. At the end of
+        the stream, the remaining examples are shuffled and returned.
+        '''
+        rand = self.__random
+        k = self.chunk_size
+        buf = None
+        n = 0
+        for c in chunks:
+            pair = isinstance(c, tuple)
+            parts = c if pair else (c, )
+            if buf is None:
+                cap = self.buffer_size + k
+                buf = [ empty((cap, ) + p.shape[1:], dtype=p.dtype)
+                        for p in parts ]
+            # Chunks larger than the buffer are added in pieces.
+            for i in range(0, len(parts[0]), k):
+                m = min(len(parts[0]) - i, k)
+                for b, p in zip(buf, parts):
+                    b[n:n+m] = p[i:i+m]
+                n = n + m
+                if n >= self.buffer_size:
+                    idx = rand.permutation(n)[:k]
+                    out = [ b[idx] for b in buf ]
+                    keep = ones((n, ), dtype=bool)
+                    keep[idx] = False
+                    holes = idx[idx < n - k]
+                    tail = keep[n-k:].nonzero()[0] + (n - k)
+                    for b in buf:
+                        b[holes] = b[tail]
+                    n = n - k
+                    yield tuple(out) if pair else out[0]
+        if n > 0:
+            idx = rand.permutation(n)
+            for i in range(0, n, k):
+                out = [ b[idx[i:i+k]] for b in buf ]
+                yield tuple(out) if pair else out[0]
+
+
+    def __prefetched(self, chunks):
+        '''
+        Reads the chunks in a background thread, keeping at most ``prefetch``
+        chunks ready. Exceptions raised while reading are raised again in the
+        thread that iterates over the chunks.
+        '''
+        queue = Queue.Queue(self.prefetch)
+        stop = threading.Event()
+        end = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    queue.put(item, True, 0.1)
+                    return True
+                except Queue.Full:
+                    pass
+            return False
+
+        def run():
+            try:
+                for c in chunks:
+                    if not put((c, None)):
+                        return
+            except Exception, e:
+                put((end, e))
+            else:
+                put((end, None))
+
+        worker = threading.Thread(target=run)
+        worker.daemon = True
+        worker.start()
+        try:
+            while True:
+                c, error = queue.get()
+                if c is end:
+                    if error is not None:
+                        raise error
+                    return
+                yield c
+        finally:
+            stop.set()
+
+
+    def __iter__(self):
+        '''
+        Iterates over the chunks of one epoch.
+        '''
+        chunks = self.__read_chunks()
+        if self.shuffle:
+            chunks = self.__shuffled(chunks)
+        if self.prefetch > 0:
+            chunks = self.__prefetched(chunks)
+        return iter(chunks)
+
+
+################################################################################
+# Test
+if __name__ == "__main__":
+    pass
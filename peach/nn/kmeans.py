@@ -21,25 +21,108 @@ positioning them, and then computing their variance.
 """
 
 ################################################################################
-from numpy import sum, argmin, array, mean, reshape
-from numpy.random import standard_normal
+from numpy import sum, argmin, argmax, array, asarray, mean, reshape, dot
+from numpy import empty, bincount, array_equal, newaxis, minimum, maximum
+from numpy import cumsum, searchsorted, frombuffer, sqrt, arange, where, inf
+from numpy import finfo, zeros
+from numpy.random import standard_normal, RandomState
+from numpy import random as _random
+import multiprocessing as _multiprocessing
+from multiprocessing import sharedctypes as _sharedctypes
+import time as _time
 
 
 ################################################################################
 # Functions
 ################################################################################
 
+def _kmeanspp(x, k, rand):
+    '''
+    Chooses ``k`` initial centers among the points in the array ``x``, one per
+    line, with the k-means++ method: the first center is chosen uniformly, and
+    each of the following is chosen with probability proportional to the
+    squared distance of the point to the nearest center already chosen.
+    ``rand`` is the random number generator used.
+    '''
+    n = len(x)
+    c = empty((k, x.shape[1]))
+    c[0] = x[rand.randint(n)]
+    x2 = sum(x*x, axis=1)
+    d2 = x2 - 2.*dot(x, c[0]) + dot(c[0], c[0])
+    maximum(d2, 0., d2)
+    for i in range(1, k):
+        p = cumsum(d2)
+        if p[-1] > 0.:
+            j = searchsorted(p, rand.random_sample() * p[-1], 'right')
+        else:
+            j = rand.randint(n)
+        c[i] = x[min(j, n-1)]
+        di = x2 - 2.*dot(x, c[i]) + dot(c[i], c[i])
+        minimum(d2, maximum(di, 0., di), d2)
+    return c
+
+
+def _restart(x, nclusters, classifier, clusterer, init, seed, imax):
+    '''
+    Runs the K-Means algorithm once over the array ``x``, from a random
+    initialization given by ``init`` and ``seed``. Returns the centers found,
+    the inertia of the solution, the number of iterations and the time spent.
+    '''
+    t0 = _time.time()
+    km = KMeans(x, nclusters, classifier, clusterer, init=init, seed=seed)
+    c = km(imax)
+    return c, km.inertia, km.iterations, _time.time() - t0
+
+
+# Data shared with the worker processes, set by ``_worker_init``.
+_shared = { }
+
+def _worker_init(raw, shape, nclusters, classifier, clusterer, init):
+    '''
+    Initializes a worker process of a pool that runs restarts of the K-Means
+    algorithm. The training set is read from the shared memory ``raw``,
+    without copying.
+    '''
+    _shared['args'] = (frombuffer(raw).reshape(shape), nclusters, classifier,
+                       clusterer, init)
+
+
+def _worker_restart(args):
+    '''
+    Runs a restart of the K-Means algorithm in a worker process, given the
+    seed and the maximum number of iterations.
+    '''
+    seed, imax = args
+    return _restart(*(_shared['args'] + (seed, imax)))
+
+
+def _points(x):
+    '''
+    Converts a set of points to a two-dimensional array, one point per line.
+    '''
+    x = asarray(x, dtype=float)
+    if x.ndim < 2:
+        x = reshape(x, (len(x), -1))
+    return x
+
+
 ################################################################################
 # Classifiers
 # These functions classify a set of points associating them to centers according
 # to a given metric. To create a classifier, the first parameter must be the set
 # of points, and the second parameter must be the list of centers. No other
-# parameters are needed.
-def ClassByDistance(xs, c):
+# parameters are needed. Both are given as two-dimensional arrays, with one
+# point or center per line, and the function must return a sequence of integers,
+# preferably an array, with the index of the center of each point.
+def ClassByDistance(xs, c, chunk_size=4096):
     '''
     Given a set of points and a list of centers, classify the points according
     to their euclidian distance to the centers.
 
+    The squared distances are expanded as ``||x||^2 - 2 x.c + ||c||^2``, and
+    computed with matrix products over blocks of points. Since ``||x||^2`` is
+    the same for every center, it is not computed.
+
     :Parameters:
       xs
         Set of points to be classified. They must be given as a list or array of
@@ -47,24 +130,203 @@ def ClassByDistance(xs, c):
       c
         Set of centers. Must also be given as a lista or array of
         one-dimensional vectors, one per line.
+      chunk_size
+        The number of points classified at once. Defaults to 4096.
 
     :Returns:
-      A list of index of the classification. The indices are the position of the
-      cluster in the given parameters ``c``.
+      An array of integers with the index of the classification. The indices
+      are the position of the cluster in the given parameters ``c``.
     '''
-    res = [ ]
-    for x in xs:
-        dists = sum((x - c)**2, axis=1)
-        res.append(argmin(dists))
+    xs = asarray(xs)
+    c = asarray(c)
+    ct = -2. * c.transpose()
+    c2 = sum(c*c, axis=1)
+    res = empty((len(xs), ), dtype=int)
+    for i in range(0, len(xs), chunk_size):
+        d = dot(xs[i:i+chunk_size], ct)
+        d += c2
+        res[i:i+chunk_size] = argmin(d, axis=1)
     return res
 
 
+class ClassByBounds(object):
+    '''
+    Classifies points according to their euclidian distance to the centers,
+    skipping the distances that can be proven unnecessary.
+
+    This classifier gives the same results of ``ClassByDistance``, but it is
+    meant to be called repeatedly over the same set of points with centers that
+    move a little at each call, as it happens in the K-Means algorithm. It
+    keeps, for each point, an upper bound on the distance to its center and a
+    lower bound on the distance to the second closest center (Hamerly's
+    method). When the centers move, the bounds are corrected by the distance
+    each center moved. Points whose upper bound is smaller than the lower bound
+    or than half the distance from their center to the nearest other center
+    can't change their class, and no distance is computed for them. The bounds
+    are taken with a small margin that accounts for rounding errors, so the
+    classification is exactly the same as the one given by ``ClassByDistance``.
+
+    The state is kept only for the last set of points classified, identified by
+    the array object itself, so the array must not be modified between calls.
+    If a different set of points is given, every distance is computed again.
+    To use it with the K-Means algorithm, an instance of this class is given as
+    classifier::
+
+      km = KMeans(xs, 200, classifier=ClassByBounds())
+    '''
+    def __init__(self, chunk_size=4096):
+        '''
+        Initializes the classifier.
+
+        :Parameters:
+          chunk_size
+            The number of points whose distances to every center are computed
+            at once. Defaults to 4096.
+        '''
+        self.chunk_size = chunk_size
+        self.__x = None
+        self.__x2 = None
+        self.__c = None
+        self.__computed = 0
+        self.__total = 0
+        self.skipped = 0.
+        '''The ratio of point-to-center distances that were not computed in
+        the last call.'''
+
+    def __getratio(self):
+        if self.__total == 0:
+            return 0.
+        return 1. - float(self.__computed) / self.__total
+    ratio = property(__getratio, None)
+    '''The ratio of point-to-center distances that were not computed since
+    the classifier was created or reset. Not writable.'''
+
+    def reset(self):
+        '''
+        Discards the bounds and the counters of computed distances.
+        '''
+        self.__x = None
+        self.__c = None
+        self.__computed = 0
+        self.__total = 0
+        self.skipped = 0.
+
+    def __nearest(self, x, x2, c):
+        '''
+        Computes the distances of the points in ``x``, with squared norms
+        ``x2``, to every center in ``c``. Returns the index of the nearest
+        center, the distance to it and the distance to the second nearest.
+        '''
+        ct = -2. * c.transpose()
+        c2 = sum(c*c, axis=1)
+        n = len(x)
+        a = empty((n, ), dtype=int)
+        u = empty((n, ))
+        l = empty((n, ))
+        for i in range(0, n, self.chunk_size):
+            d = dot(x[i:i+self.chunk_size], ct)
+            d += c2
+            ai = argmin(d, axis=1)
+            r = arange(len(d))
+            a[i:i+self.chunk_size] = ai
+            u[i:i+self.chunk_size] = d[r, ai]
+            if len(c) > 1:
+                d[r, ai] = inf
+                l[i:i+self.chunk_size] = d.min(axis=1)
+            else:
+                l[i:i+self.chunk_size] = inf
+        u += x2
+        l += x2
+        return a, sqrt(maximum(u, 0., u)), sqrt(maximum(l, 0., l))
+
+    def __call__(self, xs, c):
+        '''
+        Classifies the points according to their euclidian distance to the
+        centers.
+
+        :Parameters:
+          xs
+            Set of points to be classified, given as an array of
+            one-dimensional vectors, one per line.
+          c
+            Set of centers, given as an array of one-dimensional vectors, one
+            per line.
+
+        :Returns:
+          An array of integers with the index of the center of each point.
+        '''
+        xs = asarray(xs)
+        c = array(c, dtype=float)
+        n, k = len(xs), len(c)
+        c2 = sum(c*c, axis=1)
+        if self.__x is not xs or self.__c is None or \
+           self.__c.shape != c.shape:
+            self.__x = xs
+            self.__x2 = sum(xs*xs, axis=1)
+            self.__a, self.__u, self.__l = self.__nearest(xs, self.__x2, c)
+            computed = n * k
+        else:
+            computed = self.__update(c, c2)
+        self.__c = c
+        self.__computed = self.__computed + computed
+        self.__total = self.__total + n * k
+        self.skipped = 1. - float(computed) / max(n * k, 1)
+        return self.__a.copy()
+
+    def __update(self, c, c2):
+        '''
+        Updates the bounds for the new centers ``c``, with squared norms
+        ``c2``, and classifies again the points that could have changed their
+        class. Returns the number of distances computed.
+        '''
+        x, x2, a, u, l = self.__x, self.__x2, self.__a, self.__u, self.__l
+        k = len(c)
+
+        # The squared distances computed by expanding the products carry a
+        # rounding error proportional to the squared norms. A point keeps its
+        # class only if its bounds are apart by more than this error.
+        delta = 4. * (x.shape[1] + 2) * finfo(float).eps * \
+                (x2.max() + c2.max())
+        tol = 2. * sqrt(delta)
+
+        # Bounds are moved by the drift of the centers. The lower bound of each
+        # point is moved by the largest drift among the other centers.
+        p = c - self.__c
+        p = sqrt(sum(p*p, axis=1))
+        u += p[a]
+        if k > 1:
+            j = argmax(p)
+            pj = p[j]
+            p[j] = 0.
+            l -= where(a == j, p.max(), pj)
+            cc = c2[:, newaxis] - 2. * dot(c, c.transpose()) + c2
+            cc[arange(k), arange(k)] = inf
+            s = 0.5 * sqrt(maximum(cc.min(axis=1), 0.))
+            bound = maximum(s[a], l)
+        else:
+            bound = l
+
+        # The upper bound of the remaining points is tightened with the
+        # distance to their center, and those that still can't be decided are
+        # classified again.
+        i = (u + tol >= bound).nonzero()[0]
+        if len(i) == 0:
+            return 0
+        d = x[i] - c[a[i]]
+        u[i] = sqrt(sum(d*d, axis=1))
+        i = i[u[i] + tol >= bound[i]]
+        if len(i) > 0:
+            a[i], u[i], l[i] = self.__nearest(x[i], x2[i], c)
+        return len(d) + len(i) * k
+
+
 ################################################################################
 # Clusterers
 # These functions compute, from a set of points, a single vector that represents
 # the cluster. To create a clusterer, the function needs only one parameter, the
-# set of points to be clustered. This is given in form of a list. The function
-# must return a single vector representing the cluster.
+# set of points to be clustered. This is given in form of a two-dimensional
+# array, with one point per line. The function must return a single vector
+# representing the cluster.
 def ClusterByMean(x):
     '''
     This function computes the center of a cluster by averaging the vectors in
@@ -99,9 +361,21 @@ class KMeans(object):
     as the average of the points associated to it. This is the default behaviour
     of this implementation, but it is configurable. Please, read below for more
     detail.
+
+    The result of the algorithm depends on the initial centers. By default,
+    they are chosen with the k-means++ method, and the algorithm can be
+    restarted a number of times, possibly in parallel, keeping the solution with
+    the lowest inertia (the sum of the squared distances of the points to their
+    centers).
+
+    Data sets too large to be kept in memory can be clustered in the mini-batch
+    mode, where the centers are adjusted with chunks of data read from a
+    generator or a ``numpy.memmap``. Please, consult the ``partial_fit`` and
+    ``fit_stream`` methods.
     '''
     def __init__(self, training_set, nclusters, classifier=ClassByDistance,
-                 clusterer=ClusterByMean):
+                 clusterer=ClusterByMean, init='k-means++', ninit=1,
+                 processes=1, seed=None):
         '''
         Initializes the algorithm.
 
@@ -111,43 +385,116 @@ class KMeans(object):
             Each of the vectors in this list *must* have the same dimension, or
             the algorithm won't behave correctly. Notice that each vector can be
             given as a tuple -- internally, everything is converted to arrays.
+            If ``None``, the algorithm can only be run over chunks of data with
+            the ``partial_fit`` and ``fit_stream`` methods, and the centers are
+            initialized from the first chunk.
           nclusters
             The number of clusters to be found. This must be, of course, bigger
             than 1. These represent the number of centers found once the
             algorithm terminates.
           classifier
             A function that classifies each of the points in the training set.
-            This function receives the training set and a list of centers, and
-            classify each of the points according to the given metric. Please,
-            look at the documentation on these functions for more information.
-            Its default value is ``ClassByDistance` , which uses euclidian
-            distance as metric.
+            This function receives the training set and a list of centers, both
+            as arrays, and classify each of the points according to the given
+            metric, returning the array of indices of the centers. Please, look
+            at the documentation on these functions for more information. Its
+            default value is ``ClassByDistance` , which uses euclidian distance
+            as metric.
           clusterer
             A function that computes the center of the cluster, given a set of
-            points. This function receives a list of points and returns the
+            points. This function receives an array of points and returns the
             vector representing the cluster. For more information, look at the
             documentation for these functions. Its default value is
             ``ClusterByMean``, in which the cluster is represented by the mean
-            value of the vectors.
+            value of the vectors. In that case, every center is computed at
+            once, without splitting the training set in clusters.
+          init
+            The method used to choose the initial centers. If
+            ``'k-means++'``, the k-means++ method is used. If ``'random'``,
+            points of the training set are chosen at random. If ``'normal'``,
+            the centers are drawn from a standard normal distribution, which is
+            suited only to normalized data. Defaults to ``'k-means++'``.
+          ninit
+            The number of times the algorithm is run, each time from different
+            initial centers. The solution with the lowest inertia is kept.
+            Defaults to 1.
+          processes
+            The number of worker processes used to run the restarts. The
+            training set is put in shared memory, so it is not copied to the
+            workers. If ``None``, the number of processors is used. If 1, the
+            restarts are run in this process. Notice that, in systems that
+            can't fork processes, the classifier and the clusterer must be
+            picklable functions to be used by the workers. Defaults to 1.
+          seed
+            The seed of the random number generator used to initialize the
+            centers. If ``None``, the global generator of ``numpy`` is used.
+            Defaults to ``None``.
         '''
+        if init not in ('k-means++', 'random', 'normal'):
+            raise ValueError, 'unknown initialization method'
         self.__nclusters = nclusters
-        self.__x = array(training_set)
-        self.__c = standard_normal((nclusters, len(self.__x[0])))
+        if seed is None:
+            self.__random = _random
+        else:
+            self.__random = RandomState(seed)
+        self.__init = init
+        self.__ninit = ninit
+        self.__processes = processes
+        self.__iterations = 0
+        self.__counts = None
         self.classify = classifier
         self.cluster = clusterer
-        self.__xc = self.classify(self.__x, self.__c)
+        self.__x = None
+        self.__c = None
+        self.__xc = None
+        if training_set is not None:
+            self.__x = _points(training_set)
+            self.__c = self.__start(self.__x)
+            self.__xc = asarray(self.classify(self.__x, self.__c), dtype=int)
+        self.restarts = [ ]
+        '''A list with a tuple ``(inertia, iterations, time)`` for each run of
+        the algorithm in the last execution, with the inertia of the solution
+        found, the number of iterations needed and the time spent, in
+        seconds.'''
 
     def __getc(self):
         return self.__c
     def __setc(self, c):
-        self.__c = array(reshape(c, self.__c.shape))
+        if self.__c is None:
+            self.__c = array(reshape(c, (self.__nclusters, -1)), dtype=float)
+        else:
+            self.__c = array(reshape(c, self.__c.shape))
     c = property(__getc, __setc)
     '''A ``numpy`` array containing the centers of the classes in the algorithm.
     Each line represents a center, and the number of lines is the number of
     classes. This property is read and write, but care must be taken when
     setting new centers: if the dimensions are not exactly the same as given in
     the instantiation of the class (*ie*, *C* centers of dimension *N*, an
-    exception will be raised.'''
+    exception will be raised. If no training set was given, it is ``None``
+    until the first chunk of data is seen.'''
+
+    def __getcounts(self):
+        return self.__counts
+    counts = property(__getcounts, None)
+    '''The number of points seen by each center in the mini-batch mode, that
+    is, by the ``partial_fit`` and ``fit_stream`` methods. It is ``None`` if
+    these methods weren't used. Not writable.'''
+
+    def __getinertia(self):
+        if self.__x is None:
+            raise ValueError, 'no training set'
+        xc = asarray(self.classify(self.__x, self.__c), dtype=int)
+        d = self.__x - self.__c[xc]
+        return sum(d*d)
+    inertia = property(__getinertia, None)
+    '''The sum of the squared distances of the points in the training set to
+    the centers of their clusters. Not writable.'''
+
+    def __getiterations(self):
+        return self.__iterations
+    iterations = property(__getiterations, None)
+    '''The number of iterations in the last execution of the algorithm. Not
+    writable.'''
         
     def step(self):
         '''
@@ -159,17 +506,55 @@ class KMeans(object):
         '''
         x = self.__x
         c = self.__c
-        xc = self.classify(x, c)
+        k = self.__nclusters
+        xc = asarray(self.classify(x, c), dtype=int)
         self.__xc = xc
+        if self.cluster is ClusterByMean:
+            # The sums of the points in each cluster are computed at once, and
+            # empty clusters are restarted randomly.
+            n = bincount(xc, minlength=k)
+            cnew = empty(c.shape)
+            for j in range(c.shape[1]):
+                cnew[:, j] = bincount(xc, weights=x[:, j], minlength=k)
+            full = n > 0
+            cnew[full] /= n[full, newaxis]
+            lost = (~full).nonzero()[0]
+            cnew[lost] = self.__restart(len(lost))
+            return cnew
         cnew = [ ]
-        for i in range(self.__nclusters):
-            xi = [ xij for xij, clij in zip(x, xc) if clij == i ]
-            if xi:
-                cnew.append(self.cluster(array(xi)))
+        for i in range(k):
+            xi = x[xc == i]
+            if len(xi) > 0:
+                cnew.append(self.cluster(xi))
             else:
-                cnew.append(standard_normal(c[i,:].shape))
+                cnew.append(self.__restart(1)[0])
         return array(cnew)
 
+    def __start(self, x):
+        '''
+        Chooses the initial centers from the points in the array ``x``, with
+        the initialization method given in the instantiation of the class.
+        '''
+        k = self.__nclusters
+        if self.__init == 'k-means++':
+            return _kmeanspp(x, k, self.__random)
+        elif self.__init == 'random':
+            if len(x) < k:
+                return x[self.__random.randint(len(x), size=k)]
+            return x[self.__random.permutation(len(x))[:k]]
+        else:
+            return self.__random.standard_normal((k, x.shape[1]))
+
+    def __restart(self, n):
+        '''
+        Returns ``n`` new centers for clusters that became empty. Unless the
+        centers were initialized from a normal distribution, they are chosen
+        at random from the training set.
+        '''
+        if self.__init == 'normal':
+            return self.__random.standard_normal((n, self.__x.shape[1]))
+        return self.__x[self.__random.randint(len(self.__x), size=n)]
+
     def __call__(self, imax=20):
         '''
         The ``__call__`` interface is used to run the algorithm until
@@ -184,12 +569,133 @@ class KMeans(object):
           An array containing, at each line, the vectors representing the
           centers of the clustered regions.
         '''
+        if self.__x is None:
+            raise ValueError, 'no training set'
+        if self.__ninit > 1:
+            return self.__multistart(imax)
+        t0 = _time.time()
+        # Each step classifies the points with the centers of the previous
+        # step, so the algorithm has converged when two consecutive steps give
+        # the same classification.
         i = 0
-        xc = [ ]
-        while i < imax and xc != self.__xc:
-            xc = self.__xc
+        xc = None
+        while i < imax:
             self.__c = self.step()
             i = i + 1
+            if xc is not None and array_equal(xc, self.__xc):
+                break
+            xc = self.__xc
+        self.__iterations = i
+        self.restarts = [ (self.inertia, i, _time.time() - t0) ]
+        return self.__c
+
+    def __multistart(self, imax):
+        '''
+        Runs the algorithm ``ninit`` times, from different initial centers,
+        keeping the solution with the lowest inertia. The runs are distributed
+        among worker processes, if more than one is used.
+        '''
+        seeds = self.__random.randint(2**31 - 1, size=self.__ninit)
+        args = (self.__nclusters, self.classify, self.cluster, self.__init)
+        if self.__processes == 1:
+            results = [ _restart(*((self.__x, ) + args + (seed, imax)))
+                        for seed in seeds ]
+        else:
+            x = self.__x
+            raw = _sharedctypes.RawArray('d', x.size)
+            frombuffer(raw)[:] = x.ravel()
+            pool = _multiprocessing.Pool(self.__processes, _worker_init,
+                                        (raw, x.shape) + args)
+            try:
+                results = pool.map(_worker_restart,
+                                   [ (seed, imax) for seed in seeds ])
+            finally:
+                pool.close()
+                pool.join()
+        self.restarts = [ (e, i, t) for c, e, i, t in results ]
+        best = argmin([ e for c, e, i, t in results ])
+        c, e, i, t = results[best]
+        self.__c = c
+        self.__iterations = i
+        self.__xc = asarray(self.classify(self.__x, c), dtype=int)
+        return self.__c
+
+    def partial_fit(self, x):
+        '''
+        Adjusts the centers with a chunk of data, in the mini-batch mode of the
+        algorithm.
+
+        Each point in the chunk is classified, and each center is moved towards
+        the mean of the points associated to it. The learning rate of a center
+        is the number of points in the chunk associated to it divided by the
+        total number of points it has seen so far, so every center is the
+        running mean of the points assigned to it. Only the centers and these
+        counts are kept between calls, so the memory used doesn't depend on the
+        number of points seen. If no centers are set, they are initialized
+        from the chunk.
+
+        :Parameters:
+          x
+            A chunk of points, given as a list or array of vectors, one per
+            line.
+
+        :Returns:
+          An array containing, at each line, the centers of the clusters.
+        '''
+        x = _points(x)
+        if len(x) == 0:
+            return self.__c
+        k = self.__nclusters
+        if self.__c is None:
+            self.__c = self.__start(x)
+        if self.__counts is None:
+            self.__counts = zeros((k, ), dtype=int)
+        xc = asarray(self.classify(x, self.__c), dtype=int)
+        n = bincount(xc, minlength=k)
+        full = n > 0
+        self.__counts += n
+        d = empty(self.__c.shape)
+        for j in range(x.shape[1]):
+            d[:, j] = bincount(xc, weights=x[:, j], minlength=k)
+        d[full] -= n[full, newaxis] * self.__c[full]
+        self.__c[full] += d[full] / self.__counts[full, newaxis]
+        return self.__c
+
+    def fit_stream(self, source, chunk_size=4096, epochs=1):
+        '''
+        Runs the mini-batch mode of the algorithm over a stream of data.
+
+        The data is read in chunks and given to the ``partial_fit`` method, so
+        only one chunk is in memory at a time.
+
+        :Parameters:
+          source
+            The data to be clustered. If it is an array, for example a
+            ``numpy.memmap`` over a file, it is read in slices of
+            ``chunk_size`` points. Otherwise, it must be an iterable, such as a
+            generator, where each element is a chunk of points, given as a list
+            or array of vectors.
+          chunk_size
+            The number of points in each chunk when the source is an array.
+            Defaults to 4096.
+          epochs
+            The number of passes over the data. Notice that a generator can
+            only be read once, so in that case, only one pass is made. Defaults
+            to 1.
+
+        :Returns:
+          An array containing, at each line, the centers of the clusters.
+        '''
+        if hasattr(source, 'shape'):
+            for e in range(epochs):
+                for i in range(0, len(source), chunk_size):
+                    self.partial_fit(source[i:i+chunk_size])
+        else:
+            for e in range(epochs):
+                if iter(source) is source and e > 0:
+                    break
+                for x in source:
+                    self.partial_fit(x)
         return self.__c
 
 
@@ -25,12 +25,9 @@ somewhat complex, care should be taken to make everything work accordingly.
 
 
 ################################################################################
-from numpy import ones, hstack, reshape, dot, sum, exp
-
-
-_BIAS = ones((1, 1), dtype=float)
-"""This constant vector is defined to implement in a fast way the bias of a
-neuron, as an input of value 1, stacked over the real input to the neuron."""
+from numpy import vstack, hstack, reshape, asarray, dot, sum, exp, sqrt, zeros
+from numpy import add, subtract, multiply, divide, square, newaxis
+import weakref as _weakref
 
 
 ################################################################################
@@ -67,6 +64,12 @@ class FFLearning(object):
         where ``nn`` is the ``FeedForward`` instance to be modified *in loco*,
         ``x`` is the input vector and ``d`` is the desired response of the net
         for that particular input vector. It should return nothing.
+
+    Optionally, a class can also implement the ``batch`` method, used to apply
+    the learning method over a number of examples at once. The default
+    implementation just presents the examples one at a time to the ``__call__``
+    interface, so every learning method can be used with batches, but
+    implementing it using matrix operations is a lot more efficient.
     '''
     def __call__(self, nn, x, d):
         '''
@@ -89,6 +92,101 @@ class FFLearning(object):
         raise NotImplementedError, 'learning rule not defined'
 
 
+    def batch(self, nn, x, d):
+        '''
+        Applies the learning method over a batch of examples.
+
+        This implementation feeds the network with each example and calls the
+        ``__call__`` interface for it. Subclasses should reimplement it to
+        compute one accumulated gradient over the whole batch.
+
+        :Parameters:
+          nn
+            A ``FeedForward`` neural network instance that is going to be
+            modified by the learning algorithm. The modification is made *in
+            loco*.
+          x
+            The input vectors from the training set, given as an array of shape
+            ``(N, n)``, one input vector per line.
+          d
+            The desired responses for the given input vectors, given as an array
+            of shape ``(N, m)``, one desired response per line.
+
+        :Returns:
+          An array of shape ``(N, m)`` with the answer of the network to each
+          input vector, computed *before* the synaptic weights were modified.
+          This is used to compute the error over the batch.
+        '''
+        x = reshape(x, (-1, nn[0].inputs))
+        d = reshape(d, (len(x), -1))
+        y = [ ]
+        for xi, di in zip(x, d):
+            y.append(nn(xi).transpose())
+            self(nn, xi, di)
+        return vstack(y)
+
+
+################################################################################
+def _forward(nn, x):
+    '''
+    Feeds a batch of input vectors through the network, keeping the results of
+    every layer. This has no collateral effects on the network.
+
+    :Returns:
+      A tuple ``(xs, vs)``, where ``xs`` is the list of inputs to every layer,
+      followed by the answer of the network, and ``vs`` is the list of the
+      activation potentials of every layer.
+    '''
+    xs = [ reshape(x, (-1, nn[0].inputs)) ]
+    vs = [ ]
+    for w in nn:
+        v = w.potential(xs[-1])
+        vs.append(v)
+        xs.append(w.phi(v))
+    return xs, vs
+
+
+def _gradient(w, g, x):
+    '''
+    Computes the adjustment of the synaptic weights of a layer ``w`` given the
+    local gradients ``g`` computed over a batch of inputs ``x``, averaging the
+    contribution of each example. The learning rate is not applied.
+    '''
+    n = float(len(x))
+    dw = dot(g.transpose(), x) / n
+    if w.bias:
+        db = sum(g, axis=0).reshape((w.size, 1)) / n
+        dw = hstack((db, dw))
+    return dw
+
+
+def _unbiased(w):
+    '''
+    Returns a view of the synaptic weights of the layer ``w`` without the bias
+    weights.
+    '''
+    if w.bias:
+        return w.weights[:, 1:]
+    else:
+        return w.weights
+
+
+def _input(nn, k, x):
+    '''
+    Copies the input of the ``k``-th layer of the network ``nn`` to its
+    workspace, given that ``x`` is the input vector of the network.
+    '''
+    w = nn[k]
+    if k > 0:
+        xk = nn[k-1].y
+    else:
+        xk = reshape(x, (w.inputs, 1))
+    if w.bias:
+        w.workspace.x[1:] = xk
+    else:
+        w.workspace.x[...] = xk
+
+
 ################################################################################
 class LMS(FFLearning):
     '''
@@ -131,38 +229,63 @@ class LMS(FFLearning):
             The desired response for the given input vector.
         '''
         # g would be like the local error gradient for each neuron. In LMS, this
-        # serves only to propagate the error
-        d = reshape(d, (nn.y.shape))
-        g = d - nn.y
+        # serves only to propagate the error. Every computation is made in the
+        # workspaces of the layers, so no memory is allocated.
+        w = nn[-1]
+        subtract(reshape(d, w.y.shape), w.y, out=w.workspace.g)
+
+        # The error is backpropagated, thus the layers are visited from the
+        # last to the first.
+        for k in range(len(nn)-1, -1, -1):
+            w = nn[k]
+            ws = w.workspace
+            _input(nn, k, x)
+
+            # Backpropagate the error, before the weights are changed.
+            if k > 0:
+                dot(_unbiased(w).transpose(), ws.g, out=nn[k-1].workspace.g)
 
-        # The error is backpropagated, thus the lists are inverted. To combine
-        # each layer, we ``zip`` them.
-        for w1, w2 in zip(nn[:-1][::-1], nn[1:][::-1]):
+            # Update synaptic weights
+            multiply(ws.g, ws.x.transpose(), out=ws.dw)
+            multiply(ws.dw, self.lrate, out=ws.dw)
+            add(w.weights, ws.dw, out=w.weights)
 
-            # xs is the input vector, transposed because of backpropagation.
-            xs = w1.y.transpose()
 
-            # Adjusts for bias.
-            if w2.bias:
-                xs = hstack((_BIAS, xs))
-                wt = w2.weights[:, 1:].transpose()
-            else:
-                wt = w2.weights.transpose()
+    def batch(self, nn, x, d):
+        '''
+        Applies the learning method over a batch of examples.
 
-            # Update synaptic weights
-            dw = self.lrate * dot(g, xs)
-            w2.weights = w2.weights + dw
+        The error of every example in the batch is backpropagated at once using
+        matrix products, and the synaptic weights are adjusted only once, with
+        the average of the adjustments of every example. Read the documentation
+        for the base class for more information.
 
-            # Backpropagate the error.
-            g = dot(wt, g)
+        :Parameters:
+          nn
+            A ``FeedForward`` neural network instance that is going to be
+            modified by the learning algorithm.
+          x
+            The input vectors from the training set, one per line.
+          d
+            The desired responses for the given input vectors, one per line.
 
-        # Repeat the procedure for the first layer.
-        w = nn[0]
-        xs = x.reshape((1, w.inputs))
-        if w.bias:
-            xs = hstack((_BIAS, xs))
-        dw = self.lrate * dot(g, xs)
-        w.weights = w.weights + dw
+        :Returns:
+          The answer of the network to each input vector, one per line.
+        '''
+        xs, vs = _forward(nn, x)
+        y = xs[-1]
+        g = reshape(asarray(d, dtype=y.dtype), y.shape) - y
+
+        # The error is backpropagated before the weights of the layer change.
+        for k in range(len(nn)-1, -1, -1):
+            w = nn[k]
+            gk = g
+            if k > 0:
+                g = dot(g, _unbiased(w))
+            dw = _gradient(w, gk, xs[k])
+            multiply(dw, self.lrate, out=dw)
+            add(w.weights, dw, out=w.weights)
+        return y
 
 
 WidrowHoff = LMS
@@ -213,38 +336,353 @@ class BackPropagation(FFLearning):
           d
             The desired response for the given input vector.
         '''
-        # g is the local error gradient for each neuron.
-        d = reshape(d, (nn.y.shape))
-        g = (d - nn.y) * nn[-1].phi.d(nn[-1].v)
+        # g is the local error gradient for each neuron. Every computation is
+        # made in the workspaces of the layers, so no memory is allocated.
+        w = nn[-1]
+        ws = w.workspace
+        subtract(reshape(d, w.y.shape), w.y, out=ws.g)
+        multiply(ws.g, w.derivative(out=ws.d), out=ws.g)
+
+        # The error is backpropagated, thus the layers are visited from the
+        # last to the first.
+        for k in range(len(nn)-1, -1, -1):
+            w = nn[k]
+            ws = w.workspace
+            _input(nn, k, x)
+
+            # Backpropagate the error, before the weights are changed.
+            if k > 0:
+                w1 = nn[k-1]
+                ws1 = w1.workspace
+                dot(_unbiased(w).transpose(), ws.g, out=ws1.g)
+                multiply(ws1.g, w1.derivative(out=ws1.d), out=ws1.g)
 
-        # The error is backpropagated, thus the lists are inverted. To combine
-        # each layer, we ``zip`` them.
-        for w1, w2 in zip(nn[:-1][::-1], nn[1:][::-1]):
+            # Update synaptic weights
+            multiply(ws.g, ws.x.transpose(), out=ws.dw)
+            self.update(w, ws.dw)
 
-            # xs is the input vector, transposed because of backpropagation.
-            xs = w1.y.transpose()
 
-            # Adjusts for bias.
-            if w2.bias:
-                xs = hstack((_BIAS, xs))
-                wt = w2.weights[:, 1:].transpose()
-            else:
-                wt = w2.weights.transpose()
+    def update(self, w, dw):
+        '''
+        Updates the synaptic weights of a layer.
+
+        This method is called by the learning method for every layer of the
+        network, once the adjustment of its weights is computed, and it is
+        responsible to actually change them. In the backpropagation method, the
+        adjustment is scaled by the learning rate and added to the weights.
+        Subclasses can reimplement this method to implement different update
+        strategies, such as the ones that keep some information about previous
+        adjustments.
+
+        :Parameters:
+          w
+            The layer whose synaptic weights are to be updated. The weights
+            must be updated *in loco*.
+          dw
+            The adjustment of the weights, that is, the local gradients of the
+            error multiplied by the inputs of the layer, an array of the same
+            shape as the weights of the layer. The contents of this array can be
+            overwritten by this method.
+        '''
+        multiply(dw, self.lrate, out=dw)
+        add(w.weights, dw, out=w.weights)
+
+
+    def batch(self, nn, x, d):
+        '''
+        Applies the learning method over a batch of examples.
+
+        The error of every example in the batch is backpropagated at once using
+        matrix products, and the synaptic weights are adjusted only once, with
+        the average of the adjustments of every example. Read the documentation
+        for the base class for more information.
+
+        :Parameters:
+          nn
+            A ``FeedForward`` neural network instance that is going to be
+            modified by the learning algorithm.
+          x
+            The input vectors from the training set, one per line.
+          d
+            The desired responses for the given input vectors, one per line.
+
+        :Returns:
+          The answer of the network to each input vector, one per line.
+        '''
+        xs, vs = _forward(nn, x)
+        y = xs[-1]
+        g = reshape(asarray(d, dtype=y.dtype), y.shape) - y
+        g *= nn[-1].phi.dy(y, vs[-1])
+
+        # The error is backpropagated before the weights of the layer change.
+        for k in range(len(nn)-1, -1, -1):
+            w = nn[k]
+            gk = g
+            if k > 0:
+                g = dot(g, _unbiased(w))
+                g *= nn[k-1].phi.dy(xs[k], vs[k-1])
+            self.update(w, _gradient(w, gk, xs[k]))
+        return y
+
+
+################################################################################
+class Adaptive(BackPropagation):
+    '''
+    Base class for backpropagation with adaptive updates.
+
+    The errors are backpropagated and the adjustments of the synaptic weights
+    are computed exactly as in the ``BackPropagation`` method, but the way the
+    weights are updated depends on the history of the previous adjustments.
+    This information is kept for each layer in a number of arrays of the same
+    shape as the weights of the layer. As a base class, this class doesn't do
+    anything: subclasses should implement the ``update`` method, and use the
+    ``state`` method to get the arrays associated to the layer.
+
+    Since the state of the learning method is associated to the layers, an
+    instance of these classes can be shared by different networks. The state
+    is only weakly referenced by the layers, so it is freed when the layer is.
+    '''
+    def __init__(self, lrate, n):
+        '''
+        Initializes the object.
+
+        :Parameters:
+          lrate
+            Learning rate to be used in the algorithm.
+          n
+            The number of arrays kept for each layer.
+        '''
+        BackPropagation.__init__(self, lrate)
+        self.__n = n
+        self.__state = _weakref.WeakKeyDictionary()
+
+
+    def state(self, w):
+        '''
+        Returns the state associated to a layer.
+
+        :Parameters:
+          w
+            The layer.
+
+        :Returns:
+          A list where the first element is the number of times the weights of
+          the layer were updated, followed by the arrays associated to the
+          layer. These arrays are created, filled with zeros, the first time the
+          layer is updated, or if the shape or type of the weights changed, and
+          can be modified in place.
+        '''
+        key = (w.weights.shape, w.dtype)
+        try:
+            k, s = self.__state[w]
+            if k == key:
+                return s
+        except KeyError:
+            pass
+        s = [ 0 ] + [ zeros(w.weights.shape, dtype=w.dtype)
+                      for i in range(self.__n) ]
+        self.__state[w] = (key, s)
+        return s
+
+
+    def reset(self):
+        '''
+        Forgets the state of every layer, so the learning starts anew.
+        '''
+        self.__state = _weakref.WeakKeyDictionary()
+
+
+################################################################################
+class Momentum(Adaptive):
+    '''
+    Backpropagation with momentum.
+
+    In this method, the synaptic weights of each layer are updated with a
+    velocity, which is an exponentially decaying accumulation of the
+    adjustments computed by the backpropagation. This speeds up the convergence
+    in directions where the error surface has a consistent slope, and damps
+    oscillations in directions where it changes a lot.
+    '''
+    def __init__(self, lrate=0.05, momentum=0.9):
+        '''
+        Initializes the object.
+
+        :Parameters:
+          lrate
+            Learning rate to be used in the algorithm. Defaults to 0.05.
+          momentum
+            The fraction of the velocity kept from one update to the next. It
+            must be between 0 and 1. Defaults to 0.9.
+        '''
+        Adaptive.__init__(self, lrate, 1)
+        self.momentum = momentum
+        '''Momentum used in the algorithm.'''
+
+
+    def update(self, w, dw):
+        '''
+        Updates the synaptic weights of a layer. Read the documentation for the
+        ``BackPropagation`` class for more information.
+        '''
+        s = self.state(w)
+        s[0] = s[0] + 1
+        v = s[1]
+        multiply(v, self.momentum, out=v)
+        multiply(dw, self.lrate, out=dw)
+        add(v, dw, out=v)
+        add(w.weights, v, out=w.weights)
+
+
+################################################################################
+class Nesterov(Adaptive):
+    '''
+    Backpropagation with Nesterov accelerated momentum.
+
+    This method is similar to the ``Momentum`` method, but the update takes
+    into account the position where the velocity is going to take the weights,
+    which usually gives a faster and more stable convergence. The usual
+    reformulation, that doesn't need to compute the adjustments at a different
+    point than the current weights, is used.
+    '''
+    def __init__(self, lrate=0.05, momentum=0.9):
+        '''
+        Initializes the object.
+
+        :Parameters:
+          lrate
+            Learning rate to be used in the algorithm. Defaults to 0.05.
+          momentum
+            The fraction of the velocity kept from one update to the next. It
+            must be between 0 and 1. Defaults to 0.9.
+        '''
+        Adaptive.__init__(self, lrate, 1)
+        self.momentum = momentum
+        '''Momentum used in the algorithm.'''
 
-            # Update synaptic weights
-            dw = self.lrate * dot(g, xs)
-            w2.weights = w2.weights + dw
 
-            # Backpropagate the error.
-            g = dot(wt, g) * w1.phi.d(w1.v)
+    def update(self, w, dw):
+        '''
+        Updates the synaptic weights of a layer. Read the documentation for the
+        ``BackPropagation`` class for more information.
+        '''
+        s = self.state(w)
+        s[0] = s[0] + 1
+        v = s[1]
+        multiply(v, self.momentum, out=v)
+        multiply(dw, self.lrate, out=dw)
+        add(v, dw, out=v)
+        add(w.weights, dw, out=w.weights)
+        multiply(v, self.momentum, out=dw)
+        add(w.weights, dw, out=w.weights)
+
 
-        # Repeat the procedure for the first layer.
-        w = nn[0]
-        xs = x.reshape((1, w.inputs))
-        if w.bias:
-            xs = hstack((_BIAS, xs))
-        dw = self.lrate * dot(g, xs)
-        w.weights = w.weights + dw
+################################################################################
+class RMSProp(Adaptive):
+    '''
+    Backpropagation with RMSProp updates.
+
+    In this method, the adjustment of each synaptic weight is divided by a
+    running estimate of its magnitude (the root mean square of the recent
+    adjustments). This gives every weight its own, automatically adapted,
+    learning rate.
+    '''
+    def __init__(self, lrate=0.001, rho=0.9, eps=1e-8):
+        '''
+        Initializes the object.
+
+        :Parameters:
+          lrate
+            Learning rate to be used in the algorithm. Defaults to 0.001.
+          rho
+            Decay of the running average of the squared adjustments. Defaults
+            to 0.9.
+          eps
+            A small number to avoid divisions by zero. Defaults to 1e-8.
+        '''
+        Adaptive.__init__(self, lrate, 2)
+        self.rho = rho
+        '''Decay of the running average of the squared adjustments.'''
+        self.eps = eps
+        '''Small number added to the denominator of the update.'''
+
+
+    def update(self, w, dw):
+        '''
+        Updates the synaptic weights of a layer. Read the documentation for the
+        ``BackPropagation`` class for more information.
+        '''
+        s = self.state(w)
+        s[0] = s[0] + 1
+        r, t = s[1:]
+        multiply(r, self.rho, out=r)
+        square(dw, out=t)
+        multiply(t, 1. - self.rho, out=t)
+        add(r, t, out=r)
+        sqrt(r, out=t)
+        add(t, self.eps, out=t)
+        divide(dw, t, out=dw)
+        multiply(dw, self.lrate, out=dw)
+        add(w.weights, dw, out=w.weights)
+
+
+################################################################################
+class Adam(Adaptive):
+    '''
+    Backpropagation with Adam updates.
+
+    This method keeps running estimates of the first moment (the mean) and of
+    the second moment (the uncentered variance) of the adjustments of each
+    synaptic weight. The weights are updated in the direction of the first
+    moment, scaled by the square root of the second moment. The estimates are
+    corrected for their bias towards zero in the first updates.
+    '''
+    def __init__(self, lrate=0.001, beta1=0.9, beta2=0.999, eps=1e-8):
+        '''
+        Initializes the object.
+
+        :Parameters:
+          lrate
+            Learning rate to be used in the algorithm. Defaults to 0.001.
+          beta1
+            Decay of the running average of the adjustments. Defaults to 0.9.
+          beta2
+            Decay of the running average of the squared adjustments. Defaults
+            to 0.999.
+          eps
+            A small number to avoid divisions by zero. Defaults to 1e-8.
+        '''
+        Adaptive.__init__(self, lrate, 3)
+        self.beta1 = beta1
+        '''Decay of the running average of the adjustments.'''
+        self.beta2 = beta2
+        '''Decay of the running average of the squared adjustments.'''
+        self.eps = eps
+        '''Small number added to the denominator of the update.'''
+
+
+    def update(self, w, dw):
+        '''
+        Updates the synaptic weights of a layer. Read the documentation for the
+        ``BackPropagation`` class for more information.
+        '''
+        s = self.state(w)
+        s[0] = n = s[0] + 1
+        m, r, t = s[1:]
+        multiply(m, self.beta1, out=m)
+        multiply(dw, 1. - self.beta1, out=t)
+        add(m, t, out=m)
+        multiply(r, self.beta2, out=r)
+        square(dw, out=t)
+        multiply(t, 1. - self.beta2, out=t)
+        add(r, t, out=r)
+
+        # Corrects the bias of the estimates and updates the weights.
+        multiply(r, 1. / (1. - self.beta2**n), out=t)
+        sqrt(t, out=t)
+        add(t, self.eps, out=t)
+        divide(m, t, out=t)
+        multiply(t, self.lrate / (1. - self.beta1**n), out=t)
+        add(w.weights, t, out=w.weights)
 
 
 ################################################################################
@@ -413,20 +851,25 @@ class Cooperative(SOMLearning):
     allows for better adjustment of the synaptic weights.
 
     Also, a neighborhood is defined on the winner. Neurons close to the winner
-    are also updated in the direction of the input vector, although with a
-    smaller scale determined by the neighborhood function. A neighborhood
-    function is 1. at 0., and decreases monotonically as the distance increases.
-
-    *There are issues with this class!* -- some of the class capabilities are
-    yet to be developed.
+    in the grid of the map are also updated in the direction of the input
+    vector, although with a smaller scale determined by the neighborhood
+    function. A neighborhood function is 1. at 0., and decreases monotonically
+    as the distance increases. As time passes, the radius of the neighborhood
+    shrinks, and only neurons inside the radius are updated, so the cost of
+    each step depends on the size of the neighborhood, not on the size of the
+    map.
     '''
-    def __init__(self, lrate=0.05, tl=1000, tn=1000):
+    def __init__(self, lrate=0.05, s0=None, tl=1000, tn=1000):
         '''
         Initializes the object.
 
         :Parameters:
           lrate
             Learning rate to be used in the algorithm. Defaults to 0.05.
+          s0
+            Initial radius of the neighborhood, measured in the grid of the map.
+            If ``None``, half the greatest distance in the grid of the first
+            map trained is used. Defaults to ``None``.
           tl
             Time constant that measures how many iterations will be needed to
             reduce the learning rate to a small value. Defaults to 1000.
@@ -434,11 +877,15 @@ class Cooperative(SOMLearning):
             Time constant that measures how many iterations will be needed to
             shrink the neighborhood. Defaults to 1000.
         '''
+        self.lrate = lrate
         self.__neighbor = 1.0
         self.__lrate = 1.0
         self.__lrm = exp(-1.0/float(tl))
         self.__nbm = exp(-1.0/float(tn))
-        self.__s0 = float(s0)
+        if s0 is None:
+            self.__s0 = None
+        else:
+            self.__s0 = float(s0)
 
 
     def __call__(self, nn, x):
@@ -458,25 +905,28 @@ class Cooperative(SOMLearning):
           x
             The input vector from the training set.
         '''
-        xs = x.reshape((nn.inputs, 1))
+        x = reshape(x, (nn.inputs, ))
         i = nn.y
         w = nn.weights
-        wi = nn.weights[i, :]
+        if self.__s0 is None:
+            self.__s0 = max(nn.diameter / 2., 1.)
 
         # Adjusts the learning rate according to an exponential rule
-        lrate = nn.lrate * self.__lrate
+        lrate = self.lrate * self.__lrate
         self.__lrate = self.__lrate * self.__lrm
 
-        # Apply neighborhood function.
+        # Apply neighborhood function over the neurons inside the radius.
         s = self.__s0 * self.__neighbor
         self.__neighbor = self.__neighbor * self.__nbm
-        d = sum((wi - w)**2, axis=1)
-        h = exp(-d/(2*s**2))
+        k = nn.neighbors(i, s)
+        c = nn.coordinates
+        d = c[k] - c[i]
+        h = exp(-sum(d*d, axis=1)/(2*s*s))
 
         # Updates the weights
-        dw = lrate * h * (x - w).transpose()
-        w = w + dw.transpose()
-        nn.weights = w
+        dw = x - w[k]
+        dw *= (lrate * h)[:, newaxis]
+        w[k] += dw
 
 
 ################################################################################
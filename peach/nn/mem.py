@@ -23,7 +23,7 @@ estimate through an iterative process.
 """
 
 ################################################################################
-from numpy import zeros, eye, all
+from numpy import zeros, eye, all, fill_diagonal, where, inf, arange
 from random import randrange
 
 from peach.nn.base import *
@@ -65,7 +65,7 @@ class Hopfield(Layer):
             The activation function. Traditionally, the Hopfield network uses
             the signum function as activation. This is the default value.
         '''
-        Layer.__init__(self, (size, 1), phi=Signum, bias=False)
+        Layer.__init__(self, (size, 1), phi=phi, bias=False)
         self.__size = size
         self.__weights = zeros((size, size))
 
@@ -87,6 +87,20 @@ class Hopfield(Layer):
     array must be the same shape of the neuron, or an exception is raised.'''
 
 
+    def _bind(self, weights):
+        '''
+        Replaces the weight matrix of the network by the given array, without
+        copying it. Please, consult the ``Layer`` documentation.
+
+        :Parameters:
+          weights
+            The new weight matrix.
+        '''
+        if weights.shape != self.__weights.shape:
+            raise ValueError, 'weight array has the wrong shape'
+        self.__weights = weights
+
+
     def learn(self, x):
         '''
         Applies one example of the training set to the network.
@@ -105,11 +119,7 @@ class Hopfield(Layer):
             of any dimensionality, but it will internally be converted to a
             column vector.
         '''
-        n = self.size
-        print n, len(x)
-        x = array(x).reshape((1, n))
-        self.weights = self.weights + 1./float(n) * dot(x.T, x)
-        self.weights = self.weights * (1 - eye(n))
+        self.train([ x ])
 
 
     def train(self, train_set):
@@ -117,16 +127,21 @@ class Hopfield(Layer):
         Presents a training set to the network
 
         This method stores all the patterns of the training set in the weight
-        matrix. It calls the ``learn`` method for every pattern in the set.
+        matrix. The Hebbian rule is applied to every pattern at once: the sum
+        of the outer products of the patterns is computed as a single matrix
+        product, and the diagonal of the weight matrix is then set to zero.
 
         :Parameters:
           train_set
-            A list containing all the patterns to be stored in the network. Each
-            pattern is a vector of any dimensions, which are converted
-            internally to a column vector.
+            A list or array containing all the patterns to be stored in the
+            network. Each pattern is a vector of any dimensions, which are
+            converted internally to a line of a matrix.
         '''
-        for x in train_set:
-            self.learn(x)
+        n = self.size
+        x = reshape(asarray(train_set, dtype=float), (-1, n))
+        w = self.__weights
+        w += dot(x.T, x) / float(n)
+        fill_diagonal(w, 0.)
 
 
     def step(self, x):
@@ -145,9 +160,10 @@ class Hopfield(Layer):
 
         :Returns:
           The result of one step of the convergence. This might be the same as
-          the input pattern, or the pattern with one component inverted.
+          the input pattern, or the pattern with one component inverted. The
+          input pattern is not modified.
         '''
-        x = reshape(x, (self.inputs, 1))
+        x = array(reshape(x, (self.inputs, 1)), dtype=float)
         k = randrange(self.size)
         y = self.phi(dot(self.weights[:, k], x)[0])
         if y != 0:
@@ -162,10 +178,15 @@ class Hopfield(Layer):
         The ``__call__`` interface should be called if a memory needs to be
         recovered from the network. Given a noisy pattern ``x``, the algorithm
         will be executed until convergence or a maximum number of iterations
-        occur. This method repeatedly calls the ``step`` method until a stop
-        condition is reached. The stop condition is the maximum number of
-        iterations, or a number of iterations where no changes are found in the
-        retrieved pattern.
+        occur. At each iteration, a neuron is chosen at random and updated, as
+        in the ``step`` method. The local fields of the neurons, that is, their
+        activation potentials, are computed once, and updated only when a
+        neuron changes, so an iteration that changes nothing takes constant
+        time. The stop condition is the maximum number of iterations, or a
+        number of iterations where no changes are found in the retrieved
+        pattern, provided that no neuron would change anymore, which is
+        verified from the local fields. To recover a number of patterns at
+        once, consult the ``recall`` method.
 
         :Parameters:
           x
@@ -177,23 +198,99 @@ class Hopfield(Layer):
           eqmax
             The maximum number of iterations the algorithm will be repeated if
             no changes occur in the retrieval of the pattern. At each iteration
-            of the algorithm, a component might change. It is considered that,
-            if a number of iterations are performed and no changes are found in
-            the pattern, then the algorithm converged, and it stops. Defaults to
-            100.
+            of the algorithm, a component might change. If a number of
+            iterations are performed and no changes are found in the pattern,
+            the local fields are checked and, if no neuron would change, the
+            algorithm converged, and it stops. Defaults to 100.
 
         :Returns:
           The vector containing the recovered pattern from the stored memories.
         '''
+        w = self.__weights
+        x = array(reshape(x, (self.inputs, 1)), dtype=float)
+        h = dot(w, x[:, 0])
         i = 0
         eq = 0
         while i < imax and eq < eqmax:
-            xnew = self.step(x)
-            if any(xnew != x):
-                x = xnew
+            k = randrange(self.size)
+            y = self.phi(h[k])
+            if y != 0 and y != x[k, 0]:
+                h += (y - x[k, 0]) * w[:, k]
+                x[k, 0] = y
                 eq = 0
             i = i + 1
             eq = eq + 1
+            if eq == eqmax:
+                # The pattern is accepted only if it is a fixed point.
+                y = self.phi(h)
+                if ((y != 0) & (y != x[:, 0])).any():
+                    eq = 0
+        return x
+
+
+    def energy(self, x):
+        '''
+        Computes the energy of patterns in the network.
+
+        The energy of a pattern ``x`` is given by ``-x'Wx/2``, where ``W`` is
+        the weight matrix. The patterns stored in the network are local minima
+        of the energy, and it never increases during the asynchronous recovery.
+
+        :Parameters:
+          x
+            A pattern, or an array of patterns, one per line.
+
+        :Returns:
+          The energy of the pattern, or an array with the energy of each
+          pattern.
+        '''
+        x = asarray(x, dtype=float)
+        xs = reshape(x, (-1, self.size))
+        e = -0.5 * (dot(xs, self.__weights) * xs).sum(axis=1)
+        if x.size == self.size:
+            return e[0]
+        return e
+
+
+    def recall(self, x, imax=100):
+        '''
+        Recovers a number of stored patterns at once, updating every neuron
+        synchronously.
+
+        At each iteration, the local fields of every neuron for every pattern
+        are computed with a single matrix product, and all the neurons are
+        updated at the same time. Neurons whose local field is zero keep their
+        states. With synchronous updates, the energy ``-x(t)'Wx(t-1)`` never
+        increases, and a pattern is considered recovered when it stops
+        decreasing. This happens when the pattern reaches a fixed point, or
+        when it alternates between two states, in which case the last one is
+        returned. Recovered patterns are not computed anymore.
+
+        :Parameters:
+          x
+            An array of noisy patterns, one per line.
+          imax
+            The maximum number of iterations. Defaults to 100.
+
+        :Returns:
+          An array with the recovered patterns, one per line.
+        '''
+        w = self.__weights
+        x = array(reshape(x, (-1, self.size)), dtype=float)
+        e = zeros((len(x), )) + inf
+        active = arange(len(x))
+        i = 0
+        while i < imax and len(active) > 0:
+            xa = x[active]
+            h = dot(xa, w)
+            y = self.phi(h)
+            y = where(y == 0, xa, y)
+            ea = -(y * h).sum(axis=1)
+            x[active] = y
+            down = ea < e[active]
+            e[active] = ea
+            active = active[down]
+            i = i + 1
         return x
 
 
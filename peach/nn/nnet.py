@@ -21,14 +21,95 @@ net is developed from the ground up.
 """
 
 ################################################################################
-from numpy import array, sum, abs, reshape, sqrt, argmin, zeros, dot
+from numpy import array, asarray, sum, abs, reshape, sqrt, argmin, zeros, dot
+from numpy import empty, arange, bincount, exp, maximum, newaxis
+from numpy import argsort, searchsorted, minimum, argmax, log, inf, ones
+from numpy import subtract
+from numpy.random import permutation
 import random
+import time as _time
 
 from base import *
 from af import *
+from af import _call
 from lrules import *
+from kmeans import KMeans, ClassByBounds
+from data import DataSource
+
+
+
+################################################################################
+# Functions
+################################################################################
+def _fit(epoch, validate, weights, epochs, patience, emax, callback):
+    '''
+    Runs the epochs of the ``fit`` methods of the networks.
+
+    ``epoch`` is a function that presents the training set once to the network,
+    returning the mean error over the epoch and the number of examples
+    presented. ``validate`` is ``None`` or a function that returns the error
+    over the validation set. ``weights`` is the list of the weight arrays of the
+    network, that are copied in the best epoch and restored when the training
+    stops, if ``patience`` is given. Returns the history of the training, a list
+    with the report of every epoch.
+    '''
+    history = [ ]
+    best = inf
+    saved = None
+    wait = 0
+    for e in range(epochs):
+        t0 = _time.time()
+        error, n = epoch()
+        t = _time.time() - t0
+        report = { 'epoch': e + 1, 'error': error, 'time': t,
+                   'samples_per_sec': n / max(t, 1e-9) }
+        monitored = error
+        if validate is not None:
+            report['validation'] = monitored = validate()
+        history.append(report)
+        if callback is not None:
+            callback(report)
+        if monitored < best:
+            best = monitored
+            wait = 0
+            if patience is not None:
+                saved = [ array(w) for w in weights ]
+        else:
+            wait = wait + 1
+        if monitored <= emax:
+            break
+        if patience is not None and wait >= patience:
+            break
+    if saved is not None:
+        for w, v in zip(weights, saved):
+            w[...] = v
+    return history
+
+
+def _chunks(x, d, randomize):
+    '''
+    Gives the chunks of one epoch of a training set, as tuples ``(x, d)``, with
+    ``d`` set to ``None`` if there are no desired responses. The training set
+    can be a ``DataSource``, which shuffles the examples by itself, or arrays,
+    which are given as a single chunk, shuffled if ``randomize`` is ``True``.
+    '''
+    if isinstance(x, DataSource):
+        for c in x:
+            if isinstance(c, tuple):
+                yield c
+            else:
+                yield c, None
+    else:
+        if randomize:
+            k = permutation(len(x))
+            x = x[k]
+            if d is not None:
+                d = d[k]
+        yield x, d
+
 
-        
+################################################################################
+# Classes
 ################################################################################
 class FeedForward(list):
     '''
@@ -45,7 +126,8 @@ class FeedForward(list):
     other kind of learning can be used. Please, consult the documentation on the
     ``lrules`` (*learning rules*) module.
     '''
-    def __init__(self, layers, phi=Linear, lrule=BackPropagation, bias=False):
+    def __init__(self, layers, phi=Linear, lrule=BackPropagation, bias=False,
+                 workspace=False, dtype=float):
         '''
         Initializes a feedforward neural network.
 
@@ -75,11 +157,23 @@ class FeedForward(list):
             information.
           bias
             If ``True``, then the neurons are biased.
+          workspace
+            If ``True``, the layers are fed using preallocated buffers, so
+            feeding and training the network example by example doesn't
+            allocate memory. Notice that, in this case, the answer of the
+            network is overwritten every time it is fed. Please, consult the
+            ``Layer`` documentation in the ``base`` module for more information.
+            Defaults to ``False``.
+          dtype
+            The type of the synaptic weights of every layer, and of every
+            computation made with them. Use ``numpy.float32`` for single
+            precision. Defaults to ``float``.
         '''
         list.__init__(self, [ ])
         layers = list(layers)
         for n, m in zip(layers[:-1], layers[1:]):
-            self.append(Layer((m, n), bias=bias))
+            self.append(Layer((m, n), bias=bias, workspace=workspace,
+                              dtype=dtype))
         self.phi = phi
         self.__n = len(self)
         self.__lrule = lrule
@@ -158,6 +252,34 @@ class FeedForward(list):
         return self[-1].y
 
 
+    def predict(self, x):
+        '''
+        Computes the answer of the network for a batch of inputs.
+
+        This method should be used if the answer of the network to a large
+        number of input vectors is desired. Each layer is computed with a single
+        matrix product over the whole batch, which is a lot faster than calling
+        the network once for each input vector. Differently from the
+        ``__call__`` interface, *this method has no collateral effects*, and the
+        ``y`` property is not changed.
+
+        :Parameters:
+          x
+            The input vectors to the network. It must be given as an array of
+            shape ``(N, n)``, where ``N`` is the number of input vectors and
+            ``n`` is the number of inputs of the network. Each line is an input
+            vector.
+
+        :Returns:
+          An array of shape ``(N, m)``, where ``m`` is the number of neurons in
+          the last layer. Each line is the answer of the network to the
+          respective input vector.
+        '''
+        for w in self:
+            x = w.predict(x)
+        return x
+
+
     def learn(self, x, d):
         '''
         Applies one example of the training set to the network.
@@ -189,7 +311,13 @@ class FeedForward(list):
           The error obtained by the network.
         '''
         self.__lrule(self, x, d)
-        return sum(abs(d - self.y))
+
+        # The error is computed in the workspace of the last layer, over the
+        # buffer of the derivatives, that is not needed after the learning.
+        w = self[-1]
+        e = w.workspace.d
+        subtract(reshape(d, e.shape), w.y, out=e)
+        return sum(abs(e, out=e))
 
 
     def feed(self, x, d):
@@ -270,6 +398,297 @@ class FeedForward(list):
         return error
 
 
+    def train_batch(self, x, d, batch_size=None, epochs=100, emax=1e-5,
+                    randomize=True):
+        '''
+        Presents a training set to the network in batches.
+
+        Differently from the ``train`` method, the examples are not presented
+        one at a time. Instead, the training set is split in mini-batches, and
+        the learning rule computes one accumulated adjustment of the synaptic
+        weights over each mini-batch, using matrix operations. This is a lot
+        faster than presenting the examples one by one. The learning rule must
+        implement the ``batch`` method (consult the ``lrules`` documentation),
+        but every ``FFLearning`` object has a default implementation.
+
+        :Parameters:
+          x
+            The input vectors of the training set, given as an array of shape
+            ``(N, n)``, where ``N`` is the number of examples and ``n`` is the
+            number of inputs of the network. A ``DataSource`` with input
+            vectors and desired responses can be given instead, and then the
+            training set is read in chunks, and ``d`` is not used.
+          d
+            The desired responses of the network, given as an array of shape
+            ``(N, m)``, where ``m`` is the number of outputs of the network.
+            One-dimensional arrays are accepted for networks with one output.
+          batch_size
+            The number of examples in each mini-batch. If ``None``, the whole
+            training set is used as a single batch (full-batch training), or
+            each chunk, if ``x`` is a ``DataSource``. Mini-batches never cross
+            the limits of the chunks. If 1, the examples are presented one at a
+            time, as in the ``fit`` method. Defaults to ``None``.
+          epochs
+            The maximum number of times the whole training set is presented to
+            the network. Defaults to 100.
+          emax
+            The maximum admitted error. The training stops when the mean error
+            over an epoch is lower than this limit. Defaults to 1e-5.
+          randomize
+            If ``True``, the examples are shuffled at every epoch before being
+            split into mini-batches. Not used if ``x`` is a ``DataSource``,
+            which shuffles the examples by itself. Defaults to ``True``.
+
+        :Returns:
+          The mean error obtained by the network over the last epoch.
+        '''
+        # The epochs are run by the ``fit`` method, without validation.
+        history = self.fit(x, d, epochs=epochs, batch_size=batch_size,
+                           emax=emax, randomize=randomize)
+        return history[-1]['error']
+
+
+    def __pair(self, x, d):
+        '''
+        Reshapes a chunk of input vectors and desired responses to the shapes
+        used by the network.
+        '''
+        if d is None:
+            raise ValueError, 'desired responses are needed'
+        x = reshape(x, (-1, self[0].inputs))
+        return x, reshape(d, (len(x), -1))
+
+
+    def fit(self, x, d, epochs=100, batch_size=1, validation=None,
+            patience=None, emax=1e-5, randomize=True, callback=None):
+        '''
+        Trains the network in epochs, with optional early stopping.
+
+        In each epoch, the whole training set is presented to the network, one
+        example at a time or in mini-batches, and the mean error over the
+        epoch is computed. Differently from the ``train`` method, which stops
+        when the error of a single example is small enough, the stop
+        conditions are checked only at the end of each epoch, over the mean
+        error of the epoch or over the error on a validation set, computed with
+        the ``predict`` method. If ``patience`` is given, training stops when
+        the error doesn't improve for that number of epochs, and the weights of
+        the best epoch are restored.
+
+        :Parameters:
+          x
+            The input vectors of the training set, given as an array of shape
+            ``(N, n)``, one input vector per line. A ``DataSource`` with input
+            vectors and desired responses can be given instead, and then the
+            training set is read in chunks, and ``d`` is not used.
+          d
+            The desired responses of the network, given as an array of shape
+            ``(N, m)``, one desired response per line. One-dimensional arrays
+            are accepted for networks with one output.
+          epochs
+            The maximum number of epochs. Defaults to 100.
+          batch_size
+            The number of examples in each mini-batch. If 1, the examples are
+            presented one at a time, as in the ``train`` method; otherwise, the
+            ``batch`` method of the learning rule is used, as in the
+            ``train_batch`` method. If ``None``, the whole training set is used
+            as a single batch, or each chunk, if ``x`` is a ``DataSource``.
+            Defaults to 1.
+          validation
+            A tuple ``(x, d)`` with the input vectors and desired responses of
+            a validation set, in the same format as the training set, or a
+            ``DataSource``. If given, the error over this set is used in the
+            stop conditions. Defaults to ``None``.
+          patience
+            The number of epochs without improvement of the error after which
+            the training stops. If ``None``, the training doesn't stop for this
+            reason. Defaults to ``None``.
+          emax
+            The maximum admitted error. The training stops when the error is
+            lower than this limit. Defaults to 1e-5.
+          randomize
+            If ``True``, the examples are shuffled at every epoch. Not used if
+            ``x`` is a ``DataSource``. Defaults to ``True``.
+          callback
+            A function called at the end of every epoch with the report of the
+            epoch (see below). Defaults to ``None``.
+
+        :Returns:
+          The history of the training, a list with one report for each epoch.
+          Each report is a dictionary with the number of the ``epoch``, the
+          mean ``error`` over the epoch, the ``validation`` error, if a
+          validation set is given, the ``time`` spent presenting the examples,
+          in seconds, and the number of examples presented per second,
+          ``samples_per_sec``.
+        '''
+        if not isinstance(x, DataSource):
+            x, d = self.__pair(asarray(x), asarray(d))
+
+        def epoch():
+            error = 0.
+            s = 0
+            for xe, de in _chunks(x, d, randomize):
+                xe, de = self.__pair(xe, de)
+                n = len(xe)
+                b = n if batch_size is None else batch_size
+                if b == 1:
+                    for xi, di in zip(xe, de):
+                        error = error + self.feed(xi, reshape(di, (-1, 1)))
+                else:
+                    for j in range(0, n, b):
+                        db = de[j:j+b]
+                        y = self.__lrule.batch(self, xe[j:j+b], db)
+                        error = error + sum(abs(db - y))
+                s = s + n
+            return error / s, s
+
+        validate = None
+        if validation is not None:
+            if isinstance(validation, DataSource):
+                xv, dv = validation, None
+            else:
+                xv, dv = self.__pair(*map(asarray, validation))
+
+            def validate():
+                error = 0.
+                s = 0
+                for xe, de in _chunks(xv, dv, False):
+                    xe, de = self.__pair(xe, de)
+                    error = error + sum(abs(de - self.predict(xe)))
+                    s = s + len(xe)
+                return error / s
+        return _fit(epoch, validate, [ w.weights for w in self ], epochs,
+                    patience, emax, callback)
+
+
+    def freeze(self):
+        '''
+        Creates a predictor from the network.
+
+        The predictor is an immutable copy of the network that is only able to
+        compute answers. It keeps no state between calls, so it can be shared
+        by threads serving concurrent requests, and it is faster than feeding
+        the network, since no properties are looked up and no state is stored.
+        Further training of the network doesn't change the predictor. Please,
+        consult the ``Predictor`` class.
+
+        :Returns:
+          A ``Predictor`` object.
+        '''
+        return Predictor(self)
+
+
+################################################################################
+class Predictor(object):
+    '''
+    Frozen feedforward neural network, used only to compute answers.
+
+    A predictor is created from the layers of a ``FeedForward`` network, and
+    holds a copy of their synaptic weights, stored in the order in which they
+    are used by the matrix products, and marked as read-only. Differently from
+    the network, a predictor keeps no state between calls: nothing is stored in
+    the object when it is fed, so the same predictor can be used at the same
+    time by any number of threads. The predictor is not affected if the network
+    is trained afterwards. Please, consult the ``freeze`` method of the
+    ``FeedForward`` class.
+    '''
+    def __init__(self, layers):
+        '''
+        Initializes the predictor.
+
+        :Parameters:
+          layers
+            A list of ``Layer`` objects, usually a ``FeedForward`` network. The
+            weights of the layers are copied, and the activation functions are
+            shared with the layers.
+        '''
+        stages = [ ]
+        for w in layers:
+            weights = w.weights
+            if w.bias:
+                b = array(weights[:, 0])
+                b.setflags(write=False)
+                weights = weights[:, 1:]
+            else:
+                b = None
+            weights = array(weights.transpose(), order='C')
+            weights.setflags(write=False)
+            stages.append((weights, b, w.phi))
+        self.__stages = tuple(stages)
+        self.__inputs = layers[0].inputs
+        self.__outputs = layers[-1].size
+        self.__dtype = layers[0].dtype
+
+
+    def __getinputs(self):
+        return self.__inputs
+    inputs = property(__getinputs, None)
+    '''Number of inputs of the predictor. Not writable.'''
+
+
+    def __getoutputs(self):
+        return self.__outputs
+    outputs = property(__getoutputs, None)
+    '''Number of outputs of the predictor. Not writable.'''
+
+
+    def __getdtype(self):
+        return self.__dtype
+    dtype = property(__getdtype, None)
+    '''The type of the synaptic weights and of the computations. Not
+    writable.'''
+
+
+    def __forward(self, x):
+        '''
+        Computes the answer of every layer over ``x``, a single input vector or
+        an array of input vectors, one per line.
+        '''
+        for weights, b, phi in self.__stages:
+            v = dot(x, weights)
+            if b is not None:
+                v += b
+            x = _call(phi, v, v)
+        return x
+
+
+    def __call__(self, x):
+        '''
+        Computes the answer of the predictor to an input vector.
+
+        This method has no collateral effects.
+
+        :Parameters:
+          x
+            The input vector.
+
+        :Returns:
+          The vector containing the answer of every neuron in the last layer,
+          as a column vector, in the same way as the ``FeedForward`` network.
+        '''
+        x = reshape(asarray(x, dtype=self.__dtype), (self.__inputs, ))
+        return reshape(self.__forward(x), (self.__outputs, 1))
+
+
+    def predict(self, x):
+        '''
+        Computes the answer of the predictor for a batch of inputs.
+
+        This method has no collateral effects.
+
+        :Parameters:
+          x
+            The input vectors, given as an array of shape ``(N, n)``, where
+            ``N`` is the number of input vectors and ``n`` is the number of
+            inputs. Each line is an input vector.
+
+        :Returns:
+          An array of shape ``(N, m)``, where ``m`` is the number of outputs.
+          Each line is the answer to the respective input vector.
+        '''
+        x = reshape(asarray(x, dtype=self.__dtype), (-1, self.__inputs))
+        return self.__forward(x)
+
+
 ################################################################################
 class SOM(Layer):
     '''
@@ -285,7 +704,8 @@ class SOM(Layer):
     class. But some of the properties of a ``Layer`` object are not available or
     make no sense in this context.
     '''
-    def __init__(self, shape, lrule=Competitive):
+    def __init__(self, shape, lrule=Competitive, dtype=float, lattice=None,
+                 hexagonal=False):
         '''
         Initializes a self-organizing map.
 
@@ -305,8 +725,42 @@ class SOM(Layer):
             the class or of the subclasses) are allowed. Defaults to
             ``Competitive``. Check the ``lrules`` documentation for more
             information.
+          dtype
+            The type of the synaptic weights of the neurons. Defaults to
+            ``float``.
+          lattice
+            The disposition of the neurons in the map, given as a tuple ``(r,
+            c)``, in which case the neurons are disposed in a grid of ``r``
+            rows and ``c`` columns, row by row. ``r * c`` must be the number
+            of neurons. If ``None``, the neurons are disposed in a line.
+            Defaults to ``None``.
+          hexagonal
+            If ``True``, odd rows of the grid are shifted by half the distance
+            between neurons, so that every neuron has six neighbors at the same
+            distance. If ``False``, the grid is rectangular. Defaults to
+            ``False``.
         '''
-        Layer.__init__(self, shape, phi=None, bias=False)
+        Layer.__init__(self, shape, phi=None, bias=False, dtype=dtype)
+        m = self.size
+        if lattice is None:
+            lattice = (1, m)
+        r, c = lattice
+        if r * c != m:
+            raise ValueError, 'lattice incompatible with the number of neurons'
+        self.__lattice = (r, c)
+        self.__hexagonal = hexagonal
+
+        # Coordinates of the neurons in the grid. The distances between every
+        # pair of neurons take memory proportional to the square of the number
+        # of neurons, so they are computed only when needed.
+        i = arange(m)
+        rows, cols = i // c, i % c
+        if hexagonal:
+            cols = cols + 0.5 * (rows % 2)
+            rows = rows * (sqrt(3.) / 2.)
+        self.__coords = array([ cols, rows ], dtype=float).transpose()
+        self.__dist = None
+
         self.__lrule = lrule
         self.__y = None
         self.__phi = None
@@ -330,6 +784,87 @@ class SOM(Layer):
     property is available only after the network is fed some input.'''
 
 
+    def __getlattice(self):
+        return self.__lattice
+    lattice = property(__getlattice, None)
+    '''The disposition of the neurons in the map, a tuple ``(r, c)`` with the
+    number of rows and columns of the grid. Not writable.'''
+
+
+    def __gethexagonal(self):
+        return self.__hexagonal
+    hexagonal = property(__gethexagonal, None)
+    '''True if the grid of neurons is hexagonal. Not writable.'''
+
+
+    def __getcoordinates(self):
+        return self.__coords
+    coordinates = property(__getcoordinates, None)
+    '''An array with the coordinates ``(x, y)`` of each neuron in the grid, one
+    per line. Not writable.'''
+
+
+    def __getdistances(self):
+        if self.__dist is None:
+            dc = self.__coords[:, newaxis, :] - self.__coords[newaxis, :, :]
+            self.__dist = sqrt(sum(dc*dc, axis=2))
+        return self.__dist
+    distances = property(__getdistances, None)
+    '''An array with the distances in the grid between every pair of neurons.
+    It is computed the first time it is used, and it takes memory proportional
+    to the square of the number of neurons, so it is only used by the
+    ``train_batch`` method. Not writable.'''
+
+
+    def __getdiameter(self):
+        # The greatest distance is between two neurons at the ends of the
+        # first or last rows of the same parity, since even and odd rows form
+        # two rectangular grids. So, at most eight neurons are compared.
+        r, c = self.__lattice
+        rows = set(k for k in (0, 1, r-2, r-1) if 0 <= k < r)
+        corners = self.__coords[[ k*c + j for k in rows for j in (0, c-1) ]]
+        dc = corners[:, newaxis, :] - corners[newaxis, :, :]
+        return sqrt(sum(dc*dc, axis=2).max())
+    diameter = property(__getdiameter, None)
+    '''The greatest distance in the grid between two neurons. It is computed
+    without the ``distances`` array. Not writable.'''
+
+
+    def neighbors(self, i, radius):
+        '''
+        Finds the neighborhood of a neuron.
+
+        Only the neurons in the rows and columns of the grid that are within
+        the radius are visited, so the cost of this method depends only on the
+        size of the neighborhood, not on the size of the map, and no memory
+        proportional to the square of the number of neurons is used.
+
+        :Parameters:
+          i
+            The index of the neuron in the center of the neighborhood.
+          radius
+            The radius of the neighborhood.
+
+        :Returns:
+          An array with the indices of the neurons whose distance in the grid
+          to neuron ``i`` is not greater than ``radius``, sorted by distance.
+          Neuron ``i`` itself is always the first one.
+        '''
+        r, c = self.__lattice
+        ri, ci = divmod(i, c)
+        h = sqrt(3.) / 2. if self.__hexagonal else 1.
+        dr = int(radius / h) + 1
+        dc = int(radius) + 1
+        rows = arange(max(ri - dr, 0), min(ri + dr + 1, r))
+        cols = arange(max(ci - dc, 0), min(ci + dc + 1, c))
+        k = (rows[:, newaxis] * c + cols).ravel()
+        d = self.__coords[k] - self.__coords[i]
+        d = sqrt(sum(d*d, axis=1))
+        inside = d <= radius
+        k = k[inside]
+        return k[argsort(d[inside], kind='mergesort')]
+
+
     def __call__(self, x):
         '''
         The response of the network to a given input.
@@ -347,12 +882,66 @@ class SOM(Layer):
         :Returns:
           The winning neuron.
         '''
-        x = reshape(x, (1, self.inputs))
-        dist = sqrt(sum((x - self.weights)**2, axis=1))
+        # The square root is monotonic, so it isn't needed to find the winner.
+        x = reshape(asarray(x, dtype=self.dtype), (1, self.inputs))
+        dist = sum((x - self.weights)**2, axis=1)
         self.__y = argmin(dist)
         return self.y
 
 
+    def __bmu(self, x, chunk_size):
+        '''
+        Finds the winning neuron (the best matching unit) for every input vector
+        in the array ``x``, one per line, working over blocks of ``chunk_size``
+        vectors at a time. Returns the array of winners and the array of the
+        squared distances of each input vector to its winner.
+
+        The squared distance is expanded as ``||x||^2 - 2 x.w + ||w||^2``, so a
+        single matrix product is needed for each block. The term ``||x||^2``
+        doesn't change the winner, so it is added only to the minimum.
+        '''
+        w = self.weights
+        w2 = sum(w*w, axis=1)
+        n = len(x)
+        if chunk_size is None:
+            chunk_size = n
+        i = empty((n, ), dtype=int)
+        d = empty((n, ), dtype=w.dtype)
+        for j in range(0, n, chunk_size):
+            xb = x[j:j+chunk_size]
+            dist = dot(xb, w.transpose())
+            dist *= -2.
+            dist += w2
+            k = argmin(dist, axis=1)
+            i[j:j+chunk_size] = k
+            d[j:j+chunk_size] = dist[arange(len(xb)), k] + sum(xb*xb, axis=1)
+        return i, maximum(d, 0., d)
+
+
+    def predict(self, x, chunk_size=4096):
+        '''
+        Finds the winning neuron for a batch of inputs.
+
+        This method has no collateral effects. The distances from every input
+        vector to every neuron are computed with matrix products, over blocks of
+        input vectors, so memory use is bounded even for very large batches.
+
+        :Parameters:
+          x
+            The input vectors to the network, given as an array of shape
+            ``(N, n)``, one input vector per line.
+          chunk_size
+            The number of input vectors processed at once. If ``None``, every
+            input vector is processed at once. Defaults to 4096.
+
+        :Returns:
+          An array of integers with ``N`` elements, each one the winning neuron
+          for the respective input vector.
+        '''
+        x = reshape(asarray(x, dtype=self.dtype), (-1, self.inputs))
+        return self.__bmu(x, chunk_size)[0]
+
+
     def learn(self, x):
         '''
         Applies one example of the training set to the network.
@@ -454,13 +1043,219 @@ class SOM(Layer):
         return error
 
 
+    def fit(self, x, epochs=100, validation=None, patience=None, emax=1e-5,
+            randomize=True, callback=None, chunk_size=4096):
+        '''
+        Trains the network in epochs, with optional early stopping.
+
+        In each epoch, the examples of the training set are presented to the
+        network one at a time, and the learning rule is applied, as in the
+        ``train`` method. At the end of the epoch, the quantization error, that
+        is, the mean distance of the input vectors to their winning neurons,
+        is computed over the training set and, optionally, over a validation
+        set, with the batched search of the ``predict`` method. The stop
+        conditions are checked over these errors. If ``patience`` is given,
+        training stops when the error doesn't improve for that number of
+        epochs, and the weights of the best epoch are restored.
+
+        :Parameters:
+          x
+            The input vectors of the training set, given as an array of shape
+            ``(N, n)``, one input vector per line, or a ``DataSource``. If a
+            data source is given, the quantization error of each chunk is
+            computed just after the network is trained with it.
+          epochs
+            The maximum number of epochs. Defaults to 100.
+          validation
+            The input vectors of a validation set, in the same format of the
+            training set. If given, the quantization error over this set is
+            used in the stop conditions. Defaults to ``None``.
+          patience
+            The number of epochs without improvement of the error after which
+            the training stops. If ``None``, the training doesn't stop for this
+            reason. Defaults to ``None``.
+          emax
+            The maximum admitted error. The training stops when the error is
+            lower than this limit. Defaults to 1e-5.
+          randomize
+            If ``True``, the examples are shuffled at every epoch. Not used if
+            ``x`` is a ``DataSource``. Defaults to ``True``.
+          callback
+            A function called at the end of every epoch with the report of the
+            epoch. Defaults to ``None``.
+          chunk_size
+            The number of input vectors processed at once when the quantization
+            error is computed. Defaults to 4096.
+
+        :Returns:
+          The history of the training, a list with one report for each epoch.
+          Please, consult the ``fit`` method of the ``FeedForward`` class.
+        '''
+        if not isinstance(x, DataSource):
+            x = reshape(asarray(x, dtype=self.dtype), (-1, self.inputs))
+
+        def qerror(x):
+            return sum(sqrt(self.__bmu(x, chunk_size)[1]))
+
+        def epoch():
+            error = 0.
+            s = 0
+            for xe, de in _chunks(x, None, randomize):
+                xe = reshape(asarray(xe, dtype=self.dtype), (-1, self.inputs))
+                for xi in xe:
+                    self.feed(xi)
+                error = error + qerror(xe)
+                s = s + len(xe)
+            return error / s, s
+
+        validate = None
+        if validation is not None:
+            xv = validation
+            if not isinstance(xv, DataSource):
+                xv = reshape(asarray(xv, dtype=self.dtype), (-1, self.inputs))
+
+            def validate():
+                error = 0.
+                s = 0
+                for xe, de in _chunks(xv, None, False):
+                    xe = reshape(asarray(xe, dtype=self.dtype),
+                                 (-1, self.inputs))
+                    error = error + qerror(xe)
+                    s = s + len(xe)
+                return error / s
+        return _fit(epoch, validate, [ self.weights ], epochs, patience, emax,
+                    callback)
+
+
+    def train_batch(self, x, epochs=10, radius=None, radius_min=0.5,
+                    chunk_size=4096):
+        '''
+        Trains the network with the batch SOM algorithm.
+
+        In the batch algorithm, the whole training set is presented at once in
+        every epoch. The winning neuron for each input vector is found, and then
+        every neuron is replaced by the mean of the input vectors, weighted by
+        the gaussian neighborhood function between the neuron and the winner of
+        each input vector, computed over the distances in the grid. There is no
+        learning rate, so the learning rule of the network is not used.
+
+        The radius of the neighborhood shrinks exponentially from ``radius``, in
+        the first epoch, to ``radius_min``, in the last.
+
+        :Parameters:
+          x
+            The input vectors of the training set, given as an array of shape
+            ``(N, n)``, where ``N`` is the number of examples and ``n`` is the
+            number of inputs of the network.
+          epochs
+            The number of times the whole training set is presented to the
+            network. Defaults to 10.
+          radius
+            The initial radius of the neighborhood. If ``None``, half the
+            greatest distance in the grid is used. Defaults to ``None``.
+          radius_min
+            The final radius of the neighborhood. Defaults to 0.5.
+          chunk_size
+            The number of input vectors processed at once in the search for the
+            winning neurons. Please, consult the ``predict`` method. Defaults to
+            4096.
+
+        :Returns:
+          The quantization error in the last epoch, that is, the mean distance
+          of the input vectors to their winning neurons.
+        '''
+        x = reshape(asarray(x, dtype=self.dtype), (-1, self.inputs))
+        m = self.size
+        if radius is None:
+            radius = max(self.diameter / 2., radius_min)
+        grid = self.distances**2
+
+        error = 0.
+        for e in range(epochs):
+            if epochs > 1:
+                s = radius * (float(radius_min) / radius)**(e / (epochs - 1.))
+            else:
+                s = radius_min
+            bmu, dist = self.__bmu(x, chunk_size)
+            error = sum(sqrt(dist)) / len(x)
+
+            # Sums the input vectors and counts them for each winner, and then
+            # spreads the sums over the neighborhood.
+            n = bincount(bmu, minlength=m)
+            sx = empty((m, self.inputs), dtype=self.dtype)
+            for k in range(self.inputs):
+                sx[:, k] = bincount(bmu, weights=x[:, k], minlength=m)
+            h = exp(-grid / (2. * s * s))
+            num = dot(h, sx)
+            den = dot(h, n)
+            k = den > 0.
+            self.weights[k] = num[k] / den[k, newaxis]
+        return error
+
+
+################################################################################
+def _points(x):
+    '''
+    Converts a set of points to a two-dimensional array, with one point per
+    line. Points given as real numbers are converted to one-dimensional vectors.
+    '''
+    x = asarray(x, dtype=float)
+    if x.ndim < 2:
+        x = reshape(x, (len(x), -1))
+    return x
+
+
+def _sqdist(x, xs):
+    '''
+    Computes the squared distances from the vector ``x`` to every line of the
+    array ``xs``.
+    '''
+    d = xs - x
+    return sum(d*d, axis=1)
+
+
+def _prototypes(xs, n, weights=None, imax=20):
+    '''
+    Clusters the points in the array ``xs``, one per line, in ``n`` clusters
+    with the K-Means algorithm. Returns the centers of the clusters, the labels
+    of the points and the sum of the ``weights`` of the points in each cluster
+    (their number, if no weights are given).
+    '''
+    xs = asarray(xs, dtype=float)
+    k = KMeans(xs, n, ClassByBounds())
+    c = k(imax)
+    labels = k.classify(xs, c)
+    counts = bincount(labels, weights=weights, minlength=n)
+    return c, labels, counts
+
+
+def _grow(buf, n, size):
+    '''
+    Creates a new buffer with room for at least ``size`` elements, and at least
+    twice the size of the buffer ``buf``, and copies the first ``n`` elements
+    of ``buf`` to it.
+    '''
+    new = empty((max(2*len(buf), size), ) + buf.shape[1:], dtype=buf.dtype)
+    new[:n] = buf[:n]
+    return new
+
+
+def _kdtree(xs):
+    '''
+    Creates a spatial index over the points in the array ``xs``, one per line.
+    ``scipy`` is imported here, so it is needed only if the index is used.
+    '''
+    from scipy.spatial import cKDTree
+    return cKDTree(xs)
+
+
 ################################################################################
 class GRNN(object):
     """
     GRNN is the implementation of General Regression Neural Network, a kind of
     probabilistic neural network used in regression tasks.
     """
-    def __init__(self, sigma=0.1):
+    def __init__(self, sigma=0.1, cutoff=None):
         """
         Initializes the network.
 
@@ -475,10 +1270,22 @@ class GRNN(object):
             points will cover a wide range of inputs, while a small value will
             create a limited spread gaussian and the sample points will cover a 
             small range of inputs
+          cutoff
+            If given, samples farther than ``cutoff * sigma`` from the input
+            vector are not evaluated, since their kernel is negligible. The
+            samples are stored in a spatial index (a KD-tree, which needs
+            ``scipy``), so only nearby samples are visited, and the cost of a
+            prediction doesn't depend on the number of samples. A value of 4 or
+            5 is usually enough. If no sample is close enough, the target of
+            the nearest sample is returned. If ``None``, every sample is
+            evaluated. Defaults to ``None``.
         """
         self._samples = None
         self._targets = None
+        self._weights = None
         self.sigma = sigma
+        self.cutoff = cutoff
+        self.__index = None
 
     def _kernel(self, x1, x2):
         """
@@ -494,11 +1301,24 @@ class GRNN(object):
         D = x1-x2
         return exp(-dot(D, D)/(2*self.sigma**2))
 
+    def _index(self):
+        """
+        Returns the samples as a two-dimensional array, and the spatial index
+        over them, if a cutoff is used. They are computed again only if the
+        ``_samples`` attribute is replaced.
+        """
+        if self.__index is None or self.__index[0] is not self._samples:
+            self.__index = [ self._samples, _points(self._samples), None ]
+        if self.cutoff is not None and self.__index[2] is None:
+            self.__index[2] = _kdtree(self.__index[1])
+        return self.__index[1], self.__index[2]
+
     def train(self, sampleInputs, targets):
         """
         Presents a training set to the network.
 
-        This method uses the sample inputs to set the size of network. 
+        This method uses the sample inputs to set the size of network. If a
+        cutoff is used, the spatial index over the samples is created here.
 
         :Parameters:
           sampleInputs
@@ -510,6 +1330,50 @@ class GRNN(object):
         """
         self._samples = array(sampleInputs)
         self._targets = array(targets)
+        self._weights = None
+        self._index()
+
+    def compress(self, n, imax=20):
+        """
+        Replaces the samples of the network by a smaller set of prototypes.
+
+        The samples are clustered with the K-Means algorithm, and each cluster
+        is replaced by its center, with the mean of the targets of its samples
+        as target. The kernel of each prototype is weighted by the number of
+        samples it represents, so the network behaves approximately as before,
+        but memory use and prediction time are reduced in proportion to the
+        number of prototypes. Clusters that end up empty are discarded.
+
+        :Parameters:
+          n
+            The number of prototypes. If it is not smaller than the number of
+            samples, nothing is done.
+          imax
+            The maximum number of iterations of the K-Means algorithm. Defaults
+            to 20.
+        """
+        xs, tree = self._index()
+        if n >= len(xs):
+            return
+        w = self._weights
+        c, labels, counts = _prototypes(xs, n, w, imax)
+        targets = asarray(self._targets, dtype=float)
+        t = reshape(targets, (len(targets), -1))
+        if w is not None:
+            t = t * reshape(w, (-1, 1))
+        ts = array([ bincount(labels, weights=tj, minlength=n) for tj in t.T ])
+        k = counts > 0
+        ts = (ts[:, k] / counts[k]).transpose()
+        if asarray(self._samples).ndim < 2:
+            self._samples = c[k, 0]
+        else:
+            self._samples = c[k]
+        if targets.ndim < 2:
+            self._targets = ts[:, 0]
+        else:
+            self._targets = ts
+        self._weights = counts[k]
+        self._index()
 
     def __call__(self, x):
         """
@@ -522,17 +1386,124 @@ class GRNN(object):
         :Returns:
           The predicted value.
         """
-        values = [self._kernel(x, x2) for x2 in self._samples]
+        xs, tree = self._index()
+        x = reshape(asarray(x, dtype=float), (xs.shape[1], ))
+        targets = self._targets
+        weights = self._weights
+        if tree is None:
+            d = _sqdist(x, xs)
+        else:
+            k = tree.query_ball_point(x, self.cutoff * self.sigma)
+            d = _sqdist(x, xs[k])
+            targets = targets[k]
+            if weights is not None:
+                weights = weights[k]
+        values = exp(-d/(2*self.sigma**2))
+        if weights is not None:
+            values *= weights
         regular = sum(values)
-        return dot(values, self._targets)/regular
+        if regular > 0.:
+            return dot(values, targets)/regular
+
+        # No sample is close enough, the nearest one is used.
+        if tree is None:
+            return targets[argmin(d)]
+        else:
+            return self._targets[tree.query(x)[1]]
+
+    def predict(self, x, chunk_size=1024):
+        """
+        Predicts the values for a batch of inputs.
+
+        The squared distances between input vectors and samples are computed
+        with matrix products, expanding them as ``||x||^2 - 2 x.s + ||s||^2``,
+        over blocks of at most ``chunk_size`` input vectors by ``chunk_size``
+        samples. The kernels and their weighted sums are accumulated block by
+        block, so memory use is bounded by the size of the blocks and not by
+        the number of inputs or samples. If a cutoff is used, kernels of
+        samples beyond it are made zero, so the results are the same of the
+        ``__call__`` interface.
+
+        :Parameters:
+          x
+            The input vectors to the network, given as an array of shape
+            ``(N, n)``, one input vector per line. For networks with scalar
+            inputs, a vector with ``N`` elements is also accepted.
+          chunk_size
+            The size of the blocks of input vectors and samples processed at
+            once. Defaults to 1024.
+
+        :Returns:
+          An array with the predicted value for each input vector. If the
+          targets are vectors, it has one line for each input vector.
+        """
+        xs, tree = self._index()
+        x = reshape(asarray(x, dtype=float), (-1, xs.shape[1]))
+        targets = asarray(self._targets, dtype=float)
+        t = reshape(targets, (len(targets), -1))
+        w = self._weights
+        n, m = len(x), len(xs)
+
+        # The exponent of the kernel is computed directly, with the factor
+        # -1/(2 sigma^2) applied to the samples only once.
+        a = -1. / (2*self.sigma**2)
+        ws = xs.transpose() * (-2.*a)
+        s2 = a * sum(xs*xs, axis=1)
+        if self.cutoff is not None:
+            emin = a * (self.cutoff * self.sigma)**2
+
+        num = zeros((n, t.shape[1]))
+        den = zeros((n, ))
+        for i in range(0, n, chunk_size):
+            xb = x[i:i+chunk_size]
+            x2 = a * sum(xb*xb, axis=1)[:, newaxis]
+            for j in range(0, m, chunk_size):
+                e = dot(xb, ws[:, j:j+chunk_size])
+                e += x2
+                e += s2[j:j+chunk_size]
+                minimum(e, 0., e)
+                if self.cutoff is not None:
+                    far = e < emin
+                exp(e, e)
+                if self.cutoff is not None:
+                    e[far] = 0.
+                if w is not None:
+                    e *= w[j:j+chunk_size]
+                den[i:i+chunk_size] += sum(e, axis=1)
+                num[i:i+chunk_size] += dot(e, t[j:j+chunk_size])
+
+        k = den > 0.
+        y = empty(num.shape)
+        y[k] = num[k] / den[k, newaxis]
+
+        # If no sample is close enough to some input vector, the nearest one
+        # is used.
+        z = (~k).nonzero()[0]
+        if len(z) > 0:
+            if tree is not None:
+                y[z] = t[tree.query(x[z])[1]]
+            else:
+                for i in z:
+                    y[i] = t[argmin(_sqdist(x[i], xs))]
+
+        if targets.ndim < 2:
+            return y[:, 0]
+        return y
 
 
 class PNN(object):
     """
     PNN is the implementation of Probabilistic Neural Network, a network used
     for classification tasks
+
+    The patterns of each category are stored in a contiguous array, which grows
+    as new patterns are presented to the network, so the network can be trained
+    incrementally. The score of each category is the logarithm of the mean of
+    the kernels between the input vector and the patterns of the category,
+    computed with the log-sum-exp technique, so it doesn't underflow even for
+    very small values of ``sigma``.
     """
-    def __init__(self, sigma=0.1):
+    def __init__(self, sigma=0.1, cutoff=None):
         """
         Initializes the network.
 
@@ -547,9 +1518,20 @@ class PNN(object):
             points will cover a wide range of inputs, while a small value will
             create a limited spread gaussian and the sample points will cover a 
             small range of inputs
+          cutoff
+            If given, patterns farther than ``cutoff * sigma`` from the input
+            vector are not evaluated, and the patterns of each category are
+            stored in a spatial index (a KD-tree, which needs ``scipy``).
+            Please, consult the ``GRNN`` documentation. If no pattern is close
+            enough, the category of the nearest pattern is returned. If
+            ``None``, every pattern is evaluated. Defaults to ``None``.
         """
         self.sigma = sigma
+        self.cutoff = cutoff
         self._categorys = None
+        self._weights = { }
+        self.__buffers = None
+        self.__index = { }
     
     def _kernel(self, x1, x2):
         """
@@ -564,12 +1546,85 @@ class PNN(object):
         """
         D = x1-x2
         return exp(-dot(D, D)/(2*self.sigma**2))
-    
+
+    def _index(self):
+        """
+        Returns a dictionary with the patterns of each category as a
+        two-dimensional array, the spatial index over them, if a cutoff is
+        used, and the weights of the patterns, if they are weighted. The entry
+        of a category is computed again only if its patterns are replaced or
+        their number changes.
+        """
+        index = { }
+        for c, p in self._categorys.items():
+            try:
+                q, n, xs, tree = self.__index[c][:4]
+                if q is not p or n != len(p):
+                    raise KeyError
+            except KeyError:
+                xs, tree = _points(p), None
+            if self.cutoff is not None and tree is None:
+                tree = _kdtree(xs)
+            w = self._weights.get(c)
+            if w is not None and len(w) != len(p):
+                w = None
+            index[c] = (p, len(p), xs, tree, w)
+        self.__index = index
+        return dict((c, e[2:]) for c, e in index.items())
+
+    def __append(self, category, patterns, weights=None):
+        """
+        Appends an array of patterns, one per line, to the buffer of the given
+        category. The buffer doubles its size when it is full, so appending is
+        done in amortized constant time per pattern. The ``_categorys``
+        attribute stores, for each category, a view of the filled part of the
+        buffer. If the patterns are weighted, or if the category already has
+        weighted patterns, the weights are stored in the same way in the
+        ``_weights`` attribute. Unweighted patterns have weight 1.
+        """
+        k, m = patterns.shape
+        buf, wbuf = self.__buffers.get(category, (None, None))
+        if buf is None:
+            n = 0
+            buf = empty((max(16, k), m), dtype=float)
+        else:
+            n = len(self._categorys[category])
+            if n + k > len(buf):
+                buf = _grow(buf, n, n+k)
+        buf[n:n+k] = patterns
+        if weights is not None or wbuf is not None:
+            if wbuf is None:
+                wbuf = ones((len(buf), ), dtype=float)
+            elif len(wbuf) < n + k:
+                wbuf = _grow(wbuf, n, n+k)
+            if weights is None:
+                wbuf[n:n+k] = 1.
+            else:
+                wbuf[n:n+k] = weights
+            self._weights[category] = wbuf[:n+k]
+        self.__buffers[category] = (buf, wbuf)
+        self._categorys[category] = buf[:n+k]
+
+    def __buffered(self):
+        """
+        Returns ``True`` if the patterns of every category are stored in the
+        buffers of the network, that is, they weren't assigned directly.
+        """
+        if self.__buffers is None:
+            return False
+        for c, p in self._categorys.items():
+            buf = self.__buffers.get(c, (None, None))[0]
+            if buf is None or getattr(p, 'base', None) is not buf:
+                return False
+        return True
+
     def train(self, trainSet):
         """
         Presents a training set to the network.
 
-        This method uses the sample inputs to set the size of network. 
+        This method uses the sample inputs to set the size of network. Every
+        pattern previously presented to the network is discarded. If a cutoff
+        is used, the spatial index over the patterns is created here.
 
         :Parameters:
           train_set
@@ -580,12 +1635,182 @@ class PNN(object):
             network for this particular input, i.e the category of ``x`` 
             pattern. 
         """
-        self._categorys = {}
-        for pattern, category in trainSet:
-            if category not in self._categorys:
-                self._categorys[category] = []
+        self._categorys = None
+        self.partial_train(trainSet)
+
+    def partial_train(self, x, d=None):
+        """
+        Presents new examples to the network, keeping the ones already
+        presented.
 
-            self._categorys[category].append(array(pattern))
+        The new patterns are appended to the arrays of their categories, so
+        the network can be trained with a stream of examples.
+
+        :Parameters:
+          x
+            If ``d`` is ``None``, a list of two-tuples ``(x, d)``, as in the
+            ``train`` method. Otherwise, the input vectors of the examples,
+            given as an array with one input vector per line.
+          d
+            The categories of the input vectors, one for each line of ``x``.
+            Defaults to ``None``.
+        """
+        if d is None:
+            x = list(x)
+            d = [ c for p, c in x ]
+            x = [ p for p, c in x ]
+        x = _points(x)
+
+        # If the patterns were assigned directly, they are copied to buffers.
+        if self._categorys is None:
+            self._categorys = { }
+            self._weights = { }
+            self.__buffers = { }
+        elif not self.__buffered():
+            index = self._index()
+            self._categorys = { }
+            self._weights = { }
+            self.__buffers = { }
+            for c, (p, tree, w) in index.items():
+                self.__append(c, p, w)
+
+        categories = { }
+        for i, c in enumerate(d):
+            categories.setdefault(c, [ ]).append(i)
+        for c, i in categories.items():
+            self.__append(c, x[i])
+        self._index()
+
+    def compress(self, n, imax=20):
+        """
+        Replaces the patterns of each category by a smaller set of prototypes.
+
+        The patterns of each category are clustered with the K-Means algorithm,
+        and each cluster is replaced by its center. The kernel of each
+        prototype is weighted by the number of patterns it represents, so the
+        network behaves approximately as before, but memory use and prediction
+        time are reduced in proportion to the number of prototypes. Clusters
+        that end up empty are discarded. New patterns can still be presented
+        to the network with ``partial_train``.
+
+        :Parameters:
+          n
+            The number of prototypes of each category. Categories with no more
+            than ``n`` patterns are kept as they are.
+          imax
+            The maximum number of iterations of the K-Means algorithm. Defaults
+            to 20.
+        """
+        index = self._index()
+        self._categorys = { }
+        self._weights = { }
+        self.__buffers = { }
+        for category, (p, tree, w) in index.items():
+            if len(p) > n:
+                c, labels, w = _prototypes(p, n, w, imax)
+                k = w > 0.
+                p, w = c[k], w[k]
+            self.__append(category, p, w)
+        self._index()
+
+    def __scores(self, x, chunk_size):
+        """
+        Computes the score of each category for the input vectors in the array
+        ``x``, one per line. Returns the list of categories and an array with
+        the scores, one line for each input vector and one column for each
+        category. The score is the logarithm of the mean of the kernels,
+        weighted by the weights of the patterns, if any, and is ``-inf`` if
+        every pattern is beyond the cutoff.
+        """
+        index = self._index()
+        categories = list(index)
+        if self.cutoff is not None:
+            return categories, self.__near_scores(index, categories, x,
+                                                  chunk_size)
+        a = -1. / (2*self.sigma**2)
+        n = len(x)
+        scores = empty((n, len(categories)))
+        for c, category in enumerate(categories):
+            patterns, tree, w = index[category]
+            ws = patterns.transpose() * (-2.*a)
+            p2 = a * sum(patterns*patterns, axis=1)
+            if w is None:
+                lw, lsum = None, log(len(patterns))
+            else:
+                lw, lsum = log(w), log(sum(w))
+            for i in range(0, n, chunk_size):
+                xb = x[i:i+chunk_size]
+                x2 = a * sum(xb*xb, axis=1)[:, newaxis]
+
+                # The sum of the exponentials is accumulated over blocks of
+                # patterns, always relative to the greatest exponent found.
+                emax = empty((len(xb), ))
+                emax.fill(-inf)
+                esum = zeros((len(xb), ))
+                for j in range(0, len(patterns), chunk_size):
+                    e = dot(xb, ws[:, j:j+chunk_size])
+                    e += x2
+                    e += p2[j:j+chunk_size]
+                    minimum(e, 0., e)
+                    if lw is not None:
+                        e += lw[j:j+chunk_size]
+                    bmax = maximum(emax, e.max(axis=1))
+                    k = bmax > -inf
+                    esum[k] *= exp(emax[k] - bmax[k])
+                    e[k] -= bmax[k, newaxis]
+                    exp(e, e)
+                    esum += sum(e, axis=1)
+                    emax = bmax
+                k = esum > 0.
+                sb = scores[i:i+chunk_size, c]
+                sb[k] = emax[k] + log(esum[k]) - lsum
+                sb[~k] = -inf
+        return categories, scores
+
+    def __near_scores(self, index, categories, x, chunk_size):
+        """
+        Computes the scores of the categories, as the ``__scores`` method, when
+        a cutoff is used. Only the patterns closer than the cutoff to each
+        input vector, found with the spatial index of their category, are
+        evaluated, so the cost doesn't depend on the number of patterns. The
+        log-sum-exp of each input vector is taken over its own patterns.
+        """
+        a = -1. / (2*self.sigma**2)
+        radius = self.cutoff * self.sigma
+        n = len(x)
+        scores = empty((n, len(categories)))
+        for i in range(0, n, chunk_size):
+            xb = x[i:i+chunk_size]
+            m = len(xb)
+            if m > 1:
+                xtree = _kdtree(xb)
+            for c, category in enumerate(categories):
+                patterns, tree, w = index[category]
+                if m == 1:
+                    j = array(tree.query_ball_point(xb[0], radius), dtype=int)
+                    k = zeros((len(j), ), dtype=int)
+                    e = a * _sqdist(xb[0], patterns[j])
+                else:
+                    near = xtree.sparse_distance_matrix(tree, radius,
+                                                        output_type='ndarray')
+                    k, j = near['i'], near['j']
+                    e = a * near['v']**2
+                if w is None:
+                    lsum = log(len(patterns))
+                else:
+                    e += log(w[j])
+                    lsum = log(sum(w))
+                emax = empty((m, ))
+                emax.fill(-inf)
+                maximum.at(emax, k, e)
+                e -= emax[k]
+                exp(e, e)
+                esum = bincount(k, weights=e, minlength=m)
+                z = esum > 0.
+                sb = scores[i:i+m, c]
+                sb[z] = emax[z] + log(esum[z]) - lsum
+                sb[~z] = -inf
+        return scores
 
     def __call__(self, x):
         """
@@ -598,13 +1823,43 @@ class PNN(object):
         :Returns:
           The category that best represent the input vector.
         """
-        sums = {}
-        for category in self._categorys:
-            patterns = self._categorys[category]
-            sums[category] = sum([self._kernel(x, x2) for x2 in patterns])
-            sums[category] /= float(len(patterns))
+        return self.predict([ x ])[0]
 
-        return max(sums, key=lambda x:sums[x])
+    def predict(self, x, chunk_size=1024):
+        """
+        Classifies a batch of inputs.
+
+        The scores of the categories are computed with matrix products, over
+        blocks of at most ``chunk_size`` input vectors by ``chunk_size``
+        patterns, so memory use is bounded by the size of the blocks. If a
+        cutoff is used, only the patterns found close to each block of input
+        vectors by the spatial index are evaluated.
+
+        :Parameters:
+          x
+            The input vectors to the network, given as an array of shape
+            ``(N, n)``, one input vector per line.
+          chunk_size
+            The size of the blocks of input vectors and patterns processed at
+            once. Defaults to 1024.
+
+        :Returns:
+          A list with the category that best represents each input vector.
+        """
+        if not self._categorys:
+            raise ValueError, 'network not trained'
+        index = self._index()
+        m = index.values()[0][0].shape[1]
+        x = reshape(asarray(x, dtype=float), (-1, m))
+        categories, scores = self.__scores(x, chunk_size)
+        best = argmax(scores, axis=1)
+
+        # If no pattern is close enough, the nearest one is used.
+        z = (scores.max(axis=1) == -inf).nonzero()[0]
+        if len(z) > 0:
+            d = array([ index[c][1].query(x[z])[0] for c in categories ])
+            best[z] = argmin(d, axis=0)
+        return [ categories[i] for i in best ]
 
 
 ################################################################################
@@ -0,0 +1,290 @@
+################################################################################
+# Peach - Computational Intelligence for Python
+# Jose Alexandre Nalon
+#
+# This file: nn/persist.py
+# Saving and loading of neural networks
+################################################################################
+
+# Doc string, reStructuredText formatted:
+__doc__ = """
+Saving and loading of neural networks.
+
+This sub-package saves neural networks to files and loads them back. Instead of
+pickling the whole object, only the parameters needed to create the network and
+its arrays (synaptic weights, centers, stored samples and so on) are saved. A
+file starts with a small header, in JSON format, describing the network and the
+position of each array in the file, followed by the raw contents of the arrays,
+each one starting in a position aligned to 64 bytes.
+
+Since the arrays are stored raw, they can be memory-mapped when the network is
+loaded. In that case, nothing is read until it is used, so even very large
+networks are loaded almost instantly, and every process that loads the same
+file shares the same copy of the arrays in memory.
+
+The networks supported are ``FeedForward``, ``SOM``, ``RBFN``, ``GRNN``,
+``PNN`` and ``Hopfield``. Activation functions are saved by name, so only the
+functions in the ``af`` module can be saved. Learning rules are not saved, and
+loaded networks use their default learning rules. The categories of a ``PNN``
+must be numbers or strings, and are loaded with their original types.
+"""
+
+__all__ = [ 'save_net', 'load_net' ]
+
+################################################################################
+from numpy import asarray, ascontiguousarray, fromfile, memmap, zeros
+from numpy import dtype as _dtype
+import json
+import struct
+
+import af
+from nnet import FeedForward, SOM, GRNN, PNN
+from rbfn import RBFN
+from mem import Hopfield
+
+
+################################################################################
+# Functions
+################################################################################
+
+# Every file starts with this string, followed by the size of the header.
+_MAGIC = 'PEACHNN\x01'
+_ALIGN = 64
+
+# JSON doesn't tell apart some types of Python (strings are always loaded as
+# unicode), so the type of each category of a PNN is saved with it.
+_TYPES = { 'bool': bool, 'int': int, 'long': long, 'float': float,
+           'unicode': unicode, 'str': lambda c: c.encode('utf-8') }
+
+
+def _type(c):
+    '''
+    Returns the name of the type of a category of a PNN, or raises a
+    ``ValueError`` if it can't be saved. Byte strings are saved as text, so
+    they must be encoded in UTF-8.
+    '''
+    if isinstance(c, str):
+        try:
+            c.decode('utf-8')
+        except UnicodeDecodeError:
+            raise ValueError, 'string categories must be encoded in UTF-8'
+    for t in (bool, int, long, float, unicode, str):
+        if isinstance(c, t):
+            return t.__name__
+    raise ValueError, 'categories must be numbers or strings'
+
+
+def _phi(phi):
+    '''
+    Describes an activation function from the ``af`` module by its class name
+    and the numeric attributes of the object.
+    '''
+    cls = type(phi)
+    if getattr(af, cls.__name__, None) is not cls or cls is af.Activation:
+        raise ValueError, 'activation function can not be saved'
+    state = { }
+    for k, v in phi.__dict__.items():
+        if k == 'd':
+            continue
+        if not isinstance(v, (int, long, float, bool)):
+            raise ValueError, 'activation function can not be saved'
+        state[k] = v
+    return [ cls.__name__, state ]
+
+
+def _unphi(spec):
+    '''
+    Creates an activation function from its description.
+    '''
+    name, state = spec
+    phi = getattr(af, name)()
+    phi.__dict__.update(state)
+    return phi
+
+
+def _state(net):
+    '''
+    Returns the name of the class of the network, a dictionary with the
+    parameters needed to create it and a dictionary with its arrays.
+    '''
+    if isinstance(net, FeedForward):
+        layers = [ net[0].inputs ] + [ w.size for w in net ]
+        params = { 'layers': layers, 'bias': net[0].bias,
+                   'dtype': net[0].dtype.str,
+                   'phi': [ _phi(w.phi) for w in net ] }
+        arrays = dict(('w%d' % i, w.weights) for i, w in enumerate(net))
+        return 'FeedForward', params, arrays
+    elif isinstance(net, SOM):
+        params = { 'shape': net.shape, 'dtype': net.dtype.str,
+                   'lattice': net.lattice, 'hexagonal': net.hexagonal }
+        return 'SOM', params, { 'weights': net.weights }
+    elif isinstance(net, Hopfield):
+        params = { 'size': net.size, 'phi': _phi(net.phi) }
+        return 'Hopfield', params, { 'weights': net.weights }
+    elif isinstance(net, RBFN):
+        params = { 'phi': _phi(net.phi), 'phi2': _phi(net.phi2),
+                   'dtype': net.dtype.str, 'cutoff': net.cutoff }
+        arrays = { 'centers': net.centers, 'width': net.width,
+                   'weights': net.weights }
+        return 'RBFN', params, arrays
+    elif isinstance(net, GRNN):
+        params = { 'sigma': net.sigma, 'cutoff': net.cutoff }
+        arrays = { 'samples': net._samples, 'targets': net._targets }
+        if net._weights is not None:
+            arrays['weights'] = net._weights
+        return 'GRNN', params, arrays
+    elif isinstance(net, PNN):
+        categories = sorted(net._categorys.keys())
+        types = [ _type(c) for c in categories ]
+        arrays = { }
+        for i, c in enumerate(categories):
+            arrays['c%d' % i] = net._categorys[c]
+            if net._weights.get(c) is not None:
+                arrays['w%d' % i] = net._weights[c]
+        params = { 'sigma': net.sigma, 'cutoff': net.cutoff,
+                   'categories': categories, 'types': types }
+        return 'PNN', params, arrays
+    raise ValueError, 'network can not be saved'
+
+
+def _restore(name, params, arrays):
+    '''
+    Creates a network from the name of its class, its parameters and its
+    arrays. The arrays are used without copying whenever possible.
+    '''
+    if name == 'FeedForward':
+        phis = [ _unphi(p) for p in params['phi'] ]
+        net = FeedForward(params['layers'], phi=phis, bias=params['bias'],
+                          dtype=_dtype(params['dtype']))
+        for i, w in enumerate(net):
+            w._bind(arrays['w%d' % i])
+    elif name == 'SOM':
+        net = SOM(params['shape'], dtype=_dtype(params['dtype']),
+                  lattice=params['lattice'], hexagonal=params['hexagonal'])
+        net._bind(arrays['weights'])
+    elif name == 'Hopfield':
+        net = Hopfield(params['size'], phi=_unphi(params['phi']))
+        net._bind(arrays['weights'])
+    elif name == 'RBFN':
+        net = RBFN(arrays['centers'], phi=_unphi(params['phi']),
+                   phi2=_unphi(params['phi2']), dtype=_dtype(params['dtype']),
+                   cutoff=params['cutoff'], width=arrays['width'])
+        net._bind(arrays['centers'], arrays['width'], arrays['weights'])
+    elif name == 'GRNN':
+        net = GRNN(params['sigma'], params['cutoff'])
+        net._samples = arrays['samples']
+        net._targets = arrays['targets']
+        net._weights = arrays.get('weights')
+    elif name == 'PNN':
+        net = PNN(params['sigma'], params['cutoff'])
+        net._categorys = { }
+        net._weights = { }
+        categories = params['categories']
+        if 'types' in params:
+            categories = [ _TYPES[t](c) for t, c in
+                           zip(params['types'], categories) ]
+        for i, c in enumerate(categories):
+            net._categorys[c] = arrays['c%d' % i]
+            if 'w%d' % i in arrays:
+                net._weights[c] = arrays['w%d' % i]
+    else:
+        raise ValueError, 'unknown network'
+    return net
+
+
+def save_net(net, filename):
+    '''
+    Saves a neural network to a file.
+
+    The file has a header describing the network, in JSON format, followed by
+    the arrays of the network, stored raw and aligned to 64 bytes, so they can
+    be memory-mapped when the network is loaded. Please, consult the
+    ``load_net`` function.
+
+    :Parameters:
+      net
+        The network to be saved. It can be a ``FeedForward``, ``SOM``,
+        ``RBFN``, ``GRNN``, ``PNN`` or ``Hopfield`` object. Its activation
+        functions must be from the ``af`` module, or a ``ValueError`` is
+        raised.
+      filename
+        The name of the file.
+    '''
+    name, params, arrays = _state(net)
+    arrays = dict((k, asarray(a)) for k, a in arrays.items())
+
+    # The header is written with the offsets relative to the end of the
+    # header, and the beginning of the data is aligned afterwards.
+    table = { }
+    offset = 0
+    for k in sorted(arrays.keys()):
+        a = arrays[k]
+        table[k] = { 'dtype': a.dtype.str, 'shape': a.shape,
+                     'offset': offset }
+        offset = offset + (a.nbytes + _ALIGN - 1) // _ALIGN * _ALIGN
+    header = json.dumps({ 'class': name, 'params': params, 'arrays': table })
+    start = len(_MAGIC) + 8 + len(header)
+    start = (start + _ALIGN - 1) // _ALIGN * _ALIGN
+
+    f = open(filename, 'wb')
+    try:
+        f.write(_MAGIC)
+        f.write(struct.pack('<II', len(header), start))
+        f.write(header)
+        for k in sorted(arrays.keys()):
+            f.seek(start + table[k]['offset'])
+            ascontiguousarray(arrays[k]).tofile(f)
+        f.truncate(start + offset)
+    finally:
+        f.close()
+
+
+def load_net(filename, mmap_mode=None):
+    '''
+    Loads a neural network from a file created by the ``save_net`` function.
+
+    :Parameters:
+      filename
+        The name of the file.
+      mmap_mode
+        If ``None``, the arrays of the network are read to memory. Otherwise,
+        they are memory-mapped, and this gives the mode of the mapping, as in
+        ``numpy.memmap``: ``'r'`` for read-only arrays, ``'c'`` for arrays
+        that can be changed in memory without changing the file, and ``'r+'``
+        for arrays whose changes are written to the file. Read-only arrays are
+        well suited to networks that are only used to compute answers, and are
+        shared by every process that maps the file. Defaults to ``None``.
+
+    :Returns:
+      The network stored in the file.
+    '''
+    f = open(filename, 'rb')
+    try:
+        if f.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError, 'not a neural network file'
+        size, start = struct.unpack('<II', f.read(8))
+        header = json.loads(f.read(size))
+        arrays = { }
+        for k, e in header['arrays'].items():
+            t = _dtype(str(e['dtype']))
+            shape = tuple(e['shape'])
+            count = 1
+            for n in shape:
+                count = count * n
+            if count == 0:
+                arrays[k] = zeros(shape, dtype=t)
+            elif mmap_mode is None:
+                f.seek(start + e['offset'])
+                arrays[k] = fromfile(f, dtype=t, count=count).reshape(shape)
+            else:
+                arrays[k] = memmap(filename, dtype=t, mode=mmap_mode,
+                                   offset=start + e['offset'], shape=shape)
+    finally:
+        f.close()
+    return _restore(str(header['class']), header['params'], arrays)
+
+
+################################################################################
+# Test
+if __name__ == "__main__":
+    pass
@@ -29,15 +29,21 @@ SOMs or Fuzzy C-Means.
 """
 
 ################################################################################
-from numpy import array, amax, sum
+from numpy import array, asarray, amax, sum, dot, reshape, empty, zeros
+from numpy import sqrt, maximum, newaxis, eye, bincount
+from numpy import linalg as _linalg
 from random import choice
 from nnet import *
+from nnet import _kdtree
+from af import _call
+from data import DataSource
 
 ################################################################################
 # Classes
 class RBFN(object):
 
-    def __init__(self, c, phi=Gaussian, phi2=Linear):
+    def __init__(self, c, phi=Gaussian, phi2=Linear, dtype=float,
+                 cutoff=None, width=None):
         '''
         Initializes the radial basis function network.
 
@@ -58,17 +64,46 @@ class RBFN(object):
             used to approximate functions, this should be Linear. Since this is
             the most commom situation, it is the default value. In occasions,
             this can be made (say) a sigmoid, for pattern recognition.
+          dtype
+            The type of the centers, widths and synaptic weights of the network.
+            Use ``numpy.float32`` for single precision. Defaults to ``float``.
+          cutoff
+            If given, RBFs whose centers are farther than ``cutoff`` times
+            their width from the input vector are taken as zero, and are not
+            evaluated. The centers are stored in a spatial index (a KD-tree,
+            which needs ``scipy``), so only nearby centers are visited, and the
+            cost of the ``predict`` method doesn't depend on the number of
+            centers. If ``None`` and the RBF has compact support, such as the
+            ``Wendland`` function, its ``support`` attribute is used; otherwise,
+            every RBF is evaluated. Defaults to ``None``.
+          width
+            The width of the RBFs, a single value or one value for each
+            center. If ``None``, the width is computed from the largest
+            distance between two centers. Defaults to ``None``.
         '''
-        self.__c = array(c)
+        self.__dtype = dtype
+        self.__c = array(c, dtype=dtype)
         self.__n = len(self.__c)
-        wmax = 0.
-        for ci in self.__c:
-            w = amax(sum((ci - self.__c)**2, axis=1))
-            if w > wmax:
-                wmax = w
-        self.__w = array([ sqrt(wmax) ]*self.__n) / (self.__n - 1)
+        if width is None:
+            wmax = 0.
+            for ci in self.__c:
+                w = amax(sum((ci - self.__c)**2, axis=1))
+                if w > wmax:
+                    wmax = w
+            width = sqrt(wmax) / (self.__n - 1)
+        self.width = width
         self.phi = phi
-        self.__l = FeedForward((self.__n, 1), phi=phi2, lrule=BackPropagation)
+        self.__l = FeedForward((self.__n, 1), phi=phi2, lrule=BackPropagation,
+                               dtype=dtype)
+        self.cutoff = cutoff
+        self.__tree = None
+
+
+    def __getcenters(self):
+        return self.__c
+    centers = property(__getcenters, None)
+    '''The centers of the RBFs, an array where each line is a center. Not
+    writable.'''
 
 
     def __getwidth(self):
@@ -78,15 +113,22 @@ class RBFN(object):
             if len(w) != len(self.__c):
                 raise AttributeError('Width array must have the same number of componets as the number of centers')
             else:
-                self.__w = array(w)
+                self.__w = array(w, dtype=self.__dtype)
         except TypeError:
-            self.__w = array([ w ]*self.__n)
+            self.__w = array([ w ]*self.__n, dtype=self.__dtype)
     width = property(__getwidth, __setwidth)
     '''The computed width of the RBFs. This property can be read and written. If
     a single value is written, then it is used for every center. If a vector of
     values is supplied, then it must be one for each center.'''
 
 
+    def __getdtype(self):
+        return self.__l[0].dtype
+    dtype = property(__getdtype, None)
+    '''The type of the centers, widths and synaptic weights of the network. Not
+    writable.'''
+
+
     def __getweights(self):
         return self.__l[0].weights
     def __setweights(self, w):
@@ -97,6 +139,28 @@ class RBFN(object):
     of the neuron, or an exception is raised.'''
 
 
+    def _bind(self, c, width, weights):
+        '''
+        Replaces the centers, the widths and the synaptic weights of the network
+        by the given arrays, without copying them. Please, consult the ``Layer``
+        documentation.
+
+        :Parameters:
+          c
+            The new array of centers.
+          width
+            The new array of widths.
+          weights
+            The new weight array of the second layer.
+        '''
+        if c.shape != self.__c.shape or width.shape != self.__w.shape:
+            raise ValueError, 'array has the wrong shape'
+        self.__l[0]._bind(weights)
+        self.__c = c
+        self.__w = width
+        self.__tree = None
+
+
     def __gety(self):
         return self.__l.y
     y = property(__gety, None)
@@ -126,18 +190,10 @@ class RBFN(object):
 
 
     def __getphi2(self):
-        return self.__phi2
+        return self.__l[0].phi
     def __setphi2(self, phi):
-        try:
-            issubclass(phi, Activation)
-            phi = phi()
-        except TypeError:
-            pass
-        if isinstance(phi, Activation):
-            self.__phi2 = phi
-        else:
-            self.__phi2 = Activation(phi)
-    phi2 = property(__getphi, __setphi)
+        self.__l[0].phi = phi
+    phi2 = property(__getphi2, __setphi2)
     '''The activation function for the second layer. It can be set with an
     ``Activation`` instance or a standard Python function. If a standard
     function is given, it must receive a real value and return a real value that
@@ -153,7 +209,8 @@ class RBFN(object):
         network to a given input vector ``x`` is desired. *This method has
         collateral effects*, so beware. After the calling of this method, the
         ``y`` property is set with the activation potential and the answer of
-        the neurons, respectivelly.
+        the neurons, respectivelly. The first layer is computed by the
+        ``hidden`` method.
 
         :Parameters:
           x
@@ -163,8 +220,174 @@ class RBFN(object):
           The vector containing the answer of every neuron in the last layer, in
           the respective order.
         '''
-        x = array([ self.__phi((x-ci)/wi) for ci, wi in zip(self.__c, self.__w) ])
-        return self.__l(x)
+        return self.__l(self.hidden(x)[0])
+
+
+    def __getsupport(self):
+        if self.cutoff is not None:
+            return self.cutoff
+        return getattr(self.__phi, 'support', None)
+    support = property(__getsupport, None)
+    '''The distance to the centers, in units of the widths, beyond which the
+    RBFs are taken as zero. It is given by the ``cutoff`` attribute or by the
+    support of the RBF, and is ``None`` if every RBF is evaluated. Not
+    writable.'''
+
+
+    def __neighbors(self, x, support):
+        '''
+        Finds the pairs of input vectors, given in the two-dimensional array
+        ``x``, and centers that are closer than ``support`` times the width of
+        the center. Returns the indices of the input vectors and centers of each
+        pair, and their distances divided by the width.
+        '''
+        if self.__tree is None:
+            self.__tree = _kdtree(self.__c)
+        radius = support * self.__w.max()
+        if len(x) == 1:
+            j = array(self.__tree.query_ball_point(x[0], radius), dtype=int)
+            i = zeros(len(j), dtype=int)
+            d = x[0] - self.__c[j]
+            r = sqrt(sum(d*d, axis=1))
+        else:
+            m = _kdtree(x).sparse_distance_matrix(self.__tree, radius,
+                                                  output_type='ndarray')
+            i, j, r = m['i'], m['j'], m['v']
+        r = asarray(r, dtype=self.__dtype) / self.__w[j]
+        k = r <= support
+        return i[k], j[k], r[k]
+
+
+    def hidden(self, x):
+        '''
+        Computes the answer of the first layer of the network, that is, of the
+        radial basis functions, for a batch of inputs.
+
+        The distances from every input vector to every center are computed at
+        once, expanding the squared distance as ``||x||^2 - 2 x.c + ||c||^2``,
+        so the whole layer is computed with a single matrix product. Each
+        distance is divided by the width of the respective RBF before the RBF
+        is applied. If a cutoff is used, only the RBFs close to each input
+        vector are evaluated, and the others are set to zero.
+
+        :Parameters:
+          x
+            The input vectors, given as an array of shape ``(N, n)``, where
+            ``N`` is the number of input vectors and ``n`` is the dimension of
+            the centers. A single input vector is also accepted.
+
+        :Returns:
+          An array of shape ``(N, m)``, where ``m`` is the number of centers.
+          Each line contains the values of the RBFs for the respective input
+          vector.
+        '''
+        c = self.__c
+        x = reshape(asarray(x, dtype=self.__dtype), (-1, c.shape[1]))
+        support = self.support
+        if support is not None:
+            i, j, r = self.__neighbors(x, support)
+            h = zeros((len(x), self.__n), dtype=self.__dtype)
+            h[i, j] = _call(self.__phi, r, r)
+            return h
+        d = dot(x, -2. * c.transpose())
+        d += sum(c*c, axis=1)
+        d += sum(x*x, axis=1)[:, newaxis]
+        r = sqrt(maximum(d, 0., d), d)
+        r /= self.__w
+        return _call(self.__phi, r, r)
+
+
+    def predict(self, x, chunk_size=4096):
+        '''
+        Computes the answer of the network for a batch of inputs.
+
+        Both layers are computed with matrix operations over blocks of input
+        vectors. Differently from the ``__call__`` interface, *this method has
+        no collateral effects*, and the ``y`` property is not changed. If a
+        cutoff is used, the answer of the first layer is kept sparse, that is,
+        only the RBFs close to each input vector are evaluated and combined by
+        the second layer.
+
+        :Parameters:
+          x
+            The input vectors, given as an array of shape ``(N, n)``, one
+            input vector per line.
+          chunk_size
+            The number of input vectors computed at once, which limits the
+            memory used by the first layer. Defaults to 4096.
+
+        :Returns:
+          An array of shape ``(N, 1)``, where each line is the answer of the
+          network to the respective input vector.
+        '''
+        x = reshape(asarray(x, dtype=self.__dtype), (-1, self.__c.shape[1]))
+        y = empty((len(x), self.__l[-1].size), dtype=self.__dtype)
+        support = self.support
+        if support is None:
+            for i in range(0, len(x), chunk_size):
+                y[i:i+chunk_size] = self.__l.predict(
+                                        self.hidden(x[i:i+chunk_size]))
+            return y
+        w = self.__l[-1].weights
+        for i in range(0, len(x), chunk_size):
+            xi = x[i:i+chunk_size]
+            k, j, r = self.__neighbors(xi, support)
+            h = _call(self.__phi, r, r)
+            for o in range(len(w)):
+                y[i:i+chunk_size, o] = bincount(k, weights=h*w[o, j],
+                                                minlength=len(xi))
+        return _call(self.phi2, y, y)
+
+
+    def fit_linear(self, x, d, ridge=0., chunk_size=4096):
+        '''
+        Computes the synaptic weights of the second layer in one shot, by
+        regularized least squares.
+
+        Since the RBFs are fixed, the answer of the network is linear in the
+        weights of the second layer, and the weights that minimize the squared
+        error over the training set are the solution of the linear system ``(H'
+        H + ridge I) w = H' d``, where ``H`` is the answer of the first layer
+        (consult the ``hidden`` method). The matrices ``H' H`` and ``H' d`` are
+        accumulated over blocks of the training set, so ``H`` is never stored
+        as a whole. This replaces the iterative ``train`` method when the
+        second layer is linear, which is the most common case.
+
+        :Parameters:
+          x
+            The input vectors of the training set, given as an array of shape
+            ``(N, n)``, one input vector per line.
+          d
+            The desired responses of the network, given as an array of ``N``
+            values.
+          ridge
+            The regularization factor. Positive values penalize large weights
+            and make the solution stable when the RBFs overlap a lot. Defaults
+            to 0, in which case the least squares solution with minimum norm is
+            computed.
+          chunk_size
+            The number of examples processed at once. Defaults to 4096.
+
+        :Returns:
+          The mean error obtained by the network over the training set.
+        '''
+        if not isinstance(self.phi2, Linear):
+            raise ValueError, 'second layer must be linear'
+        x = reshape(asarray(x, dtype=self.__dtype), (-1, self.__c.shape[1]))
+        d = reshape(asarray(d, dtype=float), (len(x), -1))
+        if d.shape[1] != self.__l[-1].size:
+            raise ValueError, 'wrong number of desired responses'
+        g = zeros((self.__n, self.__n))
+        b = zeros((self.__n, d.shape[1]))
+        for i in range(0, len(x), chunk_size):
+            h = asarray(self.hidden(x[i:i+chunk_size]), dtype=float)
+            g += dot(h.transpose(), h)
+            b += dot(h.transpose(), d[i:i+chunk_size])
+        if ridge > 0.:
+            g += ridge * eye(self.__n)
+        w = _linalg.lstsq(g, b, rcond=-1)[0]
+        self.__l[-1].weights = w.transpose()
+        return sum(abs(d - self.predict(x, chunk_size))) / len(x)
 
 
     def learn(self, x, d):
@@ -198,8 +421,7 @@ class RBFN(object):
         :Returns:
           The error obtained by the network.
         '''
-        x = array([ self.__phi((x-ci)/wi) for ci, wi in zip(self.__c, self.__w) ])
-        return self.__l.learn(x, d)
+        return self.__l.learn(self.hidden(x)[0], d)
 
 
     def feed(self, x, d):
@@ -234,8 +456,7 @@ class RBFN(object):
         :Returns:
           The error obtained by the network.
         '''
-        x = array([ self.__phi((x-ci)/wi) for ci, wi in zip(self.__c, self.__w) ])
-        return self.__l.feed(x, d)
+        return self.__l.feed(self.hidden(x)[0], d)
 
 
     def train(self, train_set, imax=2000, emax=1e-5, randomize=False):
@@ -273,11 +494,82 @@ class RBFN(object):
         s = len(train_set)
         while i<imax and error>emax:
             if randomize:
-                x, d = random.choice(train_set)
+                x, d = choice(train_set)
             else:
                 x, d = train_set[i%s]
             error = self.feed(x, d)
             i = i+1
         return error
 
+
+    def fit(self, x, d, epochs=100, batch_size=1, validation=None,
+            patience=None, emax=1e-5, randomize=True, callback=None):
+        '''
+        Trains the second layer of the network in epochs, with optional early
+        stopping.
+
+        The answer of the first layer to the training set (and to the
+        validation set, if any) doesn't change during training, so it is
+        computed only once, with the ``hidden`` method, and the second layer is
+        trained over it. If the training set is a ``DataSource``, the answer of
+        the first layer is computed for each chunk, as it is read. Please, consult the ``fit`` method of the
+        ``FeedForward`` class for a description of the training. If the second
+        layer is linear, the ``fit_linear`` method gives the best weights
+        directly.
+
+        :Parameters:
+          x
+            The input vectors of the training set, given as an array of shape
+            ``(N, n)``, one input vector per line, or a ``DataSource`` with
+            input vectors and desired responses.
+          d
+            The desired responses of the network, one for each input vector.
+            Not used if ``x`` is a ``DataSource``.
+          epochs
+            The maximum number of epochs. Defaults to 100.
+          batch_size
+            The number of examples in each mini-batch. If ``None``, the whole
+            training set is used as a single batch. Defaults to 1.
+          validation
+            A tuple ``(x, d)`` with the input vectors and desired responses of
+            a validation set, or a ``DataSource``. Defaults to ``None``.
+          patience
+            The number of epochs without improvement of the error after which
+            the training stops. Defaults to ``None``.
+          emax
+            The maximum admitted error. Defaults to 1e-5.
+          randomize
+            If ``True``, the examples are shuffled at every epoch. Defaults to
+            ``True``.
+          callback
+            A function called at the end of every epoch with the report of the
+            epoch. Defaults to ``None``.
+
+        :Returns:
+          The history of the training, a list with one report for each epoch.
+        '''
+        if isinstance(validation, DataSource):
+            validation = self.__hidden_source(validation)
+        elif validation is not None:
+            xv, dv = validation
+            validation = (self.hidden(xv), dv)
+        if isinstance(x, DataSource):
+            x = self.__hidden_source(x)
+        else:
+            x = self.hidden(x)
+        return self.__l.fit(x, d, epochs, batch_size, validation, patience,
+                            emax, randomize, callback)
+
+
+    def __hidden_source(self, source):
+        '''
+        Creates a data source giving the answer of the first layer to the
+        chunks of ``source``, paired with their desired responses. The chunks
+        are already shuffled and read in advance by ``source``.
+        '''
+        def chunks():
+            for x, d in source:
+                yield self.hidden(x), d
+        return DataSource(chunks, shuffle=False, prefetch=0)
+
 ################################################################################
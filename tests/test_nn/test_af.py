@@ -115,6 +115,56 @@ class Test_Ramp(unittest.TestCase):
         assert result.all()
 
 
+class Test_Out(unittest.TestCase):
+    def test_out(self):
+        from numpy import array, zeros, allclose
+        from peach.nn.af import Threshold, Linear, Ramp, Sigmoid, Signum
+        from peach.nn.af import ArcTan, TanH, Gaussian
+        x = array([-1.5, -0.2, 0., 0.3, 2.])
+        for f in (Threshold(), Linear(), Ramp(), Sigmoid(), Signum(),
+                  ArcTan(), TanH(), Gaussian()):
+            out = zeros(x.shape)
+            assert f(x, out=out) is out
+            assert allclose(out, f(x))
+            assert f.derivative(x, out=out) is out
+            assert allclose(out, f.derivative(x))
+
+    def test_dy(self):
+        from numpy import array, zeros, allclose
+        from peach.nn.af import Activation, Threshold, Linear, Ramp, Sigmoid
+        from peach.nn.af import Signum, ArcTan, TanH, Gaussian
+        x = array([-1.5, -0.2, 0., 0.3, 2.])
+        for f in (Threshold(), Linear(), Ramp(), Sigmoid(2., 0.1), Signum(),
+                  ArcTan(2., 0.1), TanH(1.5, 0.1), Gaussian(),
+                  Activation(lambda v: v**2, lambda v: 2*v)):
+            out = zeros(x.shape)
+            y = f(x)
+            assert f.dy(y, x, out=out) is out
+            assert allclose(out, f.derivative(x))
+
+        f = Activation(lambda v: v**3)
+        assert allclose(f.dy(f(x), x), 3*x**2, atol=1e-3)
+        self.assertRaises(ValueError, f.dy, f(x))
+
+    def test_dyCustom(self):
+        from numpy import array, zeros, allclose, cos, sin
+        from peach.nn.af import Activation, ArcTan
+        class Sin(Activation):
+            def __call__(self, x):
+                return sin(x)
+            def derivative(self, x):
+                return cos(x)
+        class Atan(ArcTan):
+            def derivative(self, x):
+                return ArcTan.derivative(self, x)
+        x = array([-1.5, -0.2, 0., 0.3, 2.])
+        for f, df in ((Sin(), cos(x)), (Atan(), ArcTan().derivative(x))):
+            assert allclose(f.dy(f(x), x), df)
+            out = zeros(x.shape)
+            assert f.dy(f(x), x, out=out) is out
+            assert allclose(out, df)
+
+
 class Test_Sigmoid(unittest.TestCase):
     def _getTargetClass(self):
         from peach.nn.af import Sigmoid
@@ -239,5 +289,43 @@ class Test_TanH(unittest.TestCase):
         assert result.all()
 
 
+class Test_TabulatedActivation(unittest.TestCase):
+    def _getTargetClass(self):
+        from peach.nn.af import TabulatedActivation
+        return TabulatedActivation
+
+    def test_activation(self):
+        from math import tanh
+        from numpy import array, linspace, allclose
+        function = self._getTargetClass()(lambda x: tanh(x), n=4001)
+        x = linspace(-5, 5, 21)
+        assert function.error < 1e-5
+        assert allclose(function(x), array([ tanh(xi) for xi in x ]),
+                        atol=function.error)
+
+    def test_saturation(self):
+        from numpy import array
+        from peach.nn.af import Sigmoid
+        function = self._getTargetClass()(Sigmoid(), interval=(-4., 4.))
+        sigmoid = Sigmoid()
+        x = array([-10., 10.])
+        result = function(x) == sigmoid(array([-4., 4.]))
+        assert result.all()
+        result = function.derivative(x) == array([0., 0.])
+        assert result.all()
+
+    def test_derivative(self):
+        from numpy import linspace, allclose, zeros
+        from peach.nn.af import TanH
+        function = self._getTargetClass()(lambda x: x**3, interval=(-2., 2.))
+        x = linspace(-1, 1, 11)
+        assert allclose(function.derivative(x), 3*x**2, atol=1e-4)
+
+        function = self._getTargetClass()(TanH())
+        out = zeros(x.shape)
+        assert function.dy(function(x), x, out=out) is out
+        assert allclose(out, TanH().derivative(x), atol=1e-4)
+
+
 if __name__ == '__main__':
     unittest.main()
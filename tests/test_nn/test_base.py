@@ -66,6 +66,63 @@ class Test_Layer(unittest.TestCase):
         result = layer.v == array([105])
         assert result.all()
 
+    def test_callWorkspace(self):
+        from numpy import array
+        layer = self._getLayer((1, 2), bias=True, workspace=True)
+        layer[0] = 100, 0.5, 0.5
+        y = layer(array([4, 6])) # 105
+
+        assert y is layer.workspace.y
+        assert layer.v is layer.workspace.v
+        result = y == array([105])
+        assert result.all()
+
+        layer(array([2, 2]))
+        result = y == array([102])
+        assert result.all()
+
+    def test_potential(self):
+        from numpy import array
+        layer = self._getLayer((1, 2), bias=True)
+        layer[0] = 100, 0.5, 0.5
+        v = layer.potential(array([[4, 6], [2, 2]]))
+
+        result = v == array([[105], [102]])
+        assert result.all()
+
+    def test_predict(self):
+        from numpy import array, allclose
+        from peach.nn.af import Sigmoid
+        layer = self._getLayer((3, 2), phi=Sigmoid, bias=True)
+        xs = array([[0.1, 0.2], [-0.4, 0.3], [1.0, -1.0]])
+        y = layer.predict(xs)
+
+        assert y.shape == (3, 3)
+        for x, yi in zip(xs, y):
+            assert allclose(layer(x)[:, 0], yi)
+
+    def test_derivative(self):
+        from numpy import array, allclose
+        from peach.nn.af import Sigmoid
+        layer = self._getLayer((3, 2), phi=Sigmoid, bias=True)
+        layer(array([0.1, 0.2]))
+        assert allclose(layer.derivative(), layer.phi.derivative(layer.v))
+
+    def test_dtype(self):
+        from numpy import array, float32
+        from peach.nn.af import Sigmoid
+        layer = self._getLayer((3, 2), phi=Sigmoid, bias=True, dtype=float32)
+        x = array([[0.1, 0.2], [-0.4, 0.3]])
+
+        assert layer.dtype == float32
+        assert layer.weights.dtype == float32
+        assert layer(x[0]).dtype == float32
+        assert layer.predict(x).dtype == float32
+
+        layer = self._getLayer((3, 2), phi=Sigmoid, bias=True, dtype=float32,
+                               workspace=True)
+        assert layer(x[0]).dtype == float32
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,123 @@
+#! /usr/bin/python
+#-*- coding:utf-8 -*-
+
+import unittest
+
+
+class Test_MicroBatcher(unittest.TestCase):
+    def _getTargetClass(self, *args, **kwargs):
+        from peach.nn.batching import MicroBatcher
+        return MicroBatcher(*args, **kwargs)
+
+    def test_call(self):
+        import threading
+        from numpy import allclose
+        from numpy.random import randn
+        from peach.nn.nnet import FeedForward
+        from peach.nn.af import TanH
+        net = FeedForward((3, 4, 2), phi=TanH, bias=True)
+        batcher = self._getTargetClass(net, max_batch=8, max_wait=0.01)
+        xs = randn(6, 20, 3)
+        results = [ None ] * len(xs)
+        def work(i):
+            results[i] = [ batcher(x) for x in xs[i] ]
+        threads = [ threading.Thread(target=work, args=(i, ))
+                    for i in range(len(xs)) ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        batcher.close()
+
+        for x, r in zip(xs, results):
+            assert allclose(net.predict(x), r)
+        stats = batcher.stats()
+        assert stats['requests'] == 120
+        assert 1. <= stats['batch_size'] <= 8.
+        assert stats['latency_max'] >= stats['latency_p50'] > 0.
+
+    def test_submit(self):
+        from numpy import allclose, array
+        from peach.nn.rbfn import RBFN
+        net = RBFN(array([[0., 0.], [1., 1.]]))
+        batcher = self._getTargetClass(net, max_batch=4, max_wait=0.05)
+        requests = [ batcher.submit([0.1*i, 0.2]) for i in range(10) ]
+        y = [ r.result(5.) for r in requests ]
+        assert allclose(y, net.predict([ r.x for r in requests ]))
+        assert batcher.stats()['batches'] >= 3
+        batcher.close()
+        self.assertRaises(RuntimeError, batcher.submit, [0., 0.])
+
+    def test_submitClose(self):
+        import threading
+        from peach.nn.nnet import FeedForward
+        batcher = self._getTargetClass(FeedForward((2, 1)), max_wait=0.)
+        outcomes = [ ]
+        def work():
+            for i in range(200):
+                try:
+                    r = batcher.submit([1., 2.])
+                except RuntimeError:
+                    outcomes.append('closed')
+                    return
+                # Every accepted request must be computed.
+                try:
+                    r.result(5.)
+                    outcomes.append('done')
+                except RuntimeError:
+                    outcomes.append('lost')
+                    return
+        threads = [ threading.Thread(target=work) for i in range(4) ]
+        for t in threads:
+            t.start()
+        batcher.close()
+        for t in threads:
+            t.join()
+        assert 'lost' not in outcomes
+        assert outcomes.count('closed') <= 4
+        self.assertRaises(RuntimeError, batcher.submit, [1., 2.])
+        batcher.close()
+
+    def test_error(self):
+        from numpy import array
+        from peach.nn.nnet import FeedForward
+        batcher = self._getTargetClass(FeedForward((3, 1)))
+        r = batcher.submit(array([1., 2.]))
+        self.assertRaises(ValueError, r.result, 5.)
+        batcher.close()
+
+    def test_malformed(self):
+        import threading
+        from numpy import allclose
+        from numpy.random import randn
+        from peach.nn.nnet import FeedForward
+        net = FeedForward((3, 2), bias=True)
+        batcher = self._getTargetClass(net, max_batch=16, max_wait=0.2)
+        xs = [ randn(3) for i in range(8) ]
+        xs[3] = randn(5)
+        requests = [ None ] * len(xs)
+        def work(i):
+            requests[i] = batcher.submit(xs[i])
+        threads = [ threading.Thread(target=work, args=(i, ))
+                    for i in range(len(xs)) ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for i, r in enumerate(requests):
+            if i == 3:
+                self.assertRaises(ValueError, r.result, 5.)
+            else:
+                assert allclose(r.result(5.), net.predict(xs[i])[0])
+        assert batcher.stats()['batches'] < len(xs)
+        batcher.close()
+
+    def test_namespace(self):
+        import peach.nn
+        assert peach.nn.MicroBatcher is not None
+        for name in ('threading', 'Queue', 'time', 'deque'):
+            assert not hasattr(peach.nn, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
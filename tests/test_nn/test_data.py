@@ -0,0 +1,149 @@
+#! /usr/bin/python
+#-*- coding:utf-8 -*-
+
+import unittest
+from numpy import arange, reshape
+
+
+class Test_DataSource(unittest.TestCase):
+    x = reshape(arange(200.), (100, 2))
+    d = arange(100.)
+
+    def _getTargetClass(self, *args, **kwargs):
+        from peach.nn.data import DataSource
+        return DataSource(*args, **kwargs)
+
+    def test_arrays(self):
+        from numpy import array_equal, concatenate
+        source = self._getTargetClass(self.x, self.d, chunk_size=16,
+                                      buffer_size=32, seed=0)
+        assert source.size == 100
+        for epoch in range(2):
+            chunks = list(source)
+            assert max(len(c[0]) for c in chunks) == 16
+            x = concatenate([ c[0] for c in chunks ])
+            d = concatenate([ c[1] for c in chunks ])
+            assert array_equal(x[:, 0], 2. * d)
+            assert not array_equal(d, self.d)
+            assert array_equal(sorted(d), self.d)
+
+    def test_noShuffle(self):
+        from numpy import array_equal, concatenate
+        source = self._getTargetClass(self.x, chunk_size=30, shuffle=False)
+        chunks = list(source)
+        assert [ len(x) for x in chunks ] == [ 30, 30, 30, 10 ]
+        assert array_equal(concatenate(chunks), self.x)
+
+    def test_memmap(self):
+        import os
+        from tempfile import mkstemp
+        from numpy import array_equal, concatenate, memmap
+        fd, filename = mkstemp()
+        os.close(fd)
+        try:
+            m = memmap(filename, dtype=float, mode='w+', shape=self.x.shape)
+            m[:] = self.x
+            m.flush()
+            del m
+            m = memmap(filename, dtype=float, mode='r', shape=self.x.shape)
+            source = self._getTargetClass(m, chunk_size=8, seed=1)
+            x = concatenate(list(source))
+            assert type(x) is not memmap
+            assert array_equal(sorted(x[:, 1]), self.x[:, 1])
+            del m
+        finally:
+            os.remove(filename)
+
+    def test_generator(self):
+        from numpy import concatenate
+        def chunks():
+            for i in range(0, 100, 25):
+                yield self.x[i:i+25], self.d[i:i+25]
+        source = self._getTargetClass(chunks, chunk_size=10, seed=2)
+        assert source.size is None
+        for epoch in range(2):
+            d = concatenate([ c[1] for c in source ])
+            assert sorted(d) == list(self.d)
+
+    def test_iterator(self):
+        source = self._getTargetClass(iter([ self.x[:50], self.x[50:] ]),
+                                      chunk_size=20, prefetch=0)
+        assert sum(len(x) for x in source) == 100
+        self.assertRaises(ValueError, list, source)
+
+    def test_error(self):
+        def chunks():
+            yield self.x
+            raise IOError('broken file')
+        source = self._getTargetClass(chunks, chunk_size=10, buffer_size=10)
+        self.assertRaises(IOError, list, source)
+        self.assertRaises(ValueError, self._getTargetClass, self.x,
+                          self.d[:50])
+
+    def test_fit(self):
+        from numpy.random import RandomState, seed
+        from peach.nn.af import TanH
+        from peach.nn.lrules import BackPropagation
+        from peach.nn.nnet import FeedForward
+        seed(0)
+        r = RandomState(0)
+        x = r.uniform(-1., 1., (400, 2))
+        d = x[:, 0] * x[:, 1]
+        source = self._getTargetClass(x, d, chunk_size=64, seed=0)
+        validation = self._getTargetClass(x[:100], d[:100], chunk_size=64)
+        nn = FeedForward((2, 8, 1), phi=TanH, lrule=BackPropagation(0.1),
+                         bias=True)
+        history = nn.fit(source, None, epochs=5, batch_size=8,
+                         validation=validation)
+        error = abs(d[:100] - nn.predict(x[:100])[:, 0]).mean()
+        self.assertAlmostEqual(history[-1]['validation'], error)
+        assert history[-1]['error'] < history[0]['error']
+        self.assertRaises(ValueError, nn.fit, self._getTargetClass(x), None)
+
+    def test_trainBatch(self):
+        from numpy import allclose
+        from numpy.random import RandomState
+        from peach.nn.af import TanH
+        from peach.nn.nnet import FeedForward
+        r = RandomState(1)
+        x = r.uniform(-1., 1., (128, 2))
+        d = x[:, 0] * x[:, 1]
+        nn1 = FeedForward((2, 8, 1), phi=TanH, bias=True)
+        nn2 = FeedForward((2, 8, 1), phi=TanH, bias=True)
+        for w1, w2 in zip(nn1, nn2):
+            w2.weights = w1.weights.copy()
+        source = self._getTargetClass(x, d, chunk_size=32, shuffle=False)
+        e1 = nn1.train_batch(x, d, batch_size=16, epochs=3, randomize=False)
+        e2 = nn2.train_batch(source, None, batch_size=16, epochs=3)
+        self.assertAlmostEqual(e1, e2)
+        for w1, w2 in zip(nn1, nn2):
+            assert allclose(w1.weights, w2.weights)
+
+    def test_fitSOM(self):
+        from numpy import linspace
+        from numpy.random import seed
+        from peach.nn.nnet import SOM
+        seed(0)
+        som = SOM((10, 1))
+        x = reshape(linspace(0., 1., 200), (-1, 1))
+        source = self._getTargetClass(x, chunk_size=50, seed=0)
+        history = som.fit(source, epochs=5, validation=x)
+        assert min(r['validation'] for r in history) < 0.1
+
+    def test_fitRBFN(self):
+        from numpy import linspace, sin
+        from numpy.random import seed
+        from peach.nn.rbfn import RBFN
+        seed(0)
+        x = reshape(linspace(-3., 3., 61), (-1, 1))
+        d = sin(x[:, 0])
+        net = RBFN(reshape(linspace(-3., 3., 13), (-1, 1)))
+        net.width = 1.
+        source = self._getTargetClass(x, d, chunk_size=16, seed=0)
+        history = net.fit(source, None, epochs=30)
+        assert history[-1]['error'] < history[0]['error']
+        assert abs(d - net.predict(x)[:, 0]).mean() < 0.1
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+#! /usr/bin/python
+#-*- coding:utf-8 -*-
+
+import unittest
+from numpy import array
+
+
+class Test_ClassByDistance(unittest.TestCase):
+    def test_classify(self):
+        from peach.nn.kmeans import ClassByDistance
+        xs = array([[0., 0.], [0.9, 1.2], [0.2, 1.5], [5., 5.]])
+        c = array([[0., 0.], [1., 1.], [4., 4.]])
+        result = ClassByDistance(xs, c, chunk_size=3) == array([0, 1, 1, 2])
+        assert result.all()
+
+
+class Test_ClassByBounds(unittest.TestCase):
+    def test_classify(self):
+        from numpy import array_equal
+        from numpy.random import RandomState
+        from peach.nn.kmeans import ClassByBounds, ClassByDistance
+        r = RandomState(0)
+        xs = r.uniform(-10., 10., (500, 3))
+        c = r.uniform(-10., 10., (20, 3))
+        classify = ClassByBounds(chunk_size=64)
+        for i in range(10):
+            assert array_equal(classify(xs, c), ClassByDistance(xs, c))
+            c = c + 0.05 * r.standard_normal(c.shape)
+        assert classify.skipped > 0.5
+        assert 0. < classify.ratio < 1.
+        classify(xs, c)
+        classify(xs, c)
+        assert classify.skipped == 1.
+
+    def test_kmeans(self):
+        from numpy import array_equal
+        from numpy.random import RandomState
+        from peach.nn.kmeans import KMeans, ClassByBounds
+        r = RandomState(1)
+        xs = r.standard_normal((300, 2))
+        c1 = KMeans(xs, 8, seed=2)()
+        c2 = KMeans(xs, 8, ClassByBounds(), seed=2)()
+        assert array_equal(c1, c2)
+
+
+class Test_KMeans(unittest.TestCase):
+    xs = array([[-1.0, -1.0], [-1.1, -0.9], [-0.9, -1.1],
+                [ 1.0, -1.0], [ 1.1, -0.9], [ 0.9, -1.1],
+                [ 0.0,  1.0], [ 0.1,  1.1], [-0.1,  0.9]])
+    centers = array([[-1., -1.], [1., -1.], [0., 1.]])
+
+    def _getTargetClass(self, *args, **kwargs):
+        from peach.nn.kmeans import KMeans
+        return KMeans(*args, **kwargs)
+
+    def test_call(self):
+        from numpy import allclose
+        km = self._getTargetClass(self.xs, 3)
+        km.c = self.xs[[0, 3, 6]]
+        c = km()
+        assert allclose(c, self.centers)
+
+    def test_customClusterer(self):
+        from numpy import allclose, median
+        km = self._getTargetClass(self.xs, 3,
+                                  clusterer=lambda x: median(x, axis=0))
+        km.c = self.xs[[1, 4, 7]]
+        c = km()
+        assert allclose(c, self.centers)
+
+    def test_kmeansPlusPlus(self):
+        from numpy import allclose
+        km = self._getTargetClass(self.xs * 1000., 3, seed=0)
+        c = km()
+        assert allclose(sorted(map(tuple, c)),
+                        sorted(map(tuple, self.centers * 1000.)))
+        self.assertAlmostEqual(km.inertia, 0.12 * 1000.**2)
+
+    def test_restarts(self):
+        from numpy import allclose
+        km1 = self._getTargetClass(self.xs, 3, ninit=3, seed=1)
+        km2 = self._getTargetClass(self.xs, 3, ninit=3, processes=2, seed=1)
+        c1 = km1()
+        c2 = km2()
+        assert len(km2.restarts) == 3
+        assert allclose(c1, c2)
+        assert km1.inertia == min(e for e, i, t in km1.restarts)
+
+    def test_partialFit(self):
+        from numpy import array, allclose
+        km = self._getTargetClass(None, 3)
+        km.c = self.xs[[0, 3, 6]]
+        km.partial_fit(self.xs[::2])
+        c = km.partial_fit(self.xs[1::2])
+        assert allclose(c, self.centers)
+        assert (km.counts == array([3, 3, 3])).all()
+        self.assertRaises(ValueError, km)
+
+    def test_fitStream(self):
+        from numpy import allclose, tile
+        xs = tile(self.xs, (20, 1))
+        km1 = self._getTargetClass(None, 3, seed=0)
+        km2 = self._getTargetClass(None, 3, seed=0)
+        c1 = km1.fit_stream(xs, chunk_size=9, epochs=2)
+        c2 = km2.fit_stream(xs[i:i+9] for i in range(0, len(xs), 9))
+        assert allclose(sorted(map(tuple, c1)),
+                        sorted(map(tuple, self.centers)), atol=0.05)
+        assert km1.counts.sum() == 2 * len(xs)
+        assert km2.counts.sum() == len(xs)
+
+
+if __name__ == '__main__':
+    unittest.main()
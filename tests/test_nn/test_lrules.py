@@ -31,6 +31,116 @@ class  Test_Backpropagation(unittest.TestCase):
         rule = self._getRule()()
         assert rule.lrate == 0.05
 
+    def test_batchSingleExample(self):
+        from numpy import array, allclose
+        from peach.nn.nnet import FeedForward
+        from peach.nn.af import TanH
+        nn1 = FeedForward((2, 3, 1), TanH, self._getRule(), bias=True)
+        nn2 = FeedForward((2, 3, 1), TanH, self._getRule(), bias=True)
+        for w1, w2 in zip(nn1, nn2):
+            w2.weights = w1.weights
+        x = array([0.5, -0.2])
+        nn1.feed(x, 0.7)
+        nn2.train_batch(x.reshape((1, 2)), array([[0.7]]), epochs=1)
+        for w1, w2 in zip(nn1, nn2):
+            assert allclose(w1.weights, w2.weights)
+
+    def test_batchAverage(self):
+        from numpy import array, allclose
+        from peach.nn.nnet import FeedForward
+        from peach.nn.af import TanH
+        nn = FeedForward((2, 3, 1), TanH, self._getRule(), bias=True)
+        w0 = [ w.weights.copy() for w in nn ]
+        xs = array([[0.5, -0.2], [-1.0, 0.3]])
+        ds = array([[0.7], [-0.1]])
+        dws = [ 0. for w in nn ]
+        for x, d in zip(xs, ds):
+            for w, wi in zip(nn, w0):
+                w.weights = wi
+            nn.feed(x, d)
+            dws = [ dw + w.weights - wi for dw, w, wi in zip(dws, nn, w0) ]
+        for w, wi in zip(nn, w0):
+            w.weights = wi
+        nn.train_batch(xs, ds, epochs=1, randomize=False)
+        for w, wi, dw in zip(nn, w0, dws):
+            assert allclose(w.weights, wi + dw/2.)
+
+
+class  Test_Adaptive(unittest.TestCase):
+    def _getNet(self, lrule):
+        from numpy.random import seed
+        from peach.nn.nnet import FeedForward
+        from peach.nn.af import TanH
+        seed(0)
+        return FeedForward((2, 2, 1), TanH, lrule, bias=True)
+
+    def _train(self, nn):
+        from numpy import array
+        xs = array([[-1., -1.], [-1., 1.], [1., -1.], [1., 1.]])
+        ds = array([-1., 1., 1., -1.])
+        for i in range(200):
+            error = 0.
+            for x, d in zip(xs, ds):
+                error = error + nn.feed(x, d)
+        return error / 4.
+
+    def test_momentumZero(self):
+        from numpy import allclose
+        from peach.nn.lrules import BackPropagation, Momentum, Nesterov
+        nn0 = self._getNet(BackPropagation(0.1))
+        self._train(nn0)
+        for rule in (Momentum, Nesterov):
+            nn = self._getNet(rule(0.1, momentum=0.))
+            self._train(nn)
+            for w0, w in zip(nn0, nn):
+                assert allclose(w0.weights, w.weights)
+
+    def test_adamFirstStep(self):
+        from numpy import array, allclose, abs
+        from peach.nn.lrules import Adam
+        nn = self._getNet(Adam(0.01))
+        w0 = [ w.weights.copy() for w in nn ]
+        nn.feed(array([1., -1.]), 1.)
+        for w, wi in zip(nn, w0):
+            assert allclose(abs(w.weights - wi), 0.01, rtol=0.01)
+
+    def test_state(self):
+        import gc
+        from peach.nn.base import Layer
+        from peach.nn.lrules import Adam
+        rule = Adam()
+        w = Layer((3, 2))
+        s = rule.state(w)
+        assert rule.state(w) is s
+        assert s[1].shape == (3, 2)
+
+        # The state of a layer whose weights changed is not reused.
+        s[0] = 5
+        w._bind(w.weights.astype('float32'))
+        s = rule.state(w)
+        assert s[0] == 0 and s[1].dtype == w.dtype
+
+        # The state is freed with the layer.
+        del w
+        gc.collect()
+        assert len(rule._Adaptive__state) == 0
+        w = Layer((4, 4))
+        assert rule.state(w)[1].shape == (4, 4)
+        assert len(rule._Adaptive__state) == 1
+
+    def test_converge(self):
+        from peach.nn.lrules import Momentum, Nesterov, RMSProp, Adam
+        for rule in (Momentum(0.02), Nesterov(0.02), RMSProp(0.003),
+                     Adam(0.03)):
+            nn = self._getNet(rule)
+            assert self._train(nn) < 0.5
+
+
+class  Test_LMSBatch(Test_Backpropagation):
+    def _getRule(self):
+        from peach.nn.lrules import LMS
+        return LMS
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,69 @@
+#! /usr/bin/python
+#-*- coding:utf-8 -*-
+
+import unittest
+from numpy import array
+
+
+class Test_Hopfield(unittest.TestCase):
+    patterns = array([[ 1.,  1.,  1.,  1., -1., -1., -1., -1.],
+                      [ 1., -1.,  1., -1.,  1., -1.,  1., -1.]])
+
+    def _getTargetClass(self, *args, **kwargs):
+        from peach.nn.mem import Hopfield
+        return Hopfield(*args, **kwargs)
+
+    def test_train(self):
+        from numpy import allclose, outer, zeros
+        net = self._getTargetClass(8)
+        net.train(self.patterns)
+        w = zeros((8, 8))
+        for x in self.patterns:
+            w += outer(x, x) / 8.
+            for i in range(8):
+                w[i, i] = 0.
+        assert allclose(net.weights, w)
+
+        net = self._getTargetClass(8)
+        for x in self.patterns:
+            net.learn(x)
+        assert allclose(net.weights, w)
+
+    def test_step(self):
+        net = self._getTargetClass(8)
+        net.train(self.patterns)
+        x = self.patterns[0].copy()
+        x[0] = -1.
+        net.step(x)
+        assert x[0] == -1.
+
+    def test_call(self):
+        from numpy import reshape
+        net = self._getTargetClass(8)
+        net.train(self.patterns)
+        x = self.patterns[0].copy()
+        x[0] = -1.
+        y = net(x)
+        result = reshape(y, (8, )) == self.patterns[0]
+        assert result.all()
+        assert net.energy(y) < net.energy(x)
+
+    def test_recall(self):
+        from numpy import sign
+        from numpy.random import RandomState
+        r = RandomState(0)
+        patterns = sign(r.standard_normal((3, 100)))
+        net = self._getTargetClass(100)
+        net.train(patterns)
+        x = patterns.copy()
+        for xi in x:
+            xi[r.permutation(100)[:10]] *= -1.
+        y = net.recall(x)
+        result = y == patterns
+        assert result.all()
+        assert net.energy(x).shape == (3, )
+        assert (net.energy(y) <= net.energy(x)).all()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,349 @@
 import unittest
 from numpy import array
 
+class Test_FeedForward(unittest.TestCase):
+    def _getTargetClass(self, *args, **kwargs):
+        from peach.nn.nnet import FeedForward
+        return FeedForward(*args, **kwargs)
+
+    def test_predict(self):
+        from numpy import allclose
+        from numpy.random import randn
+        from peach.nn.af import TanH
+        nn = self._getTargetClass((3, 5, 2), phi=TanH, bias=True)
+        xs = randn(10, 3)
+        y = nn.predict(xs)
+
+        assert y.shape == (10, 2)
+        for x, yi in zip(xs, y):
+            assert allclose(nn(x)[:, 0], yi)
+
+    def test_trainBatch(self):
+        from numpy import array
+        from peach.nn.af import TanH
+        from peach.nn.lrules import BackPropagation
+        nn = self._getTargetClass((2, 4, 1), phi=TanH,
+                                  lrule=BackPropagation(0.5), bias=True)
+        xs = array([[-1., -1.], [-1., 1.], [1., -1.], [1., 1.]])
+        ds = array([-1., 1., 1., -1.])
+        e0 = abs(ds - nn.predict(xs)[:, 0]).mean()
+        e1 = nn.train_batch(xs, ds, batch_size=2, epochs=500)
+        assert e1 < e0
+
+    def test_trainBatchFit(self):
+        from numpy import allclose
+        from numpy.random import randn, seed
+        from peach.nn.af import TanH
+        nn1 = self._getTargetClass((3, 4, 1), phi=TanH, bias=True)
+        nn2 = self._getTargetClass((3, 4, 1), phi=TanH, bias=True)
+        for w1, w2 in zip(nn1, nn2):
+            w2.weights = w1.weights
+        xs, ds = randn(16, 3), randn(16)
+        seed(1)
+        e = nn1.train_batch(xs, ds, batch_size=4, epochs=5)
+        seed(1)
+        history = nn2.fit(xs, ds, batch_size=4, epochs=5)
+        self.assertAlmostEqual(e, history[-1]['error'])
+        for w1, w2 in zip(nn1, nn2):
+            assert allclose(w1.weights, w2.weights)
+
+    def test_trainBatchCustomActivation(self):
+        from numpy import allclose, tanh
+        from numpy.random import randn
+        from peach.nn.af import Activation, TanH
+        class Tanh(Activation):
+            def __call__(self, x):
+                return tanh(x)
+            def derivative(self, x):
+                return 1. - tanh(x)**2
+        nn1 = self._getTargetClass((3, 4, 1), phi=TanH, bias=True)
+        nn2 = self._getTargetClass((3, 4, 1), phi=Tanh, bias=True)
+        for w1, w2 in zip(nn1, nn2):
+            w2.weights = w1.weights
+        xs, ds = randn(16, 3), randn(16)
+        e1 = nn1.train_batch(xs, ds, batch_size=4, epochs=5, randomize=False)
+        e2 = nn2.train_batch(xs, ds, batch_size=4, epochs=5, randomize=False)
+        self.assertAlmostEqual(e1, e2)
+        for w1, w2 in zip(nn1, nn2):
+            assert allclose(w1.weights, w2.weights)
+
+    def test_fit(self):
+        from numpy import array
+        from numpy.random import seed
+        from peach.nn.af import TanH
+        from peach.nn.lrules import BackPropagation
+        seed(0)
+        nn = self._getTargetClass((2, 4, 1), phi=TanH,
+                                  lrule=BackPropagation(0.5), bias=True)
+        xs = array([[-1., -1.], [-1., 1.], [1., -1.], [1., 1.]])
+        ds = array([-1., 1., 1., -1.])
+        reports = [ ]
+        history = nn.fit(xs, ds, epochs=50, callback=reports.append)
+
+        assert len(history) == 50 and reports == history
+        assert history[-1]['error'] < history[0]['error']
+        assert history[-1]['samples_per_sec'] > 0.
+        assert 'validation' not in history[-1]
+
+        history = nn.fit(xs, ds, epochs=20, batch_size=2, validation=(xs, ds))
+        error = abs(ds - nn.predict(xs)[:, 0]).mean()
+        self.assertAlmostEqual(history[-1]['validation'], error)
+
+    def test_fitFullBatch(self):
+        from numpy import allclose, array
+        from peach.nn.af import TanH
+        nn1 = self._getTargetClass((2, 4, 1), phi=TanH, bias=True)
+        nn2 = self._getTargetClass((2, 4, 1), phi=TanH, bias=True)
+        for w1, w2 in zip(nn1, nn2):
+            w2.weights = w1.weights.copy()
+        xs = array([[-1., -1.], [-1., 1.], [1., -1.], [1., 1.]])
+        ds = array([-1., 1., 1., -1.])
+        history = nn1.fit(xs, ds, epochs=5, batch_size=None, randomize=False)
+        error = nn2.train_batch(xs, ds, epochs=5, randomize=False)
+
+        self.assertAlmostEqual(history[-1]['error'], error)
+        for w1, w2 in zip(nn1, nn2):
+            assert allclose(w1.weights, w2.weights)
+
+    def test_fitPatience(self):
+        from numpy import allclose, array
+        from numpy.random import seed
+        from peach.nn.af import TanH
+        from peach.nn.lrules import BackPropagation
+        seed(0)
+        nn = self._getTargetClass((2, 4, 1), phi=TanH,
+                                  lrule=BackPropagation(0.5), bias=True)
+        xs = array([[-1., -1.], [-1., 1.], [1., -1.], [1., 1.]])
+        ds = array([-1., 1., 1., -1.])
+        # Learning the training set makes the error on this set grow.
+        history = nn.fit(xs, ds, epochs=200, validation=(xs, -ds), patience=3)
+        best = min(r['validation'] for r in history)
+        error = abs(-ds - nn.predict(xs)[:, 0]).mean()
+
+        assert len(history) < 200
+        assert history[-1]['validation'] > best
+        assert allclose(error, best)
+
+    def test_freeze(self):
+        from numpy import allclose
+        from numpy.random import randn
+        from peach.nn.af import TanH
+        nn = self._getTargetClass((3, 5, 2), phi=TanH, bias=True)
+        xs = randn(10, 3)
+        p = nn.freeze()
+        y = nn.predict(xs)
+
+        assert allclose(p.predict(xs), y)
+        assert allclose(p(xs[0]), nn(xs[0]))
+        assert p.inputs == 3 and p.outputs == 2
+
+        nn.train_batch(xs, randn(10, 2), epochs=5)
+        assert allclose(p.predict(xs), y)
+
+    def test_freezeCustomActivation(self):
+        from numpy import allclose, tanh
+        from numpy.random import randn
+        from peach.nn.af import Activation
+        class Tanh(Activation):
+            def __call__(self, x):
+                return tanh(x)
+        nn = self._getTargetClass((3, 5, 2), phi=Tanh, bias=True)
+        xs = randn(10, 3)
+        p = nn.freeze()
+        assert allclose(p.predict(xs), nn.predict(xs))
+        assert allclose(p(xs[0]), nn(xs[0]))
+
+    def test_freezeThreads(self):
+        import threading
+        from numpy import allclose
+        from numpy.random import randn
+        from peach.nn.af import Sigmoid
+        nn = self._getTargetClass((4, 8, 3), phi=Sigmoid, bias=True)
+        p = nn.freeze()
+        xs = randn(8, 50, 4)
+        results = [ None ] * len(xs)
+        def work(i):
+            results[i] = [ p(x)[:, 0] for x in xs[i] ]
+        threads = [ threading.Thread(target=work, args=(i, ))
+                    for i in range(len(xs)) ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for x, r in zip(xs, results):
+            assert allclose(nn.predict(x), r)
+
+    def test_workspace(self):
+        from numpy import allclose
+        from numpy.random import randn
+        from peach.nn.af import Sigmoid
+        nn1 = self._getTargetClass((3, 4, 2), phi=Sigmoid, bias=True)
+        nn2 = self._getTargetClass((3, 4, 2), phi=Sigmoid, bias=True,
+                                   workspace=True)
+        for w1, w2 in zip(nn1, nn2):
+            w2.weights = w1.weights
+        weights = [ w.weights for w in nn2 ]
+        buffers = [ (w.workspace.y, w.workspace.g, w.workspace.dw) for w in nn2 ]
+        for i in range(20):
+            x, d = randn(3), randn(2)
+            nn1.feed(x, d)
+            nn2.feed(x, d)
+        assert nn2.y is nn2[-1].workspace.y
+        for w1, w2, wi, bi in zip(nn1, nn2, weights, buffers):
+            assert allclose(w1.weights, w2.weights)
+            assert w2.weights is wi
+            assert w2.workspace.y is bi[0]
+            assert w2.workspace.g is bi[1]
+            assert w2.workspace.dw is bi[2]
+
+    def test_customActivation(self):
+        from numpy import allclose, tanh
+        from numpy.random import randn
+        from peach.nn.af import Activation, TanH
+        class Tanh(Activation):
+            def __init__(self):
+                Activation.__init__(self)
+            def __call__(self, x):
+                return tanh(x)
+            def derivative(self, x):
+                return 1. - tanh(x)**2
+        nn1 = self._getTargetClass((3, 4, 2), phi=TanH, bias=True)
+        nn2 = self._getTargetClass((3, 4, 2), phi=Tanh, bias=True)
+        nn3 = self._getTargetClass((3, 4, 2), phi=Tanh, bias=True,
+                                   workspace=True)
+        for w1, w2, w3 in zip(nn1, nn2, nn3):
+            w2.weights = w1.weights
+            w3.weights = w1.weights
+        for i in range(20):
+            x, d = randn(3), randn(2)
+            e1 = nn1.feed(x, d)
+            e2 = nn2.feed(x, d)
+            e3 = nn3.feed(x, d)
+            self.assertAlmostEqual(e1, e2)
+            self.assertAlmostEqual(e1, e3)
+        self.assertAlmostEqual(e3, abs(d - nn3.y[:, 0]).sum())
+        for w1, w2, w3 in zip(nn1, nn2, nn3):
+            assert allclose(w1.weights, w2.weights)
+            assert allclose(w1.weights, w3.weights)
+
+    def test_dtype(self):
+        from numpy import float32
+        from numpy.random import randn
+        from peach.nn.af import TanH
+        from peach.nn.lrules import Adam
+        nn = self._getTargetClass((3, 4, 2), phi=TanH, lrule=Adam(),
+                                  bias=True, dtype=float32)
+        xs, ds = randn(8, 3), randn(8, 2)
+        nn.feed(xs[0], ds[0])
+        nn.train_batch(xs, ds, batch_size=4, epochs=2)
+
+        assert nn.predict(xs).dtype == float32
+        for w in nn:
+            assert w.weights.dtype == float32
+
+
+class Test_SOM(unittest.TestCase):
+    def _getTargetClass(self, *args, **kwargs):
+        from peach.nn.nnet import SOM
+        return SOM(*args, **kwargs)
+
+    def test_dtype(self):
+        from numpy import float32
+        from numpy.random import randn
+        som = self._getTargetClass((4, 2), dtype=float32)
+        for x in randn(10, 2):
+            som.feed(x)
+        assert som.weights.dtype == float32
+        assert 0 <= som(randn(2)) < 4
+
+    def test_predict(self):
+        from numpy.random import randn
+        som = self._getTargetClass((7, 3))
+        xs = randn(25, 3)
+        y = som.predict(xs, chunk_size=4)
+
+        assert y.shape == (25, )
+        for x, yi in zip(xs, y):
+            assert som(x) == yi
+
+    def test_trainBatch(self):
+        from numpy import diff, linspace
+        som = self._getTargetClass((10, 1))
+        xs = linspace(0., 1., 200).reshape((-1, 1))
+        error = som.train_batch(xs, epochs=20)
+
+        assert error < 0.05
+        steps = diff(som.weights[:, 0])
+        assert (steps > 0).all() or (steps < 0).all()
+
+    def test_fit(self):
+        from numpy import linspace
+        from numpy.random import seed
+        seed(0)
+        som = self._getTargetClass((10, 1))
+        xs = linspace(0., 1., 200).reshape((-1, 1))
+        history = som.fit(xs, epochs=10, validation=xs[::3], patience=2)
+
+        assert 0 < len(history) <= 10
+        assert min(r['validation'] for r in history) < 0.1
+        assert history[-1]['samples_per_sec'] > 0.
+
+    def test_lattice(self):
+        from numpy import sqrt
+        som = self._getTargetClass((12, 2), lattice=(3, 4))
+        assert som.lattice == (3, 4)
+        assert som.distances.shape == (12, 12)
+        self.assertAlmostEqual(som.distances[0, 5], sqrt(2))
+        assert sorted(som.neighbors(5, 1.)) == [1, 4, 5, 6, 9]
+        assert som.neighbors(5, 0.5)[0] == 5
+        self.assertRaises(ValueError, self._getTargetClass, (12, 2),
+                          lattice=(5, 2))
+
+    def test_lazyDistances(self):
+        from numpy.random import rand
+        som = self._getTargetClass((400, 2), lattice=(20, 20))
+        som.predict(rand(10, 2))
+        som(rand(2))
+        assert sorted(som.neighbors(21, 1.)) == [ 1, 20, 21, 22, 41 ]
+        self.assertAlmostEqual(som.diameter, 19. * 2**0.5)
+        assert som._SOM__dist is None
+        assert som.distances is som.distances
+        assert som.distances.shape == (400, 400)
+
+    def test_hexagonal(self):
+        som = self._getTargetClass((16, 2), lattice=(4, 4), hexagonal=True)
+        assert len(som.neighbors(5, 1.0001)) == 7
+        assert len(som.neighbors(0, 1.0001)) == 3
+
+    def test_neighbors(self):
+        from numpy import argsort
+        for lattice in ((1, 30), (30, 1), (5, 6), (6, 5), (3, 10)):
+            for hexagonal in (False, True):
+                som = self._getTargetClass((30, 2), lattice=lattice,
+                                           hexagonal=hexagonal)
+                d = som.distances
+                self.assertAlmostEqual(som.diameter, d.max())
+                for i in (0, 4, 13, 29):
+                    for radius in (-1., 0., 1., 1.5, 2.2, 40.):
+                        k = argsort(d[i], kind='mergesort')
+                        k = k[d[i, k] <= radius]
+                        assert list(som.neighbors(i, radius)) == list(k)
+
+    def test_cooperative(self):
+        from numpy.random import rand
+        from peach.nn.lrules import Cooperative
+        som = self._getTargetClass((16, 2), lattice=(4, 4),
+                                   lrule=Cooperative(0.5, tn=200))
+        w0 = som.weights.copy()
+        som.feed(rand(2))
+        changed = (som.weights != w0).any(axis=1).sum()
+        assert changed == len(som.neighbors(som.y, som.diameter / 2.))
+        xs = rand(200, 2)
+        som.train(list(xs), imax=2000)
+        d = ((xs - som.weights[som.predict(xs)])**2).sum(axis=1)**0.5
+        assert d.mean() < 0.2
+
+
 class Test_GRNN(unittest.TestCase):
     samples = array([0.000000, 0.111111, 0.222222, 0.333333, 0.444444, 
                     0.555556, 0.666667, 0.777778, 0.888889, 1.000000])
@@ -59,6 +402,82 @@ class Test_GRNN(unittest.TestCase):
         grnn._targets = self.targets2d.copy()
         self.assertAlmostEqual(grnn([0.05, 0.02]), 0.3179468)
 
+    def test_cutoff(self):
+        from numpy.random import rand
+        xs, ds = rand(500, 2), rand(500)
+        grnn1 = self._getTargetClass(sigma=0.05)
+        grnn2 = self._getTargetClass(sigma=0.05, cutoff=6)
+        grnn1.train(xs, ds)
+        grnn2.train(xs, ds)
+        for x in rand(20, 2):
+            self.assertAlmostEqual(grnn1(x), grnn2(x), places=6)
+
+    def test_predict(self):
+        from numpy import allclose, array, linspace
+        grnn = self._getTargetClass()
+        grnn.train(self.samples, self.targets)
+        xs = linspace(-0.2, 1.2, 15)
+        y = grnn.predict(xs, chunk_size=4)
+        assert y.shape == (15, )
+        assert allclose(y, array([ grnn(x) for x in xs ]))
+
+        grnn = self._getTargetClass(cutoff=3)
+        grnn.train(self.samples2d, self.targets2d)
+        xs = array([[0.05, 0.02], [0.1, 0.1], [2., 2.]])
+        assert allclose(grnn.predict(xs, chunk_size=2),
+                        array([ grnn(x) for x in xs ]))
+
+    def test_predictMultiOutput(self):
+        from numpy import allclose, array, vstack
+        grnn = self._getTargetClass()
+        grnn.train(self.samples2d, vstack((self.targets2d,
+                                           2*self.targets2d)).transpose())
+        xs = array([[0.05, 0.02], [0.08, 0.1]])
+        y = grnn.predict(xs)
+        assert y.shape == (2, 2)
+        assert allclose(y[:, 1], 2*y[:, 0])
+        assert allclose(y[0], grnn(xs[0]))
+
+    def test_compress(self):
+        from numpy import abs, sin, linspace
+        xs = linspace(0., 1., 400)
+        ds = sin(6*xs)
+        grnn = self._getTargetClass(sigma=0.05)
+        grnn.train(xs, ds)
+        grnn.compress(40)
+
+        assert len(grnn._samples) <= 40
+        assert grnn._weights.sum() == 400
+        ys = linspace(0.1, 0.9, 9)
+        assert abs(grnn.predict(ys) - sin(6*ys)).max() < 0.05
+        for x, y in zip(ys, grnn.predict(ys)):
+            self.assertAlmostEqual(grnn(x), y)
+
+    def test_compressImax(self):
+        from numpy.random import RandomState
+        r = RandomState(0)
+        xs = r.rand(200, 2)
+        ds = xs.sum(axis=1)
+        rows = set(map(tuple, xs))
+        # Without iterations, the prototypes are the initial centers, which
+        # are chosen among the samples.
+        grnn = self._getTargetClass(sigma=0.1)
+        grnn.train(xs, ds)
+        grnn.compress(20, imax=0)
+        assert set(map(tuple, grnn._samples)) <= rows
+        grnn = self._getTargetClass(sigma=0.1)
+        grnn.train(xs, ds)
+        grnn.compress(20, imax=20)
+        assert not set(map(tuple, grnn._samples)) <= rows
+
+    def test_cutoffNearest(self):
+        grnn = self._getTargetClass(sigma=0.01, cutoff=3)
+        grnn.train(self.samples, self.targets)
+        self.assertAlmostEqual(grnn(5.), self.targets[-1])
+        grnn._samples = self.samples2d.copy()
+        grnn._targets = self.targets2d.copy()
+        self.assertAlmostEqual(grnn([-1., -1.]), self.targets2d[0])
+
 
 class Test_PNN(unittest.TestCase):
     trainSet = [
@@ -106,6 +525,94 @@ class Test_PNN(unittest.TestCase):
         assert pnn([0.2, 0.1]) == 0
         assert pnn([0, 0.6]) == 1
 
+    def test_cutoff(self):
+        pnn = self._getTargetClass(cutoff=4)
+        pnn.train(self.trainSet)
+        assert pnn([0.2, 0.1]) == 0
+        assert pnn([0, 0.6]) == 1
+
+        # Far from every pattern, the nearest one decides.
+        assert pnn([0.9, 5.]) == 0
+        assert pnn([-5., 1.2]) == 1
+
+    def test_partialTrain(self):
+        from numpy import array
+        pnn = self._getTargetClass()
+        pnn.partial_train(self.trainSet[:2])
+        pnn.partial_train(array([[1, 0], [1, 1]]), [1, 0])
+        for i in range(20):
+            pnn.partial_train([(array([0.5, 0.5]), 2)])
+
+        assert len(pnn._categorys[0]) == 2
+        assert len(pnn._categorys[1]) == 2
+        assert len(pnn._categorys[2]) == 20
+        assert pnn([0.2, 0.1]) == 0
+        assert pnn([0, 0.6]) == 1
+        assert pnn([0.5, 0.45]) == 2
+
+    def test_compress(self):
+        from numpy import array
+        from numpy.random import rand
+        xs = rand(200, 2)
+        ds = (xs[:, 0] > xs[:, 1]).astype(int)
+        pnn = self._getTargetClass(sigma=0.1)
+        pnn.partial_train(xs, ds)
+        pnn.compress(10)
+
+        for c in (0, 1):
+            assert len(pnn._categorys[c]) <= 10
+            assert pnn._weights[c].sum() == (ds == c).sum()
+        assert pnn([0.9, 0.1]) == 1
+        assert pnn([0.1, 0.9]) == 0
+
+        pnn.partial_train([ (array([0.8, 0.2]), 1) ])
+        assert len(pnn._weights[1]) == len(pnn._categorys[1])
+        assert pnn._weights[1][-1] == 1
+
+    def test_smallSigma(self):
+        pnn = self._getTargetClass(sigma=1e-3)
+        pnn.train(self.trainSet)
+        assert pnn([0.3, 0.2]) == 0
+        assert pnn([0.3, 0.6]) == 1
+
+    def test_predict(self):
+        from numpy.random import rand
+        pnn = self._getTargetClass(sigma=0.2)
+        pnn.train(self.trainSet)
+        xs = rand(30, 2)
+        assert pnn.predict(xs, chunk_size=7) == [ pnn(x) for x in xs ]
+
+    def test_predictUntrained(self):
+        pnn = self._getTargetClass()
+        self.assertRaises(ValueError, pnn.predict, [[0., 0.]])
+        self.assertRaises(ValueError, pnn, [0., 0.])
+        pnn._categorys = { }
+        self.assertRaises(ValueError, pnn.predict, [[0., 0.]])
+
+    def test_cutoffSparse(self):
+        import peach.nn.nnet as nnet
+        from numpy.random import RandomState
+        r = RandomState(0)
+        xs = r.rand(500, 2)
+        ds = (xs.sum(axis=1) > 1.).astype(int)
+        ys = r.rand(40, 2)
+        pnn = self._getTargetClass(sigma=0.05)
+        pnn.partial_train(xs, ds)
+        expected = pnn.predict(ys)
+
+        # With a cutoff, only the patterns found by the spatial index are
+        # evaluated, so no product with every pattern is computed.
+        def dot(a, b, *args):
+            raise AssertionError('every pattern evaluated')
+        pnn = self._getTargetClass(sigma=0.05, cutoff=10)
+        pnn.partial_train(xs, ds)
+        nnet.dot, dot = dot, nnet.dot
+        try:
+            assert pnn.predict(ys, chunk_size=16) == expected
+            assert [ pnn(y) for y in ys[:5] ] == expected[:5]
+        finally:
+            nnet.dot = dot
+
 
 if __name__ == '__main__':
     unittest.main()
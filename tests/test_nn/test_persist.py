@@ -0,0 +1,119 @@
+#! /usr/bin/python
+#-*- coding:utf-8 -*-
+
+import unittest
+from numpy import array
+
+
+class Test_Persist(unittest.TestCase):
+    xs = array([[0.1, 0.2], [0.5, -0.3], [-0.8, 0.4], [0.3, 0.9]])
+
+    def setUp(self):
+        import os, tempfile
+        fd, self.filename = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        import os
+        os.remove(self.filename)
+
+    def _roundTrip(self, net, mmap_mode=None):
+        from peach.nn.persist import save_net, load_net
+        save_net(net, self.filename)
+        return load_net(self.filename, mmap_mode)
+
+    def test_feedForward(self):
+        from numpy import allclose, float32, memmap
+        from peach.nn.nnet import FeedForward
+        from peach.nn.af import Sigmoid, Linear
+        net = FeedForward((2, 3, 1), phi=(Sigmoid(a=2.), Linear), bias=True,
+                          dtype=float32)
+        new = self._roundTrip(net, 'r')
+        assert isinstance(new[0].weights, memmap)
+        assert new[0].dtype == float32
+        assert new.bias == (True, True)
+        assert allclose(new.predict(self.xs), net.predict(self.xs))
+        assert allclose(new(self.xs[0]), net(self.xs[0]))
+
+    def test_som(self):
+        from peach.nn.nnet import SOM
+        net = SOM((6, 2), lattice=(2, 3), hexagonal=True)
+        new = self._roundTrip(net)
+        assert new.lattice == (2, 3)
+        assert new.hexagonal
+        result = new.predict(self.xs) == net.predict(self.xs)
+        assert result.all()
+
+    def test_rbfn(self):
+        from numpy import allclose, memmap
+        from peach.nn.rbfn import RBFN
+        from peach.nn.af import Wendland
+        net = RBFN(self.xs, phi=Wendland)
+        net.width = array([1., 2., 1.5, 0.5])
+        new = self._roundTrip(net, 'r')
+        assert isinstance(new.phi, Wendland)
+        assert isinstance(new.centers, memmap)
+        assert isinstance(new.width, memmap)
+        assert isinstance(new.weights, memmap)
+        assert allclose(new.width, net.width)
+        assert allclose(new.predict(self.xs), net.predict(self.xs))
+
+    def test_grnn(self):
+        from numpy import allclose, memmap
+        from peach.nn.nnet import GRNN
+        net = GRNN(sigma=0.5)
+        net.train(self.xs, array([1., 2., 3., 4.]))
+        new = self._roundTrip(net, 'r')
+        assert isinstance(new._samples, memmap)
+        assert new.sigma == 0.5
+        assert allclose(new.predict(self.xs), net.predict(self.xs))
+
+    def test_pnn(self):
+        from peach.nn.nnet import PNN
+        net = PNN(sigma=0.5)
+        net.train(zip(self.xs, ['a', 'b', 'a', 'c']))
+        new = self._roundTrip(net, 'c')
+        assert list(new.predict(self.xs)) == list(net.predict(self.xs))
+        assert type(new(self.xs[0])) is str
+        new.partial_train([ (array([2., 2.]), 'd') ])
+        assert new(array([2., 2.])) == 'd'
+
+    def test_pnnCategories(self):
+        from peach.nn.nnet import PNN
+        from peach.nn.persist import save_net
+        for categories in ([ 1, 2L, 2.5, 'b', '\xc3\xa7' ], [ u'a', u'\xe7' ]):
+            xs = array([ [i, i] for i in range(len(categories)) ])
+            net = PNN(sigma=0.5)
+            net.partial_train(xs, categories)
+            ys = self._roundTrip(net).predict(xs)
+            assert ys == categories
+            assert [ type(y) for y in ys ] == [ type(c) for c in categories ]
+        net = PNN(sigma=0.5)
+        net.partial_train(self.xs[:2], [ 'a', '\xe7' ])
+        with self.assertRaises(ValueError) as cm:
+            save_net(net, self.filename)
+        assert type(cm.exception) is ValueError
+
+    def test_hopfield(self):
+        from numpy import allclose
+        from peach.nn.mem import Hopfield
+        net = Hopfield(4)
+        net.train([[1., -1., 1., -1.]])
+        new = self._roundTrip(net)
+        assert allclose(new.weights, net.weights)
+
+    def test_invalid(self):
+        from peach.nn.persist import save_net
+        from peach.nn.nnet import FeedForward
+        net = FeedForward((2, 1), phi=lambda x: x)
+        self.assertRaises(ValueError, save_net, net, self.filename)
+
+    def test_namespace(self):
+        import peach.nn
+        assert peach.nn.save_net is not None
+        for name in ('json', 'struct', 'memmap', 'fromfile'):
+            assert not hasattr(peach.nn, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
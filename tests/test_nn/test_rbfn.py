@@ -0,0 +1,114 @@
+#! /usr/bin/python
+#-*- coding:utf-8 -*-
+
+import unittest
+from numpy import array, linspace, sin, reshape
+
+
+class Test_RBFN(unittest.TestCase):
+    x = reshape(linspace(-3., 3., 61), (-1, 1))
+    d = sin(x[:, 0])
+    c = reshape(linspace(-3., 3., 13), (-1, 1))
+
+    def _getTargetClass(self, *args, **kwargs):
+        from peach.nn.rbfn import RBFN
+        return RBFN(*args, **kwargs)
+
+    def test_hidden(self):
+        from numpy import allclose, exp, sqrt, sum
+        from numpy.random import RandomState
+        r = RandomState(0)
+        c = r.standard_normal((5, 3))
+        x = r.standard_normal((7, 3))
+        net = self._getTargetClass(c)
+        h = net.hidden(x)
+        assert h.shape == (7, 5)
+        for xi, hi in zip(x, h):
+            ri = sqrt(sum((xi - c)**2, axis=1)) / net.width
+            assert allclose(hi, exp(-ri**2))
+
+    def test_predict(self):
+        from numpy import allclose
+        net = self._getTargetClass(self.c)
+        y = net.predict(self.x, chunk_size=7)
+        assert y.shape == (61, 1)
+        for xi, yi in zip(self.x, y):
+            assert allclose(net(xi)[:, 0], yi)
+
+    def test_fitLinear(self):
+        from numpy import allclose, linalg
+        net = self._getTargetClass(self.c)
+        net.width = 1.
+        error = net.fit_linear(self.x, self.d, chunk_size=10)
+        w = linalg.lstsq(net.hidden(self.x), self.d, rcond=-1)[0]
+        assert allclose(net.weights[0], w, atol=1e-4)
+        assert error < 0.01
+        assert abs(net.predict([[0.45]])[0, 0] - sin(0.45)) < 0.01
+
+    def test_fit(self):
+        from numpy.random import seed
+        seed(0)
+        net = self._getTargetClass(self.c)
+        net.width = 1.
+        history = net.fit(self.x, self.d, epochs=30,
+                          validation=(self.x[::2], self.d[::2]), patience=5)
+        error = abs(self.d - net.predict(self.x)[:, 0]).mean()
+        assert history[-1]['validation'] < history[0]['validation']
+        assert error < 0.1
+
+    def test_phi2(self):
+        from peach.nn.af import Sigmoid
+        net = self._getTargetClass(self.c, phi2=Sigmoid)
+        assert isinstance(net.phi2, Sigmoid)
+        self.assertRaises(ValueError, net.fit_linear, self.x, self.d)
+
+    def test_customPhi(self):
+        from numpy import allclose, exp, tanh
+        from peach.nn.af import Activation, RadialBasis, TanH
+        class Gauss(RadialBasis):
+            def __call__(self, x):
+                return exp(-x**2)
+        class Tanh(Activation):
+            def __call__(self, x):
+                return tanh(x)
+        net1 = self._getTargetClass(self.c, phi2=TanH)
+        net2 = self._getTargetClass(self.c, phi=Gauss, phi2=Tanh)
+        net2.weights = net1.weights
+        assert allclose(net2.hidden(self.x), net1.hidden(self.x))
+        assert allclose(net2.predict(self.x), net1.predict(self.x))
+
+    def test_cutoff(self):
+        from numpy import allclose, where, exp
+        from numpy.random import RandomState
+        r = RandomState(1)
+        c = r.uniform(-5., 5., (200, 2))
+        x = r.uniform(-5., 5., (50, 2))
+        dense = self._getTargetClass(c)
+        dense.width = 0.5
+        net = self._getTargetClass(c, cutoff=3.)
+        net.width = 0.5
+        net.weights = dense.weights
+        h = dense.hidden(x)
+        hs = net.hidden(x)
+        assert allclose(hs, where(h >= exp(-9.), h, 0.))
+        assert allclose(net.predict(x, chunk_size=16),
+                        dense.predict(x), atol=1e-2)
+
+    def test_compactSupport(self):
+        from numpy import allclose, dot, vstack
+        from numpy.random import RandomState
+        from peach.nn.af import Wendland
+        r = RandomState(2)
+        c = r.uniform(-5., 5., (200, 2))
+        x = vstack([ r.uniform(-5., 5., (50, 2)), c[:3] ])
+        net = self._getTargetClass(c, phi=Wendland)
+        net.width = 1.
+        assert net.support == 1.
+        y = net.predict(x, chunk_size=16)
+        assert allclose(y[:, 0], dot(net.hidden(x), net.weights[0]))
+        assert allclose(net.predict(x[-1]), y[-1])
+        assert allclose(net(x[-1])[:, 0], y[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()